@@ -1,14 +1,17 @@
 # app.py - Streamlit Web Interface
 import streamlit as st
-import sqlite3
 import pandas as pd
+import sqlite3
+import time
 from datetime import datetime, timedelta
 import plotly.express as px
 import plotly.graph_objects as go
-from news_collector import NewsCollector
+from news_collector import NewsCollector, NewsItem
 from llm_processor import LLMProcessor
 from output_dispatcher import EnhancedOutputDispatcher
-from config import NEWS_SOURCES, UI_CONFIG
+from pipeline import NewsPipeline
+from config import JOB_CONFIG, NEWS_SOURCES, UI_CONFIG
+from jobs import ACTIVE_STATUSES, JobAlreadyRunning, JobRunner, JobStore
 import asyncio
 import threading
 
@@ -19,121 +22,175 @@ st.set_page_config(
     layout=UI_CONFIG['layout']
 )
 
+# Long-lived objects are shared by every rerun and session: the database is
+# migrated once per process and the HTTP sessions / LLM client are reused.
+@st.cache_resource
+def get_news_collector():
+    return NewsCollector()
+
+@st.cache_resource
+def get_llm_processor():
+    return LLMProcessor()
+
+@st.cache_resource
+def get_output_dispatcher():
+    # Emails go through the SQLite outbox in the same database as the news
+    return EnhancedOutputDispatcher(get_news_collector().db_path)
+
+@st.cache_resource
+def get_job_runner():
+    # Jobs run in this server process, so they survive browser refreshes and reruns
+    return JobRunner(JobStore(get_news_collector().db_path))
+
+# Query results are cached per data_version, which changes on every write to
+# news_items, so reruns that don't change data are served without touching SQLite.
+@st.cache_data(show_spinner=False, max_entries=256)
+def query_repository(data_version, method, *args, **kwargs):
+    """Cached NewsRepository read; rows are converted to dicts so they can be cached"""
+    result = getattr(get_news_collector().repository, method)(*args, **kwargs)
+    if isinstance(result, sqlite3.Row):
+        return dict(result)
+    if isinstance(result, list):
+        return [dict(row) if isinstance(row, sqlite3.Row) else row for row in result]
+    return result
+
+@st.cache_data(show_spinner=False, max_entries=32)
+def load_news_frame(data_version, days_back, columns):
+    conn = get_news_collector().repository.connection()
+    
+    # published_ts上有索引; 截止时间与原来的 date('now', '-N days') 相同
+    query = f"""
+    SELECT {columns} FROM news_items 
+    WHERE published_ts >= CAST(strftime('%s', 'now', ?, 'start of day') AS INTEGER)
+    ORDER BY published_ts DESC
+    """
+    
+    df = pd.read_sql_query(query, conn, params=(f'-{int(days_back)} days',))
+    
+    if not df.empty:
+        df['published_date'] = pd.to_datetime(df['published_date'])
+    
+    return df
+
 class AINewsApp:
     def __init__(self):
-        self.news_collector = NewsCollector()
-        self.llm_processor = LLMProcessor()
-        self.output_dispatcher = EnhancedOutputDispatcher()
+        self.news_collector = get_news_collector()
+        self.llm_processor = get_llm_processor()
+        self.output_dispatcher = get_output_dispatcher()
+        self.job_runner = get_job_runner()
+        self.job_store = self.job_runner.store
         
         # Initialize session state
         if 'workflow_running' not in st.session_state:
             st.session_state.workflow_running = False
-        if 'last_collection' not in st.session_state:
-            st.session_state.last_collection = None
         if 'news_data' not in st.session_state:
             st.session_state.news_data = None
 
-    def load_news_from_db(self, days_back=7):
-        """Load news from database"""
-        conn = sqlite3.connect(self.news_collector.db_path)
-        
-        query = """
-        SELECT * FROM news_items 
-        WHERE published_date >= date('now', '-{} days')
-        ORDER BY published_date DESC
-        """.format(days_back)
-        
-        df = pd.read_sql_query(query, conn)
-        conn.close()
-        
-        if not df.empty:
-            df['published_date'] = pd.to_datetime(df['published_date'])
-        
-        return df
+    def load_news_from_db(self, days_back=7, columns='id, title, source, published_date'):
+        """Load news from database (only the requested columns)"""
+        return load_news_frame(self.news_collector.repository.data_version(), days_back, columns)
+
+    def query(self, method, *args, **kwargs):
+        """Read through the query cache, keyed on the current data_version"""
+        return query_repository(self.news_collector.repository.data_version(), method, *args, **kwargs)
 
-    def run_collection_workflow(self, selected_sources):
-        """Run news collection workflow"""
+    def start_collection(self, selected_sources, force=False):
+        """Start the collection workflow as a background job (incremental unless force=True)"""
+        all_sources = []
+        for category, sources in NEWS_SOURCES.items():
+            if category in selected_sources:
+                all_sources.extend(sources)
+        
         try:
-            with st.spinner("Collecting AI news..."):
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                # Step 1: Collect news
-                status_text.text("Step 1/3: Collecting news from RSS feeds...")
-                progress_bar.progress(33)
-                
-                all_sources = []
-                for category, sources in NEWS_SOURCES.items():
-                    if category in selected_sources:
-                        all_sources.extend(sources)
-                
-                news_items = self.news_collector.collect_rss_news(all_sources)
-                
-                # Step 2: Process content
-                status_text.text(f"Step 2/3: Processing {len(news_items)} news items...")
-                progress_bar.progress(66)
-                
-                processed_count = 0
-                for item in news_items:
-                    # Extract content
-                    item.content = self.news_collector.extract_full_content(item.url)
-                    
-                    # AI summary
-                    item.ai_summary = self.llm_processor.summarize_news_item(item)
-                    
-                    # Save to database
-                    self.save_news_item(item)
-                    processed_count += 1
-                
-                """ 
-                # Step 3: Generate digest
-                status_text.text("Step 3/4: Generating daily digest...")
-                progress_bar.progress(75)
-                
-                today = datetime.now().strftime('%Y-%m-%d')
-                daily_digest = self.llm_processor.generate_daily_digest(news_items, today)
-                """
-              
-                # Step 4: Output
-                status_text.text("Step 3/3: Saving outputs...")
-                progress_bar.progress(90)
-                today = datetime.now().strftime('%Y-%m-%d')
+            self.job_runner.submit(
+                'collect',
+                lambda ctx: self.collection_job(ctx, all_sources, force),
+                params={'categories': selected_sources, 'force': force}
+            )
+        except JobAlreadyRunning as e:
+            st.sidebar.warning(f"Collection job #{e.job_id} is already running")
 
-                # Save to Obsidian
-                self.output_dispatcher.save_to_obsidian_comprehensive(news_items, today)
-                
-                # Complete
-                progress_bar.progress(100)
-                status_text.text("✅ Workflow completed successfully!")
-                
-                st.session_state.last_collection = datetime.now()
-                return processed_count
-                
-        except Exception as e:
-            st.error(f"Workflow failed: {str(e)}")
-            return 0
+    def collection_job(self, ctx, all_sources, force=False):
+        """Runs in the job runner's thread: no Streamlit calls here, progress goes to the jobs table"""
+        # Step 1-2: Collect and process news as a streaming pipeline
+        ctx.progress(done=0, total=len(all_sources), message="Step 1/2: Collecting and processing news from RSS feeds...")
+        
+        pipeline = NewsPipeline(self.news_collector, self.llm_processor, force=force)
+        fetch_stats = pipeline.pipeline.stats[0]
+        news_items = []
 
-    def save_news_item(self, item):
-        """Save news item to database"""
-        conn = sqlite3.connect(self.news_collector.db_path)
-        cursor = conn.cursor()
+        def report_progress():
+            ctx.check_cancelled()
+            depths = ", ".join(f"{name} {depth}" for name, depth in pipeline.pipeline.queue_depths().items())
+            ctx.progress(done=fetch_stats.processed, items=len(news_items),
+                         message=f"Step 1/2: Processed {len(news_items)} news items (queued: {depths})")
+
+        # The pipeline also polls while output is held back during fetching, so Cancel works before the first item
+        results = pipeline.run(all_sources, poll=report_progress)
         try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO news_items 
-                (title, url, summary, published_date, source, content, ai_summary)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                item.title,
-                item.url,
-                item.summary,
-                item.published_date.isoformat(),
-                item.source,
-                item.content,
-                item.ai_summary
-            ))
-            conn.commit()
+            for item in results:
+                news_items.append(item)
+                report_progress()
         finally:
-            conn.close()
+            results.close()  # 取消时停止流水线的各个阶段
+        processed_count = len(news_items) - len(pipeline.skipped)
+        
+        """ 
+        # Step 3: Generate digest
+        status_text.text("Step 3/4: Generating daily digest...")
+        progress_bar.progress(75)
+        
+        today = datetime.now().strftime('%Y-%m-%d')
+        daily_digest = self.llm_processor.generate_daily_digest(news_items, today)
+        """
+      
+        # Step 4: Output
+        ctx.check_cancelled()
+        ctx.progress(done=len(all_sources), message="Step 2/2: Saving outputs...")
+        today = datetime.now().strftime('%Y-%m-%d')
+
+        # Fan the digest out to Obsidian, Feishu, ... in parallel (email is sent from the sidebar button)
+        outputs = self.output_dispatcher.dispatch(news_items, today, skip=('email',))
+        
+        return {'processed': processed_count, 'skipped': len(pipeline.skipped), 'report': pipeline.report(),
+                'outputs': outputs}
+
+    def render_job_status(self):
+        """Sidebar status of the latest collection job; polls while it is running"""
+        job = self.job_store.latest('collect')
+        if job is None:
+            return
+        running = job['status'] in ACTIVE_STATUSES
+        st.fragment(self._job_status, run_every=JOB_CONFIG['poll_interval'] if running else None)(running)
+
+    def _job_status(self, was_running):
+        job = self.job_store.latest('collect')
+        if job['status'] in ACTIVE_STATUSES:
+            total = max(job['progress_total'], 1)
+            st.progress(min(job['progress_done'] / total, 1.0),
+                        text=f"Job #{job['id']}: {job['progress_done']}/{job['progress_total']} feeds, "
+                             f"{job['items_done']} items")
+            st.caption(job['message'] or "Queued")
+            if job['cancel_requested']:
+                st.caption("Cancelling...")
+            elif st.button("⏹️ Cancel", key=f"cancel_job_{job['id']}"):
+                self.job_store.request_cancel(job['id'])
+            return
+        
+        if was_running:
+            # The job just finished: rerun the whole page so the dashboard shows the new data
+            st.rerun(scope="app")
+        if job['status'] == 'completed':
+            st.success(f"Job #{job['id']}: processed {job['result']['processed']} news items!")
+            with st.expander("Pipeline stats"):
+                st.text(job['result']['report'])
+                for name, outcome in (job['result'].get('outputs') or {}).items():
+                    st.text(f"{name}: {outcome['status']} in {outcome['seconds']:.2f}s "
+                            f"{outcome.get('result') or outcome.get('error') or ''}")
+        elif job['status'] == 'cancelled':
+            st.info(f"Job #{job['id']} was cancelled")
+        else:
+            st.error(f"Job #{job['id']} failed: {job['message']}")
 
     def render_dashboard(self):
         """Render main dashboard"""
@@ -151,50 +208,53 @@ class AINewsApp:
         
         # Collection controls
         st.sidebar.subheader("Actions")
+        force_reprocess = st.sidebar.checkbox("Force re-process", value=False,
+                                              help="Re-extract and re-summarize articles that were already processed")
         if st.sidebar.button("🔄 Collect News", type="primary"):
-            count = self.run_collection_workflow(selected_sources)
-            if count > 0:
-                st.sidebar.success(f"Processed {count} news items!")
-                st.rerun()
+            self.start_collection(selected_sources, force=force_reprocess)
+        with st.sidebar:
+            self.render_job_status()
         
         if st.sidebar.button("📧 Send Email Digest"):
             # Generate and send email digest
-            df = self.load_news_from_db(days_back=1)
+            df = self.load_news_from_db(days_back=1, columns='id, title, source, published_date, ai_summary')
             if not df.empty:
                 today = datetime.now().strftime('%Y-%m-%d')
                 news_items = [row for _, row in df.iterrows()]
                 digest = self.llm_processor.generate_daily_digest(news_items, today)
-                self.output_dispatcher.send_email(
+                if self.output_dispatcher.send_email(
                     subject=f"AI News Digest - {today}",
                     content=digest
-                )
-                st.sidebar.success("Email sent!")
+                ):
+                    st.sidebar.success("Email queued for delivery!")
+                else:
+                    st.sidebar.error("Failed to queue email")
         
         # Main content
+        days_back = st.selectbox("History", [7, 30, 90, 365], index=0, format_func=lambda d: f"Last {d} days")
         col1, col2, col3, col4 = st.columns(4)
         
-        # Load recent data
-        df = self.load_news_from_db(days_back=7)
+        # Metrics and charts are served from the daily_source_counts rollup table
+        stats = self.query('dashboard_stats', days_back)
         
-        if df.empty:
+        if not stats['total']:
             st.warning("No news data found. Click 'Collect News' to get started.")
             return
         
         # Metrics
         with col1:
-            st.metric("Total Articles", len(df))
+            st.metric("Total Articles", stats['total'])
         
         with col2:
-            today_count = len(df[df['published_date'].dt.date == datetime.now().date()])
-            st.metric("Today's Articles", today_count)
+            st.metric("Today's Articles", stats['today'])
         
         with col3:
-            unique_sources = df['source'].nunique()
-            st.metric("Unique Sources", unique_sources)
+            st.metric("Unique Sources", stats['sources'])
         
         with col4:
-            if st.session_state.last_collection:
-                last_update = st.session_state.last_collection.strftime("%H:%M")
+            job = self.job_store.latest('collect')
+            if job and job['status'] == 'completed':
+                last_update = datetime.fromtimestamp(job['finished_ts']).strftime("%H:%M")
                 st.metric("Last Update", last_update)
         
         # Charts
@@ -202,15 +262,15 @@ class AINewsApp:
         
         with col1:
             st.subheader("📈 Articles by Date")
-            daily_counts = df.groupby(df['published_date'].dt.date).size()
-            fig = px.line(x=daily_counts.index, y=daily_counts.values,
+            daily_counts = self.query('daily_counts', days_back)
+            fig = px.line(x=[row['day'] for row in daily_counts], y=[row['count'] for row in daily_counts],
                          labels={'x': 'Date', 'y': 'Articles'})
             st.plotly_chart(fig, use_container_width=True)
         
         with col2:
             st.subheader("📊 Sources Distribution")
-            source_counts = df['source'].value_counts().head(10)
-            fig = px.bar(x=source_counts.values, y=source_counts.index,
+            source_counts = self.query('top_sources', days_back, 10)
+            fig = px.bar(x=[row['count'] for row in source_counts], y=[row['source'] for row in source_counts],
                         orientation='h', labels={'x': 'Articles', 'y': 'Source'})
             st.plotly_chart(fig, use_container_width=True)
 
@@ -221,9 +281,9 @@ class AINewsApp:
         # Filters
         col1, col2, col3 = st.columns(3)
         
-        df = self.load_news_from_db(days_back=30)
+        sources = self.query('list_sources', days=30)
         
-        if df.empty:
+        if not sources:
             st.warning("No news data available.")
             return
         
@@ -231,53 +291,130 @@ class AINewsApp:
             days_filter = st.selectbox("Days Back", [1, 3, 7, 14, 30], index=2)
         
         with col2:
-            sources = ['All'] + list(df['source'].unique())
-            source_filter = st.selectbox("Source", sources)
+            source_filter = st.selectbox("Source", ['All'] + sources)
+        source = None if source_filter == 'All' else source_filter
         
         with col3:
-            search_term = st.text_input("🔍 Search in titles")
-        
-        # Apply filters
-        filtered_df = df[df['published_date'] >= datetime.now() - timedelta(days=days_filter)]
-        
-        if source_filter != 'All':
-            filtered_df = filtered_df[filtered_df['source'] == source_filter]
+            search_term = st.text_input("🔍 Search news")
         
+        # Filtering, column projection and paging all happen in SQL
         if search_term:
-            filtered_df = filtered_df[filtered_df['title'].str.contains(search_term, case=False, na=False)]
-        
-        # Display news
-        st.write(f"Showing {len(filtered_df)} articles")
-        
-        for _, row in filtered_df.iterrows():
-            with st.expander(f"📄 {row['title'][:100]}..."):
-                col1, col2 = st.columns([3, 1])
-                
-                with col1:
-                    st.write(f"**Source:** {row['source']}")
-                    st.write(f"**Published:** {row['published_date']}")
-                    st.write(f"**URL:** [{row['url']}]({row['url']})")
-                
-                with col2:
-                    if st.button(f"🤖 Generate Summary", key=f"sum_{row['id']}"):
-                        if not row['ai_summary']:
-                            # Generate summary if not exists
-                            summary = self.llm_processor.summarize_news_item(row)
-                            # Update in database
-                            conn = sqlite3.connect(self.news_collector.db_path)
-                            cursor = conn.cursor()
-                            cursor.execute('UPDATE news_items SET ai_summary=? WHERE id=?', 
-                                         (summary, row['id']))
-                            conn.commit()
-                            conn.close()
-                            st.rerun()
-                
-                if row['ai_summary']:
-                    st.markdown("**AI Summary:**")
-                    st.markdown(row['ai_summary'])
+            # Full-text search (FTS5) over title, summary, content and AI summary
+            rows = self.search_news(search_term, days_filter, source)
+        else:
+            rows = self.list_news_page(days_filter, source)
+        
+        for row in rows:
+            self.render_news_item(row)
+
+    def list_news_page(self, days, source=None):
+        """One page of the news list, newest first, using keyset pagination"""
+        page_size = UI_CONFIG['news_page_size']
+        
+        # cursors[i] is the (published_ts, id) of the last row before page i
+        filters = (days, source)
+        if st.session_state.get('news_list_filters') != filters:
+            st.session_state.news_list_filters = filters
+            st.session_state.news_list_cursors = [None]
+        cursors = st.session_state.news_list_cursors
+        
+        total = self.query('count_news', days=days, source=source)
+        rows = self.query('list_news', days=days, source=source, limit=page_size + 1, after=cursors[-1])
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+        
+        first = (len(cursors) - 1) * page_size
+        st.write(f"Showing {first + 1 if rows else 0}-{first + len(rows)} of {total} articles")
+        
+        prev_col, next_col = st.columns(2)
+        with prev_col:
+            if st.button("⬅️ Newer", disabled=len(cursors) == 1):
+                cursors.pop()
+                st.rerun()
+        with next_col:
+            if st.button("Older ➡️", disabled=not has_next):
+                cursors.append((rows[-1]['published_ts'], rows[-1]['id']))
+                st.rerun()
+        return rows
+
+    def render_news_item(self, row):
+        """One article; content and AI summary are only queried while the expander is open"""
+        expander = st.expander(f"📄 {row['title'][:100]}...", key=f"news_{row['id']}", on_change="rerun")
+        with expander:
+            if not expander.open:
+                return
+            details = self.query('get_news_details', row['id'])
+            if details is None:
+                return
+            published = datetime.fromisoformat(row['published_date'])
+            col1, col2 = st.columns([3, 1])
+            
+            with col1:
+                if 'snippet' in row.keys() and row['snippet']:
+                    st.markdown(f"*…{row['snippet']}…*")
+                st.write(f"**Source:** {row['source']}")
+                st.write(f"**Published:** {published:%Y-%m-%d %H:%M}")
+                st.write(f"**URL:** [{row['url']}]({row['url']})")
+            
+            with col2:
+                generate = st.button(f"🤖 Generate Summary", key=f"sum_{row['id']}")
+            
+            if generate and not details['ai_summary']:
+                # Stream the summary into the page as tokens arrive
+                st.markdown("**AI Summary:**")
+                item = NewsItem(
+                    title=row['title'],
+                    url=row['url'],
+                    summary=details['summary'] or "",
+                    published_date=published,
+                    source=row['source'],
+                    content=details['content'] or "",
+                    # Content extraction is deferred during collection; fetch it now for the summary
+                    content_loader=self.news_collector.extract_full_content
+                )
+                if not item.content:
+                    with st.spinner("Fetching article..."):
+                        item.get_content()
+                try:
+                    stream = self.llm_processor.summarize_news_item(item, stream=True)
+                    summary = st.write_stream(stream)
+                except Exception as e:
+                    st.error(f"Summary failed: {e}")
                 else:
-                    st.write("**Original Summary:**")
-                    st.write(row['summary'][:500] + "..." if len(row['summary']) > 500 else row['summary'])
+                    st.session_state[f"llm_metrics_{row['id']}"] = stream.metrics.describe()
+                    # Update in database, keeping the fetched content for later views and searches
+                    self.news_collector.repository.update_ai_summary(row['id'], summary, content=item.content)
+                    st.rerun()
+            
+            if details['ai_summary']:
+                st.markdown("**AI Summary:**")
+                st.markdown(details['ai_summary'])
+                metrics = st.session_state.get(f"llm_metrics_{row['id']}")
+                if metrics:
+                    st.caption(metrics)
+            else:
+                summary = details['summary'] or ""
+                st.write("**Original Summary:**")
+                st.write(summary[:500] + "..." if len(summary) > 500 else summary)
+
+    def search_news(self, search_term, days, source=None):
+        """One page of bm25-ranked search results"""
+        total = self.query('count_search', search_term, days=days, source=source)
+        page_size = UI_CONFIG['search_page_size']
+        pages = max(1, -(-total // page_size))
+        page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, value=1) if pages > 1 else 1
+        
+        start = time.perf_counter()
+        rows = self.query('search_news', search_term, days=days, source=source,
+                                      limit=page_size, offset=(page - 1) * page_size)
+        elapsed_ms = (time.perf_counter() - start) * 1000
+        st.write(f"Found {total} articles matching \"{search_term}\" ({elapsed_ms:.0f} ms)")
+        # Archived months have no full-text index, so search only covers the main database
+        archived = self.query('archived_months', days)
+        if archived:
+            st.caption(f"Search does not include archived news ({', '.join(sorted(archived))}); "
+                       "browse without a search term to see it.")
+        return rows
 
     def render_settings(self):
         """Render settings page"""
@@ -0,0 +1,111 @@
+# bench_content_extraction.py - 正文抽取速度与质量对比
+#
+# 对 benchmarks/fixtures 下的HTML页面比较:
+#   baseline      - 原实现: BeautifulSoup(html.parser) + get_text() 整页文字
+#   text          - content_extractor.extract_text (增量html.parser, 整页文字)
+#   main/<parser> - content_extractor.extract_main_content (去模板内容, 只保留正文)
+# 每个fixture旁边的 .txt 是人工标注的正文, 用词级别的precision/recall衡量抽取质量.
+# 页面会用重复的脚本和侧边栏填充到接近真实网页的大小.
+#
+#   python benchmarks/bench_content_extraction.py
+import os
+import re
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from bs4 import BeautifulSoup  # noqa: E402
+
+from content_extractor import HAS_LXML, extract_main_content, extract_text  # noqa: E402
+
+FIXTURES = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+MAX_CHARS = 5000
+PAGES_PER_RUN = 60
+PADDING = ("<script>" + "var tracking_config = {id: 'x', events: ['view', 'click', 'scroll']};" * 40 + "</script>"
+           '<div class="sidebar"><ul>' + '<li><a href="/more">More stories you might like from our network</a></li>' * 30
+           + "</ul></div>")
+
+
+def baseline_extract(html: bytes, max_chars: int = MAX_CHARS) -> str:
+    """原来NewsCollector.extract_full_content中的抽取逻辑"""
+    soup = BeautifulSoup(html, 'html.parser')
+    for script in soup(["script", "style"]):
+        script.decompose()
+    content = soup.get_text()
+    lines = (line.strip() for line in content.splitlines())
+    chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
+    content = ' '.join(chunk for chunk in chunks if chunk)
+    return content[:max_chars]
+
+
+def tokens(text: str) -> Counter:
+    return Counter(re.findall(r'[一-鿿]|[a-z0-9]+', text.lower()))
+
+
+def quality(extracted: str, expected: str):
+    got, want = tokens(extracted), tokens(expected)
+    overlap = sum((got & want).values())
+    precision = overlap / max(sum(got.values()), 1)
+    recall = overlap / max(sum(want.values()), 1)
+    return precision, recall
+
+
+def load_fixtures(padding_copies: int = 40):
+    pages = []
+    for name in sorted(os.listdir(FIXTURES)):
+        if not name.endswith('.html'):
+            continue
+        with open(os.path.join(FIXTURES, name), 'rb') as f:
+            html = f.read()
+        with open(os.path.join(FIXTURES, name[:-5] + '.txt'), encoding='utf-8') as f:
+            expected = f.read()
+        padded = html.replace(b'</body>', PADDING.encode('utf-8') * padding_copies + b'</body>')
+        pages.append((name, padded, expected))
+    return pages
+
+
+def pages_per_second(func, pages, pool=None) -> float:
+    docs = [pages[i % len(pages)][1] for i in range(PAGES_PER_RUN)]
+    start = time.perf_counter()
+    if pool:
+        list(pool.map(func, docs, chunksize=4))
+    else:
+        for doc in docs:
+            func(doc)
+    return PAGES_PER_RUN / (time.perf_counter() - start)
+
+
+def main():
+    pages = load_fixtures()
+    avg_kb = sum(len(page[1]) for page in pages) / len(pages) / 1024
+    print(f"fixtures: {len(pages)} pages, avg {avg_kb:.0f} KB after padding, lxml available: {HAS_LXML}\n")
+
+    methods = {
+        'baseline': baseline_extract,
+        'text': partial(extract_text, max_chars=MAX_CHARS),
+        'main/html.parser': partial(extract_main_content, max_chars=MAX_CHARS, backend='html.parser'),
+    }
+    if HAS_LXML:
+        methods['main/lxml'] = partial(extract_main_content, max_chars=MAX_CHARS, backend='lxml')
+
+    print(f"{'method':<20}{'pages/s':>10}{'precision':>11}{'recall':>8}")
+    for name, func in methods.items():
+        scores = [quality(func(html), expected) for _, html, expected in pages]
+        precision = sum(score[0] for score in scores) / len(scores)
+        recall = sum(score[1] for score in scores) / len(scores)
+        print(f"{name:<20}{pages_per_second(func, pages):>10.1f}{precision:>11.2f}{recall:>8.2f}")
+
+    processes = min(4, os.cpu_count() or 1)
+    best = 'main/lxml' if HAS_LXML else 'main/html.parser'
+    with ProcessPoolExecutor(max_workers=processes) as pool:
+        pool.map(str, range(processes))  # 预热子进程
+        rate = pages_per_second(methods[best], pages, pool)
+    print(f"\n{best} with {processes} processes: {rate:.1f} pages/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,148 @@
+# bench_db_queries.py - 仪表盘查询在大库上的耗时 (迁移前 vs 迁移后)
+#
+# 生成一个合成的旧版数据库 (schema v1: 只有文本时间, 除url外没有索引), 先按原来的SQL
+# 执行仪表盘查询和标题搜索, 再用 migrations.MIGRATIONS 原地迁移, 按新的SQL执行同样的查询.
+#
+#   python benchmarks/bench_db_queries.py [--rows 1000000] [--days 365] [--keep]
+import argparse
+import os
+import random
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from migrations import MIGRATIONS  # noqa: E402
+from news_repository import NewsRepository  # noqa: E402
+
+SOURCES = [f"Source {i:02d}" for i in range(40)]
+REPEATS = 5
+
+# (名称, 迁移前的SQL, 迁移后的SQL)
+QUERIES = [
+    ('news list, 7 days',
+     "SELECT * FROM news_items WHERE published_date >= date('now', '-7 days') ORDER BY published_date DESC",
+     "SELECT * FROM news_items WHERE published_ts >= CAST(strftime('%s', 'now', '-7 days', 'start of day') AS INTEGER) "
+     "ORDER BY published_ts DESC"),
+    ('today count',
+     "SELECT COUNT(*) FROM news_items WHERE published_date >= date('now')",
+     "SELECT COUNT(*) FROM news_items WHERE published_ts >= CAST(strftime('%s', 'now', 'start of day') AS INTEGER)"),
+    ('one source, 30 days',
+     "SELECT id, title FROM news_items WHERE source = 'Source 07' AND published_date >= date('now', '-30 days') "
+     "ORDER BY published_date DESC",
+     "SELECT id, title FROM news_items WHERE source = 'Source 07' "
+     "AND published_ts >= CAST(strftime('%s', 'now', '-30 days', 'start of day') AS INTEGER) ORDER BY published_ts DESC"),
+    ('per source, 30 days',
+     "SELECT source, COUNT(*) FROM news_items WHERE published_date >= date('now', '-30 days') GROUP BY source",
+     "SELECT source, COUNT(*) FROM news_items "
+     "WHERE published_ts >= CAST(strftime('%s', 'now', '-30 days', 'start of day') AS INTEGER) GROUP BY source"),
+    # 原界面在30天的数据上对标题做子串匹配; 迁移后用FTS5索引 (这里同样只查标题列以便核对条数)
+    ('title search, 30 days',
+     "SELECT id FROM news_items WHERE published_date >= date('now', '-30 days') AND title LIKE '%model1234%'",
+     "SELECT n.id FROM news_items_fts JOIN news_items n ON n.id = news_items_fts.rowid "
+     "WHERE news_items_fts MATCH '{title}: \"model1234\"*' "
+     "AND n.published_ts >= CAST(strftime('%s', 'now', '-30 days', 'start of day') AS INTEGER) "
+     "ORDER BY bm25(news_items_fts)"),
+    ('full-text search, top 20',
+     "SELECT id FROM news_items WHERE title LIKE '%model1234%' OR summary LIKE '%model1234%' "
+     "OR content LIKE '%model1234%' OR ai_summary LIKE '%model1234%' LIMIT 20",
+     "SELECT n.id FROM news_items_fts JOIN news_items n ON n.id = news_items_fts.rowid "
+     "WHERE news_items_fts MATCH '\"model1234\"*' ORDER BY bm25(news_items_fts) LIMIT 20"),
+    # 仪表盘图表: 迁移后读daily_source_counts汇总表, 与覆盖的天数无关
+    ('per day, 365 days',
+     "SELECT date(published_date), COUNT(*) FROM news_items WHERE published_date >= date('now', '-365 days') "
+     "GROUP BY 1",
+     "SELECT day, SUM(count) FROM daily_source_counts WHERE day >= date('now', '-365 days') GROUP BY day"),
+    ('top sources, 365 days',
+     "SELECT source, COUNT(*) AS n FROM news_items WHERE published_date >= date('now', '-365 days') "
+     "GROUP BY source ORDER BY n DESC LIMIT 10",
+     "SELECT source, SUM(count) AS n FROM daily_source_counts WHERE day >= date('now', '-365 days') "
+     "GROUP BY source ORDER BY n DESC LIMIT 10"),
+]
+TOPICS = ['OpenAI', 'robotics', 'transformer', 'diffusion', 'benchmark', 'chip', 'agents', 'policy', 'funding']
+
+
+def build_legacy_db(path: str, rows: int, days: int):
+    conn = sqlite3.connect(path)
+    conn.execute("PRAGMA journal_mode = WAL")
+    conn.execute("PRAGMA synchronous = OFF")
+    MIGRATIONS[0][2](conn)  # v1, 旧版结构
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    batch = []
+    for i in range(rows):
+        published = now - timedelta(seconds=rng.randrange(days * 86400))
+        title = f"{rng.choice(TOPICS)} {rng.choice(TOPICS)} model{rng.randrange(5000)} headline {i}"
+        batch.append((title, f"https://example.com/{i}", "summary " * 20,
+                      published.replace(microsecond=0).isoformat(), rng.choice(SOURCES), "content " * 60,
+                      "ai summary " * 10))
+        if len(batch) == 50000:
+            _insert(conn, batch)
+            batch = []
+    _insert(conn, batch)
+    conn.commit()
+    conn.close()
+
+
+def _insert(conn, batch):
+    conn.executemany('''
+        INSERT INTO news_items (title, url, summary, published_date, source, content, ai_summary)
+        VALUES (?, ?, ?, ?, ?, ?, ?)
+    ''', batch)
+
+
+def timed(conn, sql: str):
+    best, count = float('inf'), 0
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        count = len(conn.execute(sql).fetchall())
+        best = min(best, time.perf_counter() - start)
+    plan = '; '.join(row[3] for row in conn.execute('EXPLAIN QUERY PLAN ' + sql))
+    return best, count, plan
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--rows', type=int, default=1_000_000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--keep', action='store_true', help='保留生成的数据库文件')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_db_')
+    path = os.path.join(workdir, 'news.db')
+    try:
+        start = time.perf_counter()
+        build_legacy_db(path, args.rows, args.days)
+        size_mb = os.path.getsize(path) / 1024 / 1024
+        print(f"built {args.rows} rows over {args.days} days in {time.perf_counter() - start:.1f}s ({size_mb:.0f} MB)\n")
+
+        conn = sqlite3.connect(path)
+        before = [timed(conn, legacy) for _, legacy, _ in QUERIES]
+        conn.close()
+
+        repository = NewsRepository.for_path(path)
+        start = time.perf_counter()
+        repository.migrate(MIGRATIONS)
+        print(f"in-place migration: {time.perf_counter() - start:.1f}s\n")
+        conn = repository.connection()
+        after = [timed(conn, migrated) for _, _, migrated in QUERIES]
+        repository.close()
+
+        print(f"{'query':<26}{'rows':>8}{'before ms':>11}{'after ms':>10}{'speedup':>9}")
+        for (name, _, _), (old, count, old_plan), (new, new_count, new_plan) in zip(QUERIES, before, after):
+            assert count == new_count, f"{name}: {count} != {new_count}"
+            print(f"{name:<26}{count:>8}{old * 1000:>11.1f}{new * 1000:>10.1f}{old / new:>8.1f}x")
+            print(f"{'':<4}before: {old_plan}\n{'':<4}after:  {new_plan}")
+    finally:
+        if args.keep:
+            print(f"\ndatabase kept at {path}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
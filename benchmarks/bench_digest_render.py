@@ -0,0 +1,170 @@
+# bench_digest_render.py - 日报渲染耗时 (原实现 vs digest_renderer)
+#
+# 合成一天5000条已总结的新闻, 比较:
+#   legacy   - 原create_comprehensive_digest (逐段 += 拼接) + send_email中对整篇文本的markdown.markdown
+#   renderer - DigestRenderer: 中间模型 + 预编译模板, 一次遍历同时写出Markdown和HTML
+#   cached   - 同一天新闻未变化时再次获取 (Obsidian和邮件共用一份渲染结果)
+# 并核对两者生成的Markdown一致 (生成时间行除外), 以及每条摘要的HTML与markdown.markdown一致.
+#
+#   python benchmarks/bench_digest_render.py [--items 5000] [--sources 40]
+import argparse
+import os
+import sys
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import markdown  # noqa: E402
+
+from digest_renderer import DigestRenderer, summary_to_html  # noqa: E402
+from news_collector import NewsItem  # noqa: E402
+
+REPEATS = 3
+# 与LLMProcessor生成的摘要格式相同
+SUMMARY = ("## {topic} headline number {i}\n\n"
+           "**来源**: Source  \n**时间**: 2026-10-01  \n**标签**: #AI #{topic}\n\n"
+           "### 核心要点\n- {topic} model {i} released with improved benchmark results\n"
+           "- Trained on a larger research dataset\n- Available to startup customers through an API\n\n"
+           "### 技术影响\nAnalysts expect the LLM market to react.\n\n---\n")
+TOPICS = ['OpenAI', 'robotics', 'transformer', 'diffusion', 'benchmark', 'chip', 'agents', 'policy', 'funding']
+
+
+def legacy_digest(news_items, date: str) -> str:
+    """原来EnhancedOutputDispatcher.create_comprehensive_digest的实现 (逐段 += 拼接)"""
+    processed_items = [item for item in news_items if item.ai_summary]
+
+    if not processed_items:
+        return f"# AI News Digest - {date}\n\nNo news items processed today."
+
+    # Group by source
+    by_source = {}
+    for item in processed_items:
+        if item.source not in by_source:
+            by_source[item.source] = []
+        by_source[item.source].append(item)
+
+    # Create digest content
+    digest = f"""---
+title: "AI News Digest - {date}"
+date: {date}
+type: daily_digest
+item_count: {len(processed_items)}
+sources: {len(by_source)}
+---
+
+# 🤖 AI News Digest - {date}
+
+**Summary**: {len(processed_items)} articles from {len(by_source)} sources
+
+## 📊 Overview
+
+- **Total Articles**: {len(processed_items)}
+- **Unique Sources**: {len(by_source)}
+- **Generated**: {datetime.now().strftime('%Y-%m-%d %H:%M')}
+
+## 📰 Top Stories
+
+"""
+
+    # Add top stories (first 3 items)
+    for i, item in enumerate(processed_items[:3]):
+        digest += f"""
+### {i+1}. {item.title}
+
+**Source**: {item.source} | **Time**: {item.published_date.strftime('%H:%M')}
+
+{item.ai_summary}
+
+[Read Original]({item.url})
+
+---
+"""
+
+    # Add articles by source
+    digest += "\n## 📑 Articles by Source\n\n"
+
+    for source, items in by_source.items():
+        digest += f"\n### {source} ({len(items)} articles)\n\n"
+
+        for item in items:
+            digest += f"""
+#### [{item.title}]({item.url})
+*{item.published_date.strftime('%Y-%m-%d %H:%M')}*
+
+{item.ai_summary}...
+
+---
+"""
+
+    # Add footer
+    digest += f"""
+## 🔗 Quick Links
+
+All individual articles have been saved as separate notes in the AI_News/Individual folder.
+
+---
+*Digest generated by AI News Aggregator on {datetime.now().strftime('%Y-%m-%d %H:%M')}*
+"""
+
+    return digest
+
+
+def build_items(count: int, sources: int):
+    start = datetime(2026, 10, 1)
+    return [NewsItem(title=f"{TOPICS[i % len(TOPICS)]} headline number {i}", url=f"https://example.com/{i}",
+                     summary="summary " * 20, published_date=start + timedelta(seconds=i * 17),
+                     source=f"Source {i % sources:02d}", ai_summary=SUMMARY.format(topic=TOPICS[i % len(TOPICS)], i=i))
+            for i in range(count)]
+
+
+def best_of(func) -> float:
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def without_timestamps(text: str) -> str:
+    return '\n'.join(line for line in text.splitlines() if 'Generated' not in line and 'generated by' not in line)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--items', type=int, default=5000)
+    parser.add_argument('--sources', type=int, default=40)
+    args = parser.parse_args()
+
+    items = build_items(args.items, args.sources)
+    date = '2026-10-01'
+
+    def legacy():
+        text = legacy_digest(items, date)
+        markdown.markdown(text)
+
+    def renderer():
+        DigestRenderer().render(items, date)
+
+    cache = DigestRenderer()
+    cache.render(items, date)
+
+    legacy_s = best_of(legacy)
+    renderer_s = best_of(renderer)
+    cached_s = best_of(lambda: cache.render(items, date))
+
+    rendered = cache.render(items, date)
+    assert without_timestamps(rendered.markdown) == without_timestamps(legacy_digest(items, date))
+    # 每条摘要的HTML与原来markdown.markdown的转换结果一致
+    for item in items[:50]:
+        assert summary_to_html(item.ai_summary) == markdown.markdown(item.ai_summary), item.ai_summary
+    print(f"{args.items} items, {args.sources} sources: markdown {len(rendered.markdown) / 1024:.0f} KB, "
+          f"html {len(rendered.html) / 1024:.0f} KB\n")
+    print(f"{'variant':<12}{'ms':>10}{'speedup':>9}")
+    for name, seconds in (('legacy', legacy_s), ('renderer', renderer_s), ('cached', cached_s)):
+        print(f"{name:<12}{seconds * 1000:>10.1f}{legacy_s / seconds:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+# bench_email_outbox.py - EmailOutbox 对本地aiosmtpd服务的发送耗时与重试行为
+#
+# 本地aiosmtpd (pip install aiosmtpd) 充当SMTP服务器, 依次检查:
+#   batch     - 一批邮件共用一个SMTP会话, 与原send_email每封邮件新建连接的耗时对比
+#   retry     - 服务器临时拒绝 (451) 时按指数退避重试, 最终发送成功
+#   permanent - 服务器永久拒绝 (554) 时不再重试, 直接标记为failed
+#   down      - 服务器不可用时邮件留在队列中等待重试
+#
+#   python benchmarks/bench_email_outbox.py [--messages 50]
+import argparse
+import os
+import shutil
+import smtplib
+import socket
+import sys
+import tempfile
+import time
+from email.mime.text import MIMEText
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from aiosmtpd.controller import Controller  # noqa: E402
+
+from email_outbox import EmailOutbox  # noqa: E402
+
+HOST = '127.0.0.1'
+
+
+class RecordingHandler:
+    """记录收到的邮件和会话数; reject中的应答码会依次用于接下来的DATA命令"""
+
+    def __init__(self):
+        self.messages = []
+        self.sessions = 0
+        self.reject = []
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        if self.reject:
+            return self.reject.pop(0)
+        self.messages.append(envelope)
+        return '250 OK'
+
+
+def message(i: int) -> MIMEText:
+    msg = MIMEText(f"## AI新闻日报 {i}\n\n" + "摘要内容 " * 200, 'plain', 'utf-8')
+    msg['Subject'] = f"AI新闻日报 - {i}"
+    return msg
+
+
+def make_outbox(workdir: str, port: int, **overrides) -> EmailOutbox:
+    config = {'smtp_server': HOST, 'smtp_port': port, 'use_tls': False, 'password': None,
+              'email': 'news@example.com', 'to_email': 'a@example.com, b@example.com',
+              'retry_base_delay': 1, 'retry_max_delay': 8, 'max_attempts': 5, **overrides}
+    return EmailOutbox(os.path.join(workdir, f"outbox_{time.monotonic_ns()}.db"), config)
+
+
+def legacy_send(port: int, count: int):
+    """原send_email: 每封邮件单独连接、发送、退出"""
+    for i in range(count):
+        server = smtplib.SMTP(HOST, port)
+        server.send_message(message(i), 'news@example.com', ['a@example.com', 'b@example.com'])
+        server.quit()
+
+
+def check_batch(workdir, handler, port, count):
+    start = time.perf_counter()
+    legacy_send(port, count)
+    legacy = time.perf_counter() - start
+
+    handler.sessions, handler.messages = 0, []
+    outbox = make_outbox(workdir, port, batch_size=count)
+    for i in range(count):
+        outbox.enqueue(message(i))
+    start = time.perf_counter()
+    report = outbox.flush()
+    batched = time.perf_counter() - start
+
+    assert report == {'sent': count, 'failed': 0}, report
+    assert handler.sessions == 1, handler.sessions
+    assert len(handler.messages) == count and handler.messages[0].rcpt_tos == ['a@example.com', 'b@example.com']
+    print(f"batch:     {count} messages, 1 session; legacy {legacy * 1000:.0f} ms, outbox {batched * 1000:.0f} ms "
+          f"({legacy / batched:.1f}x)")
+
+
+def check_retry(workdir, handler, port):
+    handler.reject = ['451 4.3.0 Try again later', '451 4.3.0 Try again later']
+    outbox = make_outbox(workdir, port)
+    outbox_id = outbox.enqueue(message(0))
+    delays = []
+    while outbox.get(outbox_id)['status'] != 'sent':
+        before = int(time.time())
+        outbox.flush()
+        entry = outbox.get(outbox_id)
+        if entry['status'] == 'pending':
+            delays.append(entry['next_attempt_ts'] - before)
+            assert outbox.flush() == {'sent': 0, 'failed': 0}  # 退避期间不会重发
+            time.sleep(entry['next_attempt_ts'] - time.time() + 0.05)
+    entry = outbox.get(outbox_id)
+    assert entry['attempts'] == 2 and delays[1] >= 2 * delays[0] - 1, (entry, delays)
+    print(f"retry:     sent after {entry['attempts']} temporary failures, backoff {delays} s")
+
+
+def check_permanent(workdir, handler, port):
+    handler.reject = ['554 5.6.0 Message rejected']
+    outbox = make_outbox(workdir, port)
+    outbox_id = outbox.enqueue(message(0))
+    outbox.flush()
+    entry = outbox.get(outbox_id)
+    assert entry['status'] == 'failed' and entry['attempts'] == 1, entry
+    print(f"permanent: failed without retry ({entry['last_error']})")
+
+
+def check_down(workdir, port):
+    outbox = make_outbox(workdir, port, timeout=2)
+    outbox_id = outbox.enqueue(message(0))
+    outbox.flush()
+    entry = outbox.get(outbox_id)
+    assert entry['status'] == 'pending' and entry['next_attempt_ts'] > time.time(), entry
+    print(f"down:      kept pending for retry ({entry['last_error']})")
+
+
+def free_port() -> int:
+    # aiosmtpd的Controller不支持port=0, 先向系统要一个空闲端口
+    with socket.socket() as sock:
+        sock.bind((HOST, 0))
+        return sock.getsockname()[1]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--messages', type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench_outbox_')
+    handler = RecordingHandler()
+    port = free_port()
+    controller = Controller(handler, hostname=HOST, port=port)
+    controller.start()
+    try:
+        check_batch(workdir, handler, port, args.messages)
+        check_retry(workdir, handler, port)
+        check_permanent(workdir, handler, port)
+    finally:
+        controller.stop()
+    try:
+        check_down(workdir, port)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+# bench_llm_parallel.py - LLMProcessor.summarize_many 并发度与耗时
+#
+# 本地假Ollama服务每个请求延迟LATENCY秒, 最多同时处理SERVER_PARALLEL个请求.
+# 在并发上限以内, 总耗时应随max_in_flight近似线性下降; 超过LLMProcessor自身的上限 (配置的max_in_flight)
+# 后请求在处理器内排队, 不再改善.
+#
+#   python benchmarks/bench_llm_parallel.py
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_ollama import FakeOllamaServer  # noqa: E402
+
+from llm_processor import LLMProcessor  # noqa: E402
+from news_collector import NewsItem  # noqa: E402
+
+LATENCY = 0.4
+SERVER_PARALLEL = 4
+ITEMS = 16
+
+
+def main():
+    items = [NewsItem(title=f"Article {i}", url=f"http://example.com/{i}", summary="summary",
+                      published_date=datetime.now(), source="bench") for i in range(ITEMS)]
+
+    with FakeOllamaServer(latency=LATENCY, parallel=SERVER_PARALLEL) as server, \
+            tempfile.TemporaryDirectory() as tmp:
+        processor = LLMProcessor(base_url=server.url, cache_db_path=os.path.join(tmp, 'bench.db'))
+        processor.summary_cache = None  # 每轮都必须真正请求服务端
+
+        print(f"{ITEMS} items, {LATENCY}s per request, server parallel={SERVER_PARALLEL}\n")
+        print(f"{'in flight':>10}{'seconds':>10}{'speed-up':>10}")
+        baseline = None
+        for in_flight in (1, 2, 4, 8):
+            start = time.perf_counter()
+            results = processor.summarize_many(items, max_in_flight=in_flight)
+            elapsed = time.perf_counter() - start
+            baseline = baseline or elapsed
+            assert len(results) == ITEMS and not any(r.startswith('总结生成失败') for r in results)
+            print(f"{in_flight:>10}{elapsed:>10.2f}{baseline / elapsed:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+# bench_rss_fetch.py - 顺序抓取 vs 并发抓取RSS的耗时对比
+#
+# 在本地起一个HTTP服务, 每个feed按路径上的延迟(毫秒)返回, 例如 /feed/800.xml
+# 延迟800ms. 并发模式下总耗时应接近最慢的feed, 而不是所有feed延迟之和.
+#
+#   python benchmarks/bench_rss_fetch.py
+import os
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from news_collector import NewsCollector  # noqa: E402
+
+DELAYS_MS = [200, 300, 400, 500, 600, 800, 1000, 1200, 300, 400, 500, 1500]
+
+
+def build_feed(name: str, items: int = 20) -> bytes:
+    now = format_datetime(datetime.now().astimezone())
+    entries = "".join(
+        f"<item><title>{name} item {i}</title><link>http://example.com/{name}/{i}</link>"
+        f"<description>summary {i}</description><pubDate>{now}</pubDate></item>"
+        for i in range(items)
+    )
+    return (f'<?xml version="1.0"?><rss version="2.0"><channel><title>{name}</title>'
+            f'{entries}</channel></rss>').encode('utf-8')
+
+
+class SlowFeedHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        delay_ms = int(self.path.rsplit('/', 1)[-1].split('.')[0])
+        time.sleep(delay_ms / 1000)
+        body = build_feed(self.path.strip('/'))
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/rss+xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+def run(collector: NewsCollector, urls):
+    start = time.perf_counter()
+    items = collector.collect_rss_news(urls)
+    return time.perf_counter() - start, items
+
+
+def main():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), SlowFeedHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    port = server.server_address[1]
+    urls = [f"http://127.0.0.1:{port}/feed{i}/{delay}.xml" for i, delay in enumerate(DELAYS_MS)]
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db_path = os.path.join(tmp, 'bench.db')
+        sequential = NewsCollector(db_path, max_workers=1, use_feed_cache=False)
+        # 所有feed都在同一个本地主机上, 放开per-host限制以模拟不同的站点
+        concurrent = NewsCollector(db_path, max_workers=len(urls), per_host_limit=len(urls),
+                                   use_feed_cache=False)
+
+        seq_time, seq_items = run(sequential, urls)
+        con_time, con_items = run(concurrent, urls)
+
+    server.shutdown()
+
+    same_order = [i.url for i in seq_items] == [i.url for i in con_items]
+    print(f"feeds: {len(urls)}  items: {len(con_items)}")
+    print(f"sum of delays : {sum(DELAYS_MS) / 1000:.2f}s")
+    print(f"slowest feed  : {max(DELAYS_MS) / 1000:.2f}s")
+    print(f"sequential    : {seq_time:.2f}s")
+    print(f"concurrent    : {con_time:.2f}s  (speed-up {seq_time / con_time:.1f}x)")
+    print(f"same order    : {same_order}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,79 @@
+# fake_ollama.py - 用于基准测试的本地Ollama替身
+#
+# 实现 /api/chat (非流式和流式), 每个请求固定延迟 latency 秒 (流式时为首token延迟, 之后每个token间隔token_delay秒),
+# 最多同时处理 parallel 个请求 (模拟 OLLAMA_NUM_PARALLEL), 其余排队.
+import json
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+class FakeOllamaServer:
+    def __init__(self, latency: float = 0.5, parallel: int = 4, reply=None, token_delay: float = 0.01):
+        self.latency = latency
+        self.token_delay = token_delay
+        self.slots = threading.Semaphore(parallel)
+        self.reply = reply or (lambda messages: "## 总结\n\n- 要点1\n- 要点2\n")
+        self.requests = []  # 收到的每个请求的messages, 便于检查prompt
+        self.server = ThreadingHTTPServer(('127.0.0.1', 0), self._handler())
+        self.server.daemon_threads = True
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self.server.server_address[1]}"
+
+    def __enter__(self):
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *exc):
+        self.server.shutdown()
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get('Content-Length', 0))) or b'{}')
+                messages = body.get('messages', [])
+                fake.requests.append(messages)
+                with fake.slots:
+                    time.sleep(fake.latency)
+                    content = fake.reply(messages)
+                if body.get('stream'):
+                    self._stream(body, content)
+                else:
+                    self._send_json(body, content)
+
+            def _chunk(self, body, content, done, eval_count=0):
+                chunk = {'model': body.get('model', 'fake'), 'created_at': '2026-01-01T00:00:00Z',
+                         'message': {'role': 'assistant', 'content': content}, 'done': done}
+                if done:
+                    chunk['eval_count'] = eval_count
+                return chunk
+
+            def _send_json(self, body, content):
+                tokens = len(re.findall(r'\s*\S+', content))
+                data = json.dumps(self._chunk(body, content, True, tokens)).encode('utf-8')
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def _stream(self, body, content):
+                self.send_response(200)
+                self.send_header('Content-Type', 'application/x-ndjson')
+                self.end_headers()
+                tokens = re.findall(r'\s*\S+', content)
+                for token in tokens:
+                    self.wfile.write((json.dumps(self._chunk(body, token, False)) + '\n').encode('utf-8'))
+                    self.wfile.flush()
+                    time.sleep(fake.token_delay)
+                self.wfile.write((json.dumps(self._chunk(body, '', True, len(tokens))) + '\n').encode('utf-8'))
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
@@ -45,7 +45,47 @@ NEWS_SOURCES = {
 # Database configuration
 DATABASE_CONFIG = {
     'path': 'ai_news.db',
-    'backup_days': 30
+    'backup_days': 30,          # 主库保留的天数, 更早的新闻移入月度归档库
+    'archive_dir': 'archive',   # 归档库目录 (相对于主库所在目录)
+    'archive_batch_size': 1000,
+    'vacuum_pages': 2000        # 每次增量VACUUM最多释放的页数, 0表示全部释放
+}
+
+# 后台任务配置
+JOB_CONFIG = {
+    'heartbeat_interval': 15,  # 运行中的任务每隔多少秒刷新心跳
+    'stale_after': 120,        # 心跳超过多少秒未刷新视为所在进程已退出
+    'poll_interval': 1.0       # 界面轮询任务状态的间隔(秒)
+}
+
+# RSS collection configuration
+COLLECTOR_CONFIG = {
+    'max_workers': 8,        # 全局并发抓取数, 1 表示顺序抓取
+    'per_host_limit': 2,     # 同一主机的最大并发连接数
+    'feed_timeout': 15,      # 单个feed的超时时间(秒)
+    'use_feed_cache': True,  # 使用ETag/Last-Modified条件请求, 未变化的feed不再解析
+    'content_timeout': 10,   # 抓取文章正文的超时时间(秒)
+    'content_max_chars': 5000,             # 正文最多保留的字符数, 够了就停止下载
+    'content_max_bytes': 2 * 1024 * 1024,  # 单个页面最多下载的字节数
+    'min_summary_chars': 200,  # RSS摘要短于此长度(或只是标题/被截断)时才抓取正文
+    'content_extractor': 'main',  # 'main': 去除导航/页脚等只保留正文; 'text': 流式提取整页文字
+    'parse_processes': min(4, os.cpu_count() or 1)  # 正文解析进程数, 0 表示在抓取线程内解析
+}
+
+# Duplicate story detection (MinHash + LSH over title and summary)
+DEDUP_CONFIG = {
+    'enabled': True,
+    'similarity_threshold': 0.6,  # 估计Jaccard相似度达到该值视为同一条新闻
+    'num_perm': 64,               # MinHash签名长度
+    'bands': 16                   # LSH分段数, 每段 num_perm / bands 行
+}
+
+# Streaming pipeline configuration
+# (fetch阶段的并发数沿用COLLECTOR_CONFIG['max_workers'], summarize阶段沿用LLM_CONFIG['max_in_flight'])
+PIPELINE_CONFIG = {
+    'extract_workers': 4,    # 并发抓取正文的线程数
+    'persist_batch_size': 50,  # 每个写事务最多包含的新闻条数
+    'queue_size': 16         # 阶段之间队列的容量, 队列满时上游阻塞
 }
 
 # LLM Configuration
@@ -53,7 +93,14 @@ LLM_CONFIG = {
     'model_name': 'llama3.1:8b',
     'base_url': 'http://localhost:11434',
     'temperature': 0.7,
-    'max_tokens': 1000
+    'max_tokens': 1000,
+    'max_in_flight': 4,         # 同时发给Ollama的请求数, 与服务端OLLAMA_NUM_PARALLEL保持一致
+    'batch_size': 1,            # 每个请求最多打包几条短新闻 (JSON输出), 1 表示逐条总结
+    'batch_token_budget': 3000, # 批量请求的prompt token预算
+    'context_window': 8192,     # 模型上下文窗口 (token)
+    'digest_token_budget': 6000,  # 日报单个prompt的token预算, 超出时按来源分组归约
+    'summary_content_budget': 1200,  # 总结prompt中正文节选的token上限
+    'summary_cache_size': 5000  # 总结缓存的最大条目数 (LRU淘汰), 0 表示不使用缓存
 }
 
 # Email Configuration
@@ -62,7 +109,15 @@ EMAIL_CONFIG = {
     'smtp_port': int(os.getenv('EMAIL_SMTP_PORT', 587)),
     'email': os.getenv('EMAIL_ADDRESS'),
     'password': os.getenv('EMAIL_PASSWORD'),
-    'to_email': os.getenv('EMAIL_TO')
+    'to_email': os.getenv('EMAIL_TO'),           # 多个收件人用逗号分隔
+    'use_tls': os.getenv('EMAIL_USE_TLS', 'true').lower() != 'false',  # 是否STARTTLS
+    'timeout': 30,              # SMTP连接超时 (秒)
+    'batch_size': 20,           # 一次SMTP会话最多发送的邮件数
+    'max_attempts': 5,          # 超过后标记为failed, 不再重试
+    'retry_base_delay': 60,     # 第n次失败后等待 base * 2^(n-1) 秒再重试
+    'retry_max_delay': 3600,
+    'poll_interval': 30,        # 后台发送线程检查到期重试的间隔 (秒)
+    'stale_after': 600          # 处于sending状态超过该时间的邮件视为发送进程已退出, 重新排队
 }
 
 # Obsidian Configuration
@@ -70,7 +125,27 @@ OBSIDIAN_CONFIG = {
     'vault_path': os.getenv('OBSIDIAN_VAULT_PATH'),
     'notes_folder': os.getenv('OBSIDIAN_NOTES_FOLDER', 'AI_News'),
     'daily_notes': True,
-    'individual_notes': True
+    'individual_notes': True,
+    'manifest_name': '.ai_news_manifest.json',  # vault根目录下的清单: key -> 路径 + 内容指纹
+    'write_workers': 8                          # 并行写笔记的线程数
+}
+
+# 输出分发: 日报并行发往各个输出 (Obsidian、邮件、飞书), 互不阻塞
+OUTPUT_CONFIG = {
+    'sinks': ['obsidian_notes', 'obsidian_digest', 'email', 'feishu'],  # 启用的输出, 未配置的会自动跳过
+    'sink_timeout': 120         # 单个输出的超时时间(秒), 超时不影响其他输出
+}
+
+# 飞书自定义机器人 (webhook)
+FEISHU_CONFIG = {
+    'webhook_url': os.getenv('FEISHU_WEBHOOK_URL'),
+    'secret': os.getenv('FEISHU_WEBHOOK_SECRET'),  # 机器人开启签名校验时需要
+    'max_items': 100,           # 最多推送的新闻条数, 完整日报见Obsidian/邮件
+    'max_message_bytes': 18000, # 单条消息请求体上限 (飞书限制20KB), 超出时拆成多条
+    'rate_per_second': 5,       # 飞书限流: 每个机器人 5次/秒, 100次/分钟
+    'rate_per_minute': 100,
+    'max_retries': 3,           # 被限流或网络错误时的重试次数
+    'timeout': 10               # 单次请求超时(秒)
 }
 
 # Streamlit UI Configuration
@@ -78,5 +153,7 @@ UI_CONFIG = {
     'page_title': 'AI News Aggregator',
     'page_icon': '🤖',
     'layout': 'wide',
-    'theme': 'dark'
+    'theme': 'dark',
+    'news_page_size': 25,   # 新闻列表每页条数
+    'search_page_size': 20  # 全文检索每页条数
 }
\ No newline at end of file
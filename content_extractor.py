@@ -0,0 +1,220 @@
+# content_extractor.py - 网页正文抽取
+#
+# 两种模式:
+#   text - 增量提取整页文字 (TextCollector), 可边下载边解析, 够了就停止
+#   main - 去除导航/页脚/Cookie横幅等模板内容, 只保留正文段落; 有lxml时使用lxml解析,
+#          否则退回标准库html.parser. 这些函数都是纯函数, 可以放进进程池并行执行.
+import re
+from html.parser import HTMLParser
+from typing import Union
+
+try:
+    import lxml.etree
+    import lxml.html
+    HAS_LXML = True
+except ImportError:
+    HAS_LXML = False
+
+# 整个子树都不属于正文的标签
+BOILERPLATE_TAGS = {'script', 'style', 'noscript', 'template', 'iframe', 'svg', 'form',
+                    'nav', 'header', 'footer', 'aside', 'button', 'select'}
+# class/id 命中这些关键词的元素视为模板内容 (除非同时命中正文关键词)
+BOILERPLATE_PATTERN = re.compile(
+    r'nav|menu|footer|sidebar|cookie|consent|gdpr|banner|subscribe|newsletter|share|social|'
+    r'comment|related|recommend|promo|advert|sponsor|popup|modal|breadcrumb|widget|signup|\bads?\b',
+    re.I)
+CONTENT_PATTERN = re.compile(r'article|content|post|entry|story|main|text|body', re.I)
+BLOCK_TAGS = {'p', 'h1', 'h2', 'h3', 'h4', 'h5', 'h6', 'li', 'blockquote', 'pre', 'td', 'figcaption'}
+VOID_TAGS = {'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'link', 'meta',
+             'param', 'source', 'track', 'wbr'}
+MIN_PARAGRAPH_CHARS = 25
+
+
+def normalize_whitespace(text: str) -> str:
+    return ' '.join(text.split())
+
+
+def is_boilerplate(tag: str, attrs: str) -> bool:
+    """根据标签名和class/id判断元素是否是模板内容"""
+    if tag in BOILERPLATE_TAGS:
+        return True
+    return bool(attrs) and bool(BOILERPLATE_PATTERN.search(attrs)) and not CONTENT_PATTERN.search(attrs)
+
+
+def extract_text(html: Union[str, bytes], max_chars: int = 5000, encoding: str = None) -> str:
+    """提取整页文字 (只去掉脚本和样式)"""
+    parser = TextCollector(max_chars)
+    parser.feed(_decode(html, encoding))
+    parser.close()
+    return parser.text()[:max_chars]
+
+
+def extract_main_content(html: Union[str, bytes], max_chars: int = 5000, encoding: str = None,
+                         backend: str = None) -> str:
+    """提取正文内容, backend为'lxml'或'html.parser', 默认有lxml时使用lxml"""
+    backend = backend or ('lxml' if HAS_LXML else 'html.parser')
+    if backend == 'lxml':
+        try:
+            return _main_content_lxml(html, max_chars, encoding)
+        except lxml.etree.ParserError:
+            pass  # 空文档或只有注释等lxml无法建树的页面, 交给标准库解析
+    return _main_content_stdlib(_decode(html, encoding), max_chars)
+
+
+def _decode(html: Union[str, bytes], encoding: str = None) -> str:
+    if isinstance(html, str):
+        return html
+    return html.decode(encoding or 'utf-8', errors='replace')
+
+
+def _main_content_lxml(html: Union[str, bytes], max_chars: int, encoding: str = None) -> str:
+    if not html or not html.strip():
+        return ""
+    # 直接把字节交给lxml: 先解码成str的话, 带<?xml encoding=...?>声明的XHTML页面会被lxml拒绝
+    if isinstance(html, str):
+        html, encoding = html.encode('utf-8'), 'utf-8'
+    doc = lxml.html.fromstring(html, parser=lxml.html.HTMLParser(encoding=encoding))
+
+    # 去掉模板内容子树
+    for element in list(doc.iter()):
+        if not isinstance(element.tag, str):
+            element.drop_tree()  # 注释和处理指令
+            continue
+        if element.tag in ('html', 'body') or element.getparent() is None:
+            continue
+        attrs = f"{element.get('class', '')} {element.get('id', '')}".strip()
+        if is_boilerplate(element.tag, attrs):
+            element.drop_tree()
+
+    # 按段落文字给父节点打分, 选出正文容器
+    scores = {}
+    for paragraph in doc.iter('p', 'pre', 'blockquote'):
+        text = normalize_whitespace(paragraph.text_content())
+        if len(text) < MIN_PARAGRAPH_CHARS:
+            continue
+        score = 1 + text.count(',') + text.count('，') + min(len(text) / 100, 3)
+        parent = paragraph.getparent()
+        if parent is not None:
+            scores[parent] = scores.get(parent, 0) + score
+            grandparent = parent.getparent()
+            if grandparent is not None:
+                scores[grandparent] = scores.get(grandparent, 0) + score / 2
+
+    if scores:
+        best = max(scores, key=lambda el: scores[el] * (1 - _link_density(el)))
+    else:
+        best = doc.find('body') if doc.find('body') is not None else doc
+
+    blocks = []
+    for element in best.iter(*BLOCK_TAGS):
+        # 嵌套的块元素只取最外层, 避免重复
+        if any(ancestor.tag in BLOCK_TAGS for ancestor in element.iterancestors()):
+            continue
+        text = normalize_whitespace(element.text_content())
+        if text:
+            blocks.append(text)
+    content = ' '.join(blocks) if blocks else normalize_whitespace(best.text_content())
+    return content[:max_chars]
+
+
+def _link_density(element) -> float:
+    text_length = len(normalize_whitespace(element.text_content())) or 1
+    link_length = sum(len(normalize_whitespace(link.text_content())) for link in element.iter('a'))
+    return min(link_length / text_length, 1.0)
+
+
+def _main_content_stdlib(html: str, max_chars: int) -> str:
+    parser = _MainContentParser()
+    parser.feed(html)
+    parser.close()
+    return parser.content()[:max_chars]
+
+
+class TextCollector(HTMLParser):
+    """增量HTML文本提取器, 忽略脚本和样式元素"""
+    SKIP_TAGS = {'script', 'style', 'noscript', 'template'}
+
+    def __init__(self, max_chars: int):
+        super().__init__(convert_charrefs=True)
+        self.max_chars = max_chars
+        self.parts = []
+        self.raw_chars = 0
+        self.skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self.skip_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS and self.skip_depth:
+            self.skip_depth -= 1
+
+    def handle_data(self, data):
+        if not self.skip_depth:
+            self.parts.append(data)
+            self.raw_chars += len(data)
+
+    def enough(self) -> bool:
+        # 原始字符数包含大量空白, 只有超过上限时才计算规范化后的长度
+        return self.raw_chars >= self.max_chars and len(self.text()) >= self.max_chars
+
+    def text(self) -> str:
+        return normalize_whitespace(''.join(self.parts))
+
+
+class _MainContentParser(HTMLParser):
+    """html.parser版本的正文抽取: 跳过模板内容子树, 收集段落级文字"""
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []        # (tag, 是否模板内容)
+        self.skip_depth = 0    # 当前处于几层模板内容之内
+        self.block_depth = 0
+        self.blocks = []
+        self.current = []
+        self.loose = []        # 不在段落内的文字, 段落太少时作为兜底
+
+    def handle_starttag(self, tag, attrs):
+        if tag in VOID_TAGS:
+            return
+        attr_text = ' '.join(value or '' for name, value in attrs if name in ('class', 'id'))
+        skipped = is_boilerplate(tag, attr_text)
+        self.stack.append((tag, skipped))
+        self.skip_depth += skipped
+        if tag in BLOCK_TAGS:
+            self.block_depth += 1
+
+    def handle_endtag(self, tag):
+        if tag in VOID_TAGS or not any(open_tag == tag for open_tag, _ in self.stack):
+            return
+        # 弹出到匹配的开始标签, 容忍未闭合的元素
+        while self.stack:
+            open_tag, skipped = self.stack.pop()
+            self.skip_depth -= skipped
+            if open_tag in BLOCK_TAGS:
+                self.block_depth -= 1
+                if not self.block_depth:
+                    self._flush()
+            if open_tag == tag:
+                break
+
+    def handle_data(self, data):
+        if self.skip_depth:
+            return
+        if self.block_depth:
+            self.current.append(data)
+        else:
+            self.loose.append(data)
+
+    def _flush(self):
+        text = normalize_whitespace(''.join(self.current))
+        if text:
+            self.blocks.append(text)
+        self.current = []
+
+    def content(self) -> str:
+        self._flush()
+        paragraphs = [block for block in self.blocks if len(block) >= MIN_PARAGRAPH_CHARS]
+        if sum(len(block) for block in paragraphs) >= 200:
+            return ' '.join(paragraphs)
+        return normalize_whitespace(' '.join(self.blocks + self.loose))
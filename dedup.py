@@ -0,0 +1,167 @@
+# dedup.py - 跨feed的重复新闻检测
+#
+# 同一条新闻常被多个站点转载(或同一个feed在NEWS_SOURCES中出现两次). 在抽取和总结之前:
+#   1. 规范化URL后完全相同的视为重复
+#   2. 标题+摘要的MinHash签名放进内存LSH索引, 估计Jaccard相似度超过阈值的视为近似重复
+# 重复条目合并到第一次出现的条目上, 记录在其alternate_sources中.
+# 例外: 已处理过的条目 (数据库中已有总结) 与尚未处理的规范条目重复时, 由已处理的条目取而代之,
+# 被替换的条目记入superseded, 流水线据此不再抽取、总结和输出它.
+import random
+import re
+import threading
+import zlib
+from typing import Iterable, List, Optional
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+from config import DEDUP_CONFIG
+from content_extractor import extract_text
+from news_collector import NewsItem
+
+TRACKING_PARAMS = re.compile(r'^(utm_\w+|fbclid|gclid|mc_cid|mc_eid|ref|ref_src|source|cmpid|guccounter)$', re.I)
+_MERSENNE_PRIME = (1 << 61) - 1
+
+
+def normalize_url(url: str) -> str:
+    """去掉协议差异、www前缀、跟踪参数、锚点和末尾斜杠"""
+    parts = urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith('www.'):
+        host = host[4:]
+    query = sorted((key, value) for key, value in parse_qsl(parts.query, keep_blank_values=True)
+                   if not TRACKING_PARAMS.match(key))
+    path = parts.path.rstrip('/') or '/'
+    return urlunsplit(('https', host, path, urlencode(query), ''))
+
+
+def shingles(text: str, size: int = 3) -> set:
+    """英文按词、中文按字生成size-gram"""
+    tokens = re.findall(r'[一-鿿]|[a-z0-9]+', text.lower())
+    if len(tokens) <= size:
+        return {' '.join(tokens)} if tokens else set()
+    return {' '.join(tokens[i:i + size]) for i in range(len(tokens) - size + 1)}
+
+
+class MinHasher:
+    def __init__(self, num_perm: int = 64, seed: int = 1):
+        rng = random.Random(seed)
+        self.num_perm = num_perm
+        self.params = [(rng.randrange(1, _MERSENNE_PRIME), rng.randrange(0, _MERSENNE_PRIME))
+                       for _ in range(num_perm)]
+
+    def signature(self, features: set) -> tuple:
+        hashes = [zlib.crc32(feature.encode('utf-8')) for feature in features] or [0]
+        return tuple(min((a * h + b) % _MERSENNE_PRIME for h in hashes) for a, b in self.params)
+
+    @staticmethod
+    def similarity(sig_a: tuple, sig_b: tuple) -> float:
+        """估计的Jaccard相似度"""
+        return sum(a == b for a, b in zip(sig_a, sig_b)) / len(sig_a)
+
+
+class LSHIndex:
+    """把签名切成bands段, 任一段完全相同的条目互为候选"""
+
+    def __init__(self, num_perm: int, bands: int):
+        self.bands = bands
+        self.rows = num_perm // bands
+        self.buckets = [{} for _ in range(bands)]
+
+    def _keys(self, signature: tuple):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows]
+
+    def candidates(self, signature: tuple) -> set:
+        found = set()
+        for band, key in self._keys(signature):
+            found.update(self.buckets[band].get(key, ()))
+        return found
+
+    def insert(self, key, signature: tuple):
+        for band, band_key in self._keys(signature):
+            self.buckets[band].setdefault(band_key, []).append(key)
+
+
+class Deduplicator:
+    """流式去重: add()返回新条目本身, 重复条目返回None并合并到规范条目上 (线程安全)"""
+
+    def __init__(self, threshold: float = None, num_perm: int = None, bands: int = None):
+        self.threshold = threshold or DEDUP_CONFIG['similarity_threshold']
+        num_perm = num_perm or DEDUP_CONFIG['num_perm']
+        self.hasher = MinHasher(num_perm)
+        self.index = LSHIndex(num_perm, bands or DEDUP_CONFIG['bands'])
+        self.by_url = {}        # 规范化url -> items中的下标
+        self.items = []
+        self.signatures = []
+        self.processed = []     # 与items对应: 规范条目是否为已处理的条目
+        self.superseded = {}    # id(条目) -> 被已处理条目替换掉的规范条目 (保留引用, id不会被复用)
+        self.stats = {'exact': 0, 'near': 0, 'superseded': 0}
+        self._lock = threading.Lock()
+
+    def add(self, item: NewsItem, processed: bool = False) -> Optional[NewsItem]:
+        """processed=True表示条目已处理过; 它与未处理的规范条目重复时替换后者并返回自身"""
+        url = normalize_url(item.url)
+        text = f"{item.title} {extract_text(item.summary or '', max_chars=2000)}"
+        signature = self.hasher.signature(shingles(text))
+        with self._lock:
+            key = self.by_url.get(url)
+            if key is not None:
+                self.stats['exact'] += 1
+                return self._collide(key, item, signature, processed)
+
+            best, best_score = None, 0.0
+            for key in self.index.candidates(signature):
+                score = MinHasher.similarity(signature, self.signatures[key])
+                if score > best_score:
+                    best, best_score = key, score
+            if best is not None and best_score >= self.threshold:
+                self.stats['near'] += 1
+                self.by_url[url] = best
+                return self._collide(best, item, signature, processed)
+
+            key = len(self.items)
+            self.items.append(item)
+            self.signatures.append(signature)
+            self.processed.append(processed)
+            self.index.insert(key, signature)
+            self.by_url[url] = key
+            return item
+
+    def is_superseded(self, item: NewsItem) -> bool:
+        with self._lock:
+            return id(item) in self.superseded
+
+    def _collide(self, key: int, item: NewsItem, signature: tuple, processed: bool) -> Optional[NewsItem]:
+        """item与第key个规范条目重复: 通常合并进规范条目; 已处理的条目遇到未处理的规范条目时取而代之"""
+        canonical = self.items[key]
+        if not processed or self.processed[key]:
+            self._merge(canonical, item)
+            return None
+        self.stats['superseded'] += 1
+        self.superseded[id(canonical)] = canonical
+        for alternate in canonical.alternate_sources:
+            if alternate not in item.alternate_sources and alternate[1] != item.url:
+                item.alternate_sources.append(alternate)
+        self._merge(item, canonical)
+        self.items[key] = item
+        self.signatures[key] = signature
+        self.processed[key] = True
+        self.index.insert(key, signature)
+        self.by_url[normalize_url(item.url)] = key
+        return item
+
+    @staticmethod
+    def _merge(canonical: NewsItem, duplicate: NewsItem):
+        alternate = (duplicate.source, duplicate.url)
+        if alternate not in canonical.alternate_sources and duplicate.url != canonical.url:
+            canonical.alternate_sources.append(alternate)
+
+    def report(self) -> str:
+        return (f"Dedup: {len(self.items)} unique, {self.stats['exact']} exact URL duplicates, "
+                f"{self.stats['near']} near-duplicates collapsed, "
+                f"{self.stats['superseded']} replaced by already processed items")
+
+
+def deduplicate(news_items: Iterable[NewsItem]) -> List[NewsItem]:
+    """对一批新闻去重, 保持第一次出现的顺序"""
+    deduplicator = Deduplicator()
+    return [item for item in news_items if deduplicator.add(item) is not None]
@@ -0,0 +1,306 @@
+# digest_renderer.py - 日报渲染
+#
+# 新闻先整理成一个中间模型 (DigestModel: 按来源分组、每条新闻的字段只格式化一次),
+# 再用预编译的模板一次遍历同时写出Markdown和HTML两个输出流. 模板在导入时拆成
+# 字面量/字段片段, 渲染时只做片段写入, 不再对整篇文本反复拼接或二次解析.
+# 渲染结果按日期缓存, 新闻没有变化时Obsidian、邮件等输出直接复用同一份结果.
+import hashlib
+import html
+import io
+import re
+import string
+import threading
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, TextIO
+
+_HEADING = re.compile(r'^(#{1,6})\s+(.*?)\s*#*\s*$')
+_RULE = re.compile(r'^\s*([-*_])(\s*\1){2,}\s*$')
+_BULLET = re.compile(r'^\s*[-*+]\s+')
+_ORDERED = re.compile(r'^\s*\d+[.)]\s+')
+_CODE = re.compile(r'`([^`]+)`')
+_BOLD = re.compile(r'\*\*(.+?)\*\*|__(.+?)__')
+_ITALIC = re.compile(r'(?<![*\w])\*(?!\s)(.+?)(?<!\s)\*(?!\*)')
+_LINK = re.compile(r'\[([^\]]+)\]\((https?://[^)\s]+)\)')
+
+
+class Template:
+    """预编译的模板: str.format语法, 只支持简单字段名 ({title}), 不支持格式说明"""
+
+    def __init__(self, source: str):
+        self.parts = []
+        for literal, name, spec, conversion in string.Formatter().parse(source):
+            if literal:
+                self.parts.append((True, literal))
+            if name is not None:
+                if spec or conversion:
+                    raise ValueError(f"Unsupported template field: {{{name}!{conversion}:{spec}}}")
+                self.parts.append((False, name))
+
+    def write(self, out: TextIO, values: Dict[str, str]):
+        for is_literal, text in self.parts:
+            out.write(text if is_literal else values[text])
+
+
+@dataclass
+class DigestEntry:
+    # 每个字段的Markdown和HTML形式都在建模时算好, 模板只负责拼装
+    md: Dict[str, str]
+    html: Dict[str, str]
+
+
+@dataclass
+class DigestModel:
+    date: str
+    generated: str
+    entries: List[DigestEntry]
+    by_source: Dict[str, List[DigestEntry]] = field(default_factory=dict)
+
+
+@dataclass
+class RenderedDigest:
+    date: str
+    markdown: str
+    html: str
+    item_count: int
+    fingerprint: str
+
+
+def summary_to_html(text: str) -> str:
+    """LLM摘要的轻量Markdown转换, 逐条转换, 不用对整篇日报跑markdown
+
+    覆盖摘要实际用到的语法: ATX标题、分隔线、无序/有序列表、段落 (行尾两个空格换行)、
+    粗体/斜体/行内代码/链接; 输出与markdown.markdown对这些语法的结果一致.
+    """
+    blocks = []
+    paragraph = []
+    list_tag, list_items = None, []
+
+    def close_paragraph():
+        if paragraph:
+            blocks.append('<p>' + '\n'.join(paragraph) + '</p>')
+            paragraph.clear()
+
+    def close_list():
+        nonlocal list_tag
+        if list_tag:
+            blocks.append(f'<{list_tag}>\n' + '\n'.join(f'<li>{item}</li>' for item in list_items)
+                          + f'\n</{list_tag}>')
+            list_tag = None
+            list_items.clear()
+
+    for line in text.strip().splitlines():
+        heading = _HEADING.match(line)
+        item = _BULLET.match(line) or _ORDERED.match(line)
+        if not line.strip():
+            close_paragraph()
+            close_list()
+        elif _RULE.match(line):
+            close_paragraph()
+            close_list()
+            blocks.append('<hr />')
+        elif heading:
+            close_paragraph()
+            close_list()
+            level = len(heading.group(1))
+            blocks.append(f'<h{level}>{_inline_html(heading.group(2))}</h{level}>')
+        elif item:
+            close_paragraph()
+            tag = 'ul' if _BULLET.match(line) else 'ol'
+            if list_tag != tag:
+                close_list()
+                list_tag = tag
+            list_items.append(_inline_html(line[item.end():].strip()))
+        elif list_tag and line[:1].isspace():
+            list_items[-1] += '\n' + _inline_html(line.strip())  # 列表项的续行
+        else:
+            close_list()
+            hard_break = line.endswith('  ')
+            paragraph.append(_inline_html(line.strip()) + ('<br />' if hard_break else ''))
+    close_paragraph()
+    close_list()
+    return '\n'.join(blocks)
+
+
+def _inline_html(text: str) -> str:
+    text = html.escape(text, quote=False)
+    text = _CODE.sub(r'<code>\1</code>', text)
+    text = _BOLD.sub(lambda m: f'<strong>{m.group(1) or m.group(2)}</strong>', text)
+    text = _ITALIC.sub(r'<em>\1</em>', text)
+    return _LINK.sub(lambda m: f'<a href="{m.group(2)}">{m.group(1)}</a>', text)
+
+
+def _time(value, fmt: str) -> str:
+    return value.strftime(fmt) if hasattr(value, 'strftime') else str(value or '')
+
+
+def digest_fingerprint(news_items, date: str) -> str:
+    """日报输入的指纹, 相同的输入渲染出相同的日报 (生成时间除外)"""
+    digest = hashlib.sha256(date.encode('utf-8'))
+    for item in news_items:
+        if item.ai_summary:
+            for value in (item.title, item.source, item.url, _time(item.published_date, '%Y-%m-%d %H:%M'),
+                          item.ai_summary):
+                digest.update(str(value).encode('utf-8'))
+                digest.update(b'\0')
+    return digest.hexdigest()
+
+
+def build_model(news_items, date: str) -> DigestModel:
+    model = DigestModel(date=date, generated=datetime.now().strftime('%Y-%m-%d %H:%M'), entries=[])
+    for item in news_items:
+        if not item.ai_summary:
+            continue
+        md = {
+            'title': item.title,
+            'url': item.url,
+            'source': item.source,
+            'time': _time(item.published_date, '%H:%M'),
+            'published': _time(item.published_date, '%Y-%m-%d %H:%M'),
+            'summary': item.ai_summary,
+        }
+        entry = DigestEntry(md=md, html={
+            **{name: html.escape(str(value)) for name, value in md.items()},
+            'summary': summary_to_html(item.ai_summary),
+        })
+        model.entries.append(entry)
+        model.by_source.setdefault(item.source, []).append(entry)
+    return model
+
+
+TOP_STORIES = 3
+
+# (Markdown模板, HTML模板); 版式与原来create_comprehensive_digest拼出的文本一致
+EMPTY = (Template("# AI News Digest - {date}\n\nNo news items processed today."),
+         Template("<html><body><h1>AI News Digest - {date}</h1><p>No news items processed today.</p></body></html>"))
+HEADER = (Template('''---
+title: "AI News Digest - {date}"
+date: {date}
+type: daily_digest
+item_count: {item_count}
+sources: {source_count}
+---
+
+# 🤖 AI News Digest - {date}
+
+**Summary**: {item_count} articles from {source_count} sources
+
+## 📊 Overview
+
+- **Total Articles**: {item_count}
+- **Unique Sources**: {source_count}
+- **Generated**: {generated}
+
+## 📰 Top Stories
+
+'''), Template('''<html><head><meta charset="utf-8"><title>AI News Digest - {date}</title></head><body>
+<h1>🤖 AI News Digest - {date}</h1>
+<p><strong>Summary</strong>: {item_count} articles from {source_count} sources</p>
+<h2>📊 Overview</h2>
+<ul>
+<li><strong>Total Articles</strong>: {item_count}</li>
+<li><strong>Unique Sources</strong>: {source_count}</li>
+<li><strong>Generated</strong>: {generated}</li>
+</ul>
+<h2>📰 Top Stories</h2>
+'''))
+TOP_STORY = (Template('''
+### {rank}. {title}
+
+**Source**: {source} | **Time**: {time}
+
+{summary}
+
+[Read Original]({url})
+
+---
+'''), Template('''<h3>{rank}. {title}</h3>
+<p><strong>Source</strong>: {source} | <strong>Time</strong>: {time}</p>
+{summary}
+<p><a href="{url}">Read Original</a></p>
+<hr>
+'''))
+SOURCES_HEADER = (Template("\n## 📑 Articles by Source\n\n"), Template("<h2>📑 Articles by Source</h2>\n"))
+SOURCE = (Template("\n### {source} ({count} articles)\n\n"), Template("<h3>{source} ({count} articles)</h3>\n"))
+ARTICLE = (Template('''
+#### [{title}]({url})
+*{published}*
+
+{summary}...
+
+---
+'''), Template('''<h4><a href="{url}">{title}</a></h4>
+<p><em>{published}</em></p>
+{summary}
+<hr>
+'''))
+FOOTER = (Template('''
+## 🔗 Quick Links
+
+All individual articles have been saved as separate notes in the AI_News/Individual folder.
+
+---
+*Digest generated by AI News Aggregator on {generated}*
+'''), Template('''<h2>🔗 Quick Links</h2>
+<p>All individual articles have been saved as separate notes in the AI_News/Individual folder.</p>
+<hr>
+<p><em>Digest generated by AI News Aggregator on {generated}</em></p>
+</body></html>
+'''))
+
+
+def render(model: DigestModel, md_out: TextIO, html_out: TextIO):
+    """一次遍历模型, 同时向两个输出流写入Markdown和HTML"""
+    def emit(templates, md_values, html_values=None):
+        templates[0].write(md_out, md_values)
+        templates[1].write(html_out, md_values if html_values is None else html_values)
+
+    if not model.entries:
+        emit(EMPTY, {'date': model.date}, {'date': html.escape(model.date)})
+        return
+
+    summary = {'date': model.date, 'generated': model.generated,
+               'item_count': str(len(model.entries)), 'source_count': str(len(model.by_source))}
+    emit(HEADER, summary, {**summary, 'date': html.escape(model.date)})
+
+    for rank, entry in enumerate(model.entries[:TOP_STORIES], 1):
+        emit(TOP_STORY, {**entry.md, 'rank': str(rank)}, {**entry.html, 'rank': str(rank)})
+
+    emit(SOURCES_HEADER, {})
+    for source, entries in model.by_source.items():
+        count = str(len(entries))
+        emit(SOURCE, {'source': source, 'count': count}, {'source': html.escape(str(source)), 'count': count})
+        for entry in entries:
+            emit(ARTICLE, entry.md, entry.html)
+
+    emit(FOOTER, summary)
+
+
+class DigestRenderer:
+    """渲染日报并按日期缓存结果; 同一天的新闻没变时直接返回缓存"""
+
+    def __init__(self, cache_size: int = 7):
+        self.cache_size = cache_size
+        self._cache: 'OrderedDict[str, RenderedDigest]' = OrderedDict()
+        self._lock = threading.Lock()
+
+    def render(self, news_items, date: str) -> RenderedDigest:
+        fingerprint = digest_fingerprint(news_items, date)
+        with self._lock:
+            cached = self._cache.get(date)
+            if cached is not None and cached.fingerprint == fingerprint:
+                self._cache.move_to_end(date)
+                return cached
+
+        model = build_model(news_items, date)
+        md_out, html_out = io.StringIO(), io.StringIO()
+        render(model, md_out, html_out)
+        rendered = RenderedDigest(date=date, markdown=md_out.getvalue(), html=html_out.getvalue(),
+                                  item_count=len(model.entries), fingerprint=fingerprint)
+        with self._lock:
+            self._cache[date] = rendered
+            self._cache.move_to_end(date)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return rendered
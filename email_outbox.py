@@ -0,0 +1,201 @@
+# email_outbox.py - 持久化的邮件发送队列
+#
+# send_email只把完整的MIME邮件写入outbox表就返回, 采集流程不会被SMTP阻塞.
+# 后台发送线程每次取出一批到期的邮件, 在同一个已认证的SMTP连接上依次发送;
+# 失败的邮件按指数退避重新排队, 超过max_attempts后标记为failed.
+# 领取邮件在BEGIN IMMEDIATE事务中完成, 多个进程 (Streamlit和定时任务) 共用队列也不会重复发送.
+import json
+import smtplib
+import threading
+import time
+from email.message import Message
+from email.policy import compat32
+from email.utils import getaddresses
+from typing import List, Optional
+
+from config import EMAIL_CONFIG
+from migrations import MIGRATIONS
+from news_repository import NewsRepository
+
+# 连接层面的错误: 这一批剩下的邮件也发不出去, 全部退回队列
+CONNECTION_ERRORS = (smtplib.SMTPConnectError, smtplib.SMTPServerDisconnected, smtplib.SMTPAuthenticationError,
+                     smtplib.SMTPHeloError, OSError)
+
+# 入队时按SMTP要求的CRLF换行序列化 (compat32保留MIMEText生成的RFC 2047编码头)
+WIRE_POLICY = compat32.clone(linesep='\r\n')
+
+
+def is_permanent(error: Exception) -> bool:
+    """5xx应答表示服务器拒绝了这封邮件本身, 重试也不会成功"""
+    if isinstance(error, smtplib.SMTPRecipientsRefused):
+        return all(code >= 500 for code, _ in error.recipients.values())
+    return isinstance(error, (smtplib.SMTPDataError, smtplib.SMTPSenderRefused)) and error.smtp_code >= 500
+
+
+def parse_recipients(value) -> List[str]:
+    """逗号分隔的地址或地址列表 -> 地址列表"""
+    if not value:
+        return []
+    if isinstance(value, str):
+        value = [value]
+    return [address for _, address in getaddresses(value) if address]
+
+
+class EmailOutbox:
+    def __init__(self, db_path: str = "ai_news.db", config: dict = None):
+        self.repository = NewsRepository.for_path(db_path)
+        self.repository.migrate(MIGRATIONS)
+        self.config = {**EMAIL_CONFIG, **(config or {})}
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+    # ---- 队列 ----
+
+    def enqueue(self, msg: Message, recipients=None) -> int:
+        """邮件入队并唤醒发送线程, 返回outbox id"""
+        recipients = parse_recipients(recipients or self.config['to_email'])
+        if not recipients:
+            raise ValueError("No email recipients configured")
+        now = int(time.time())
+        with self.repository.transaction() as conn:
+            cursor = conn.execute('''
+                INSERT INTO outbox (subject, recipients, message, created_ts, next_attempt_ts)
+                VALUES (?, ?, ?, ?, ?)
+            ''', (msg['Subject'], json.dumps(recipients), msg.as_string(policy=WIRE_POLICY), now, now))
+        self._wakeup.set()
+        return cursor.lastrowid
+
+    def claim(self, limit: int) -> List[dict]:
+        """领取一批到期的邮件 (状态改为sending)"""
+        now = int(time.time())
+        with self.repository.transaction() as conn:
+            # 发送进程中途退出时遗留的sending邮件重新排队
+            conn.execute('''
+                UPDATE outbox SET status = 'pending', claimed_ts = NULL
+                WHERE status = 'sending' AND claimed_ts < ?
+            ''', (now - self.config['stale_after'],))
+            rows = conn.execute('''
+                SELECT id, recipients, message, attempts FROM outbox
+                WHERE status = 'pending' AND next_attempt_ts <= ?
+                ORDER BY next_attempt_ts, id LIMIT ?
+            ''', (now, limit)).fetchall()
+            conn.executemany("UPDATE outbox SET status = 'sending', claimed_ts = ? WHERE id = ?",
+                             [(now, row['id']) for row in rows])
+        return [dict(row, recipients=json.loads(row['recipients'])) for row in rows]
+
+    def mark_sent(self, outbox_id: int):
+        with self.repository.transaction() as conn:
+            conn.execute("UPDATE outbox SET status = 'sent', sent_ts = ?, last_error = NULL WHERE id = ?",
+                         (int(time.time()), outbox_id))
+
+    def mark_failed(self, entry: dict, error: Exception):
+        """记录失败并安排重试; 次数用完或邮件被服务器永久拒绝时标记为failed"""
+        attempts = entry['attempts'] + 1
+        if is_permanent(error) or attempts >= self.config['max_attempts']:
+            status, next_attempt = 'failed', None
+        else:
+            delay = min(self.config['retry_base_delay'] * 2 ** (attempts - 1), self.config['retry_max_delay'])
+            status, next_attempt = 'pending', int(time.time()) + delay
+        with self.repository.transaction() as conn:
+            conn.execute('''
+                UPDATE outbox SET status = ?, attempts = ?, last_error = ?, next_attempt_ts = ?, claimed_ts = NULL
+                WHERE id = ?
+            ''', (status, attempts, f"{type(error).__name__}: {error}", next_attempt, entry['id']))
+        print(f"❌ Email #{entry['id']} failed (attempt {attempts}, {status}): {error}")
+
+    def counts(self) -> dict:
+        rows = self.repository.execute('SELECT status, COUNT(*) FROM outbox GROUP BY status').fetchall()
+        return {status: count for status, count in rows}
+
+    def get(self, outbox_id: int) -> Optional[dict]:
+        row = self.repository.execute('SELECT * FROM outbox WHERE id = ?', (outbox_id,)).fetchone()
+        return dict(row) if row else None
+
+    # ---- 发送 ----
+
+    def flush(self) -> dict:
+        """发送所有到期的邮件, 每批共用一个SMTP连接; 返回 sent/failed 计数"""
+        report = {'sent': 0, 'failed': 0}
+        while True:
+            batch = self.claim(self.config['batch_size'])
+            if not batch:
+                return report
+            sent = self._send_batch(batch)
+            report['sent'] += sent
+            report['failed'] += len(batch) - sent
+            if sent < len(batch):
+                # 有失败时不在本轮继续, 等退避时间到了再试
+                return report
+
+    def _send_batch(self, batch: List[dict]) -> int:
+        sent = 0
+        try:
+            server = self._connect()
+        except Exception as e:
+            for entry in batch:
+                self.mark_failed(entry, e)
+            return 0
+        try:
+            for index, entry in enumerate(batch):
+                try:
+                    # message入队时已是CRLF换行, 按字节原样发送
+                    refused = server.sendmail(self.config['email'], entry['recipients'],
+                                              entry['message'].encode('utf-8'))
+                except CONNECTION_ERRORS as e:
+                    for remaining in batch[index:]:
+                        self.mark_failed(remaining, e)
+                    break
+                except smtplib.SMTPException as e:
+                    self.mark_failed(entry, e)
+                else:
+                    if refused:
+                        print(f"⚠️ Email #{entry['id']} refused for: {', '.join(refused)}")
+                    self.mark_sent(entry['id'])
+                    sent += 1
+        finally:
+            try:
+                server.quit()
+            except (smtplib.SMTPException, OSError):
+                server.close()
+        if sent:
+            print(f"✅ Sent {sent} email(s) over one SMTP session")
+        return sent
+
+    def _connect(self) -> smtplib.SMTP:
+        server = smtplib.SMTP(self.config['smtp_server'], self.config['smtp_port'], timeout=self.config['timeout'])
+        try:
+            if self.config['use_tls']:
+                server.starttls()
+            if self.config['password']:
+                server.login(self.config['email'], self.config['password'])
+        except BaseException:
+            server.close()
+            raise
+        return server
+
+    # ---- 后台发送线程 ----
+
+    def start(self):
+        """启动后台发送线程 (重复调用无影响); 启动时会先发送上次遗留的邮件"""
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._stopped.clear()
+                self._worker = threading.Thread(target=self._run, name="email-outbox", daemon=True)
+                self._worker.start()
+
+    def stop(self, timeout: float = None):
+        self._stopped.set()
+        self._wakeup.set()
+        if self._worker is not None:
+            self._worker.join(timeout)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wakeup.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ Email outbox error: {e}")
+            self._wakeup.wait(self.config['poll_interval'])
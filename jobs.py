@@ -0,0 +1,177 @@
+# jobs.py - 后台任务
+#
+# 采集这类长时间任务由JobRunner在后台线程中执行, 不占用Streamlit的脚本线程.
+# 任务状态和进度保存在jobs表中, 页面刷新后或其他会话/进程都可以按种类查到当前任务并轮询进度.
+# 取消是协作式的: 界面设置cancel_requested, 任务在处理每条新闻时以及流水线等待期间定时检查.
+# jobs表上的部分唯一索引保证同一种任务同时只有一个在排队或运行, 跨进程同样有效.
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+from typing import Callable, Optional
+
+from config import JOB_CONFIG
+from news_repository import NewsRepository
+
+ACTIVE_STATUSES = ('queued', 'running')
+
+
+class JobAlreadyRunning(Exception):
+    def __init__(self, job_id: int):
+        super().__init__(f"Job #{job_id} is already running")
+        self.job_id = job_id
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class JobStore:
+    """jobs表的读写"""
+
+    def __init__(self, db_path: str = "ai_news.db"):
+        self.repository = NewsRepository.for_path(db_path)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}"
+
+    def create(self, kind: str, params: dict = None) -> int:
+        """登记一个排队中的任务; 同种任务已在运行时抛出JobAlreadyRunning"""
+        now = int(time.time())
+        with self.repository.transaction() as conn:
+            self._expire_stale(conn, kind, now)
+            try:
+                cursor = conn.execute('''
+                    INSERT INTO jobs (kind, status, params, owner, created_ts, heartbeat_ts)
+                    VALUES (?, 'queued', ?, ?, ?, ?)
+                ''', (kind, json.dumps(params or {}, ensure_ascii=False), self.owner, now, now))
+            except sqlite3.IntegrityError:
+                row = conn.execute(f'SELECT id FROM jobs WHERE kind = ? AND status IN {ACTIVE_STATUSES}',
+                                   (kind,)).fetchone()
+                raise JobAlreadyRunning(row[0])
+            return cursor.lastrowid
+
+    def get(self, job_id: int) -> Optional[dict]:
+        row = self.repository.execute('SELECT * FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return self._to_dict(row)
+
+    def latest(self, kind: str) -> Optional[dict]:
+        """该种类最近的一个任务 (运行中或已结束); 心跳超时的任务按失败返回"""
+        query = 'SELECT * FROM jobs WHERE kind = ? ORDER BY id DESC LIMIT 1'
+        row = self.repository.execute(query, (kind,)).fetchone()
+        now = int(time.time())
+        if row is not None and row['status'] in ACTIVE_STATUSES and self._is_stale(row['heartbeat_ts'], now):
+            with self.repository.transaction() as conn:
+                self._expire_stale(conn, kind, now)
+                row = conn.execute(query, (kind,)).fetchone()
+        return self._to_dict(row)
+
+    def start(self, job_id: int):
+        now = int(time.time())
+        self._update(job_id, status='running', owner=self.owner, started_ts=now, heartbeat_ts=now)
+
+    def progress(self, job_id: int, done: int = None, total: int = None, items: int = None, message: str = None):
+        fields = {'progress_done': done, 'progress_total': total, 'items_done': items, 'message': message}
+        self._update(job_id, heartbeat_ts=int(time.time()),
+                     **{name: value for name, value in fields.items() if value is not None})
+
+    def heartbeat(self, job_id: int):
+        self._update(job_id, heartbeat_ts=int(time.time()))
+
+    def finish(self, job_id: int, status: str, message: str = None, result: dict = None):
+        self._update(job_id, status=status, message=message, finished_ts=int(time.time()),
+                     result=json.dumps(result, ensure_ascii=False) if result is not None else None)
+
+    def request_cancel(self, job_id: int):
+        self._update(job_id, cancel_requested=1)
+
+    def cancel_requested(self, job_id: int) -> bool:
+        row = self.repository.execute('SELECT cancel_requested FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return bool(row and row[0])
+
+    @staticmethod
+    def _is_stale(heartbeat_ts: int, now: int) -> bool:
+        return heartbeat_ts < now - JOB_CONFIG['stale_after']
+
+    @staticmethod
+    def _expire_stale(conn: sqlite3.Connection, kind: str, now: int):
+        # 心跳超时的任务所在进程已经退出 (如服务重启), 标记为失败, 否则会永远显示为运行中并占着位置
+        conn.execute(f'''
+            UPDATE jobs SET status = 'failed', message = 'Worker stopped responding', finished_ts = ?
+            WHERE kind = ? AND status IN {ACTIVE_STATUSES} AND heartbeat_ts < ?
+        ''', (now, kind, now - JOB_CONFIG['stale_after']))
+
+    def _update(self, job_id: int, **fields):
+        assignments = ', '.join(f'{name} = ?' for name in fields)
+        with self.repository.transaction() as conn:
+            conn.execute(f'UPDATE jobs SET {assignments} WHERE id = ?', (*fields.values(), job_id))
+
+    @staticmethod
+    def _to_dict(row) -> Optional[dict]:
+        if row is None:
+            return None
+        job = dict(row)
+        job['params'] = json.loads(job['params'] or '{}')
+        job['result'] = json.loads(job['result']) if job['result'] else None
+        return job
+
+
+class JobContext:
+    """传给任务函数, 用来汇报进度和检查是否被取消"""
+
+    def __init__(self, store: JobStore, job_id: int):
+        self.store = store
+        self.job_id = job_id
+
+    def progress(self, done: int = None, total: int = None, items: int = None, message: str = None):
+        self.store.progress(self.job_id, done, total, items, message)
+
+    def check_cancelled(self):
+        if self.store.cancel_requested(self.job_id):
+            raise JobCancelled()
+
+
+class JobRunner:
+    """执行任务并维护jobs表中的状态; 在Streamlit中用st.cache_resource保存, 页面刷新不会中断任务"""
+
+    def __init__(self, store: JobStore):
+        self.store = store
+
+    def submit(self, kind: str, func: Callable[[JobContext], dict], params: dict = None) -> int:
+        """在后台线程中运行任务, 立即返回任务id"""
+        job_id = self.store.create(kind, params)
+        thread = threading.Thread(target=self._run, args=(job_id, func), name=f"job-{kind}-{job_id}", daemon=True)
+        thread.start()
+        return job_id
+
+    def run(self, kind: str, func: Callable[[JobContext], dict], params: dict = None) -> dict:
+        """在当前线程中运行任务 (定时工作流使用), 任务失败时异常会继续抛出"""
+        job_id = self.store.create(kind, params)
+        return self._run(job_id, func, reraise=True)
+
+    def _run(self, job_id: int, func: Callable[[JobContext], dict], reraise: bool = False) -> dict:
+        self.store.start(job_id)
+        stopped = threading.Event()
+        threading.Thread(target=self._heartbeat, args=(job_id, stopped), daemon=True).start()
+        try:
+            result = func(JobContext(self.store, job_id))
+        except JobCancelled:
+            self.store.finish(job_id, 'cancelled', 'Cancelled by user')
+        except Exception as e:
+            print(f"Job #{job_id} failed: {e}")
+            self.store.finish(job_id, 'failed', str(e))
+            if reraise:
+                raise
+        else:
+            self.store.finish(job_id, 'completed', 'Completed', result)
+        finally:
+            stopped.set()
+        return self.store.get(job_id)
+
+    def _heartbeat(self, job_id: int, stopped: threading.Event):
+        # LLM调用可能长时间没有进度, 单独的心跳线程让其他进程知道任务仍然活着
+        while not stopped.wait(JOB_CONFIG['heartbeat_interval']):
+            try:
+                self.store.heartbeat(job_id)
+            except sqlite3.Error as e:
+                print(f"Job #{job_id} heartbeat failed: {e}")
@@ -1,16 +1,370 @@
 import ollama
 import json
-from typing import List
+import re
+import threading
+import time
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Iterator, List
+from config import LLM_CONFIG
 from news_collector import NewsItem
+from summary_cache import SummaryCache
+
+# 修改总结prompt模板时递增, 使旧的缓存失效
+SUMMARY_PROMPT_VERSION = 2
+SUMMARY_OPTIONS = {
+    'temperature': 0.7,
+    'top_p': 0.9,
+    'num_predict': 500   # Ollama的输出token上限 (不认识max_tokens)
+}
+BATCH_PROMPT_VERSION = 'batch-2'
+
+def estimate_tokens(text: str) -> int:
+    """粗略估计token数: 中日韩字符约1个token/字, 其他文字约4个字符/token"""
+    cjk = len(re.findall(r'[\u3000-\u9fff\uff00-\uffef]', text))
+    return cjk + (len(text) - cjk) // 4 + 1
+
+@dataclass
+class ChatMetrics:
+    ttft: float = 0.0      # 首token延迟(秒)
+    seconds: float = 0.0   # 整个请求耗时(秒)
+    tokens: int = 0        # 生成的token数
+    
+    @property
+    def tokens_per_sec(self) -> float:
+        generating = self.seconds - self.ttft
+        return self.tokens / generating if generating > 0 else 0.0
+    
+    def describe(self) -> str:
+        return f"TTFT {self.ttft:.2f}s · {self.tokens} tokens · {self.tokens_per_sec:.1f} tok/s · {self.seconds:.1f}s total"
+
+
+class ChatStream:
+    """流式对话响应: 迭代时逐个产出token, 结束后text和metrics中是完整回复和耗时指标
+    
+    请求在第一次迭代时才发出; 传入slot (如信号量) 时, 从发出请求到读完响应一直占用它.
+    """
+    
+    def __init__(self, chunks: Iterator = None, on_complete: Callable = None, text: str = None, slot=None):
+        self._chunks = chunks
+        self._on_complete = on_complete
+        self._slot = slot
+        self.text = text or ""
+        self.metrics = ChatMetrics()
+    
+    @classmethod
+    def from_text(cls, text: str) -> 'ChatStream':
+        """已有完整结果(例如缓存命中)时, 包装成只产出一次的流"""
+        return cls(text=text)
+    
+    def __iter__(self):
+        if self._chunks is None:
+            yield self.text
+            return
+        parts, eval_count = [], None
+        with self._slot or nullcontext():
+            start = time.perf_counter()  # 不计排队等待slot的时间
+            for chunk in self._chunks:
+                content = chunk['message']['content']
+                if content:
+                    if not parts:
+                        self.metrics.ttft = time.perf_counter() - start
+                    parts.append(content)
+                    yield content
+                if chunk.get('done'):
+                    eval_count = chunk.get('eval_count')
+        self.metrics.seconds = time.perf_counter() - start
+        self.metrics.tokens = eval_count or len(parts)
+        self.text = "".join(parts)
+        self._chunks = None
+        if self._on_complete:
+            self._on_complete(self)
+    
+    def read(self) -> str:
+        """读完整个流并返回完整文本"""
+        for _ in self:
+            pass
+        return self.text
+
 
 class LLMProcessor:
-    def __init__(self, model_name: str = "llama3.1:8b", base_url: str = "http://localhost:11434"):
+    def __init__(self, model_name: str = "llama3.1:8b", base_url: str = "http://localhost:11434",
+                 cache_db_path: str = "ai_news.db", max_in_flight: int = None):
         self.model_name = model_name
         self.client = ollama.Client(host=base_url)
+        self.max_in_flight = max_in_flight or LLM_CONFIG['max_in_flight']
+        # 所有请求共用的并发上限: 流水线的多个worker和summarize_batch的线程池叠加后, 同时发给Ollama的请求仍不超过max_in_flight
+        self._slots = threading.BoundedSemaphore(self.max_in_flight)
+        self.batch_size = LLM_CONFIG['batch_size']
+        cache_size = LLM_CONFIG['summary_cache_size']
+        self.summary_cache = SummaryCache(cache_db_path, cache_size) if cache_size > 0 else None
+        self._stats_lock = threading.Lock()
+        self.call_metrics = deque(maxlen=500)  # 最近的请求指标
+        self.reset_cache_stats()
+    
+    def summarize_news_item(self, news_item: NewsItem, stream: bool = False, refresh: bool = False):
+        """对单条新闻进行AI总结 (先查总结缓存)
+        
+        stream=True时返回ChatStream, 迭代即可逐个拿到token; 否则返回完整的总结文本.
+        refresh=True时不读缓存, 重新生成并覆盖缓存中的总结 (强制重新处理时使用).
+        """
+        cache_key = self._summary_cache_key(news_item, SUMMARY_PROMPT_VERSION)
+        cached = None if refresh else self._cache_lookup(cache_key)
+        if cached:
+            return ChatStream.from_text(cached) if stream else cached
+        
+        chat = self.chat_stream(
+            self._build_summary_prompt(news_item),
+            SUMMARY_OPTIONS,
+            on_complete=lambda completed: self._cache_store(cache_key, completed.text, completed.metrics.seconds)
+        )
+        if stream:
+            return chat
+        try:
+            return chat.read()
+        except Exception as e:
+            print(f"Error summarizing news: {e}")
+            return f"总结生成失败: {str(e)}"
+    
+    def chat_stream(self, prompt: str, options: dict, on_complete: Callable = None, **kwargs) -> ChatStream:
+        """以流式方式发送请求, 所有LLM调用都经过这里, 每次调用的首token延迟和生成速度记入call_metrics
+        
+        同时进行中的请求不超过max_in_flight个, 超出的在迭代开始时排队.
+        """
+        def completed(chat: ChatStream):
+            with self._stats_lock:
+                self.call_metrics.append(chat.metrics)
+            if on_complete:
+                on_complete(chat)
+        
+        chunks = self.client.chat(
+            model=self.model_name,
+            messages=[{
+                'role': 'user',
+                'content': prompt
+            }],
+            options=options,
+            stream=True,
+            **kwargs
+        )
+        return ChatStream(chunks, on_complete=completed, slot=self._slots)
+    
+    def metrics_report(self) -> str:
+        with self._stats_lock:
+            metrics = list(self.call_metrics)
+        if not metrics:
+            return "LLM calls: none"
+        ttft = sorted(m.ttft for m in metrics)
+        rate = sum(m.tokens for m in metrics) / max(sum(m.seconds - m.ttft for m in metrics), 1e-9)
+        return (f"LLM calls: {len(metrics)}, median TTFT {ttft[len(ttft) // 2]:.2f}s, "
+                f"max TTFT {ttft[-1]:.2f}s, {rate:.1f} tok/s")
+    
+    def summarize_many(self, news_items: List[NewsItem], max_in_flight: int = None) -> List[str]:
+        """并发总结多条新闻, 最多max_in_flight个请求同时进行, 结果与输入顺序一致
+        
+        max_in_flight不能超过处理器的并发上限 (self.max_in_flight), 超出部分在chat_stream中排队.
+        单条失败不影响其他条目, 失败的条目返回"总结生成失败: ..."
+        """
+        max_in_flight = max_in_flight or self.max_in_flight
+        if max_in_flight <= 1 or len(news_items) <= 1:
+            return [self._summarize_isolated(item) for item in news_items]
+        with ThreadPoolExecutor(max_workers=min(max_in_flight, len(news_items))) as executor:
+            return list(executor.map(self._summarize_isolated, news_items))
+    
+    def _summarize_isolated(self, news_item: NewsItem, refresh: bool = False) -> str:
+        try:
+            return self.summarize_news_item(news_item, refresh=refresh)
+        except Exception as e:
+            print(f"Error summarizing news: {e}")
+            return f"总结生成失败: {str(e)}"
+    
+    def summarize_batch(self, news_items: List[NewsItem], refresh: bool = False) -> List[str]:
+        """把多条短新闻打包进一个请求总结, 结果与输入顺序一致
+        
+        按batch_token_budget打包, 要求模型返回JSON; 缺失或格式错误的条目,
+        以及单条就超出预算一半的长新闻, 退回逐条调用summarize_news_item.
+        refresh=True时不读缓存, 全部重新生成.
+        """
+        results = [None] * len(news_items)
+        pending = []
+        for index, item in enumerate(news_items):
+            # 之前批量或逐条生成过的总结都可以直接使用
+            cached = not refresh and (self._cache_lookup(self._summary_cache_key(item, BATCH_PROMPT_VERSION))
+                                      or self._cache_lookup(self._summary_cache_key(item, SUMMARY_PROMPT_VERSION)))
+            if cached:
+                results[index] = cached
+            else:
+                pending.append(index)
+        
+        batches, singles = self._pack_batches([news_items[i] for i in pending])
+        batches = [[pending[i] for i in batch] for batch in batches]
+        singles = [pending[i] for i in singles]
+        
+        def run_batch(batch):
+            summaries = self._summarize_packed([news_items[i] for i in batch])
+            for index, summary in zip(batch, summaries):
+                results[index] = summary
+            missing = [index for index, summary in zip(batch, summaries) if summary is None]
+            for index in missing:
+                results[index] = self._summarize_isolated(news_items[index], refresh)
+        
+        def run_single(index):
+            results[index] = self._summarize_isolated(news_items[index], refresh)
+        
+        jobs = [(run_batch, batch) for batch in batches] + [(run_single, index) for index in singles]
+        with ThreadPoolExecutor(max_workers=max(1, min(self.max_in_flight, len(jobs) or 1))) as executor:
+            for future in [executor.submit(func, arg) for func, arg in jobs]:
+                future.result()
+        return results
+    
+    def _pack_batches(self, news_items: List[NewsItem]):
+        """贪心打包, 返回 (批次列表, 单独处理的下标列表), 元素均为news_items中的下标"""
+        budget = LLM_CONFIG['batch_token_budget']
+        max_items = self.batch_size
+        fixed_cost = estimate_tokens(self._build_batch_prompt([]))
+        batches, singles = [], []
+        current, used = [], fixed_cost
+        for index, item in enumerate(news_items):
+            cost = estimate_tokens(self._format_batch_article(0, item))
+            if fixed_cost + cost > budget / 2:
+                singles.append(index)
+                continue
+            if current and (used + cost > budget or len(current) >= max_items):
+                batches.append(current)
+                current, used = [], fixed_cost
+            current.append(index)
+            used += cost
+        if current:
+            batches.append(current)
+        # 只有一条的批次没有摊薄prompt的效果, 直接走单条请求
+        singles.extend(batch[0] for batch in batches if len(batch) == 1)
+        return [batch for batch in batches if len(batch) > 1], sorted(singles)
+    
+    def _summarize_packed(self, news_items: List[NewsItem]) -> List[str]:
+        """一次请求总结一批新闻, 解析失败的条目返回None"""
+        prompt = self._build_batch_prompt(news_items)
+        try:
+            chat = self.chat_stream(prompt, {**SUMMARY_OPTIONS, 'num_predict': 400 * len(news_items)}, format='json')
+            entries = parse_batch_response(chat.read())
+            elapsed = chat.metrics.seconds
+        except Exception as e:
+            print(f"Error summarizing news batch: {e}")
+            return [None] * len(news_items)
+        
+        summaries = []
+        for number, item in enumerate(news_items, 1):
+            entry = entries.get(number)
+            if entry is None:
+                summaries.append(None)
+                continue
+            summary = self._render_batch_entry(item, entry)
+            self._cache_store(self._summary_cache_key(item, BATCH_PROMPT_VERSION), summary, elapsed / len(news_items))
+            summaries.append(summary)
+        return summaries
+    
+    def _build_batch_prompt(self, news_items: List[NewsItem]) -> str:
+        articles = "\n".join(self._format_batch_article(number, item) for number, item in enumerate(news_items, 1))
+        return f"""
+        请对以下{len(news_items)}条AI新闻分别进行专业总结，要求：
+        1. 每条新闻的要点总共不超过200字
+        2. 突出技术要点和创新点
+        3. 如果原文是英文，请翻译成中文
+        4. 只输出JSON，不要输出其他内容，格式如下：
+        {{"items": [{{"id": 新闻编号, "points": ["要点1", "要点2", "要点3"], "impact": "简要分析这个新闻对AI领域的影响", "tags": ["技术分类标签"]}}]}}
+        5. 每条新闻都必须有且只有一个条目，id与新闻编号一致
+
+        {articles}
+        """
+    
+    def _format_batch_article(self, number: int, news_item: NewsItem) -> str:
+        excerpt = self._content_excerpt(news_item)
+        return (f"[{number}] 标题：{news_item.title}\n"
+                f"来源：{news_item.source}\n"
+                f"原文摘要：{news_item.summary}\n"
+                + (f"原文正文节选：{excerpt}\n" if excerpt else "")
+                + f"发布时间：{news_item.published_date.strftime('%Y-%m-%d %H:%M')}\n")
+    
+    @staticmethod
+    def _render_batch_entry(news_item: NewsItem, entry: dict) -> str:
+        """把JSON条目渲染成与单条总结相同的Markdown格式"""
+        tags = ' '.join('#' + re.sub(r'[\s#]+', '', tag) for tag in ['AI'] + entry['tags'] if tag.strip('# '))
+        points = "\n".join(f"- {point}" for point in entry['points'])
+        return f"""## {news_item.title}
+
+**来源**: {news_item.source}  
+**时间**: {news_item.published_date.strftime('%Y-%m-%d')}  
+**标签**: {tags}
+
+### 核心要点
+{points}
+
+### 技术影响
+{entry['impact']}
+
+---
+"""
     
-    def summarize_news_item(self, news_item: NewsItem) -> str:
-        """对单条新闻进行AI总结"""
-        prompt = f"""
+    def _cache_lookup(self, cache_key: str):
+        if not self.summary_cache:
+            return None
+        cached = self.summary_cache.get(cache_key)
+        if cached:
+            self._count_cache(hit=True, llm_seconds=cached[1] or 0)
+            return cached[0]
+        return None
+    
+    def _cache_store(self, cache_key: str, summary: str, llm_seconds: float):
+        if self.summary_cache:
+            self._count_cache(hit=False, llm_seconds=llm_seconds)
+            self.summary_cache.put(cache_key, self.model_name, summary, llm_seconds)
+    
+    def _summary_cache_key(self, news_item: NewsItem, prompt_version: int) -> str:
+        return SummaryCache.make_key(
+            self.model_name, prompt_version, SUMMARY_OPTIONS,
+            title=news_item.title,
+            source=news_item.source,
+            summary=news_item.summary,
+            content=self._content_excerpt(news_item),
+            published=news_item.published_date.strftime('%Y-%m-%d %H:%M')
+        )
+    
+    def reset_cache_stats(self):
+        self.cache_stats = {'hits': 0, 'misses': 0, 'llm_seconds': 0.0, 'llm_seconds_saved': 0.0}
+    
+    def _count_cache(self, hit: bool, llm_seconds: float):
+        with self._stats_lock:
+            if hit:
+                self.cache_stats['hits'] += 1
+                self.cache_stats['llm_seconds_saved'] += llm_seconds
+            else:
+                self.cache_stats['misses'] += 1
+                self.cache_stats['llm_seconds'] += llm_seconds
+    
+    def cache_report(self) -> str:
+        stats = self.cache_stats
+        total = stats['hits'] + stats['misses']
+        hit_rate = 100 * stats['hits'] / total if total else 0.0
+        return (f"Summary cache: {stats['hits']}/{total} hits ({hit_rate:.0f}%), "
+                f"{stats['llm_seconds_saved']:.1f}s LLM time saved, {stats['llm_seconds']:.1f}s spent")
+    
+    @staticmethod
+    def _content_excerpt(news_item: NewsItem) -> str:
+        """正文节选, 不超过summary_content_budget个token; 没有抽取正文时为空"""
+        content = getattr(news_item, 'content', '')
+        if not isinstance(content, str) or not content:
+            return ""
+        budget = LLM_CONFIG['summary_content_budget']
+        tokens = estimate_tokens(content)
+        if tokens > budget:
+            content = content[:int(len(content) * budget / tokens)]
+        return content
+    
+    def _build_summary_prompt(self, news_item: NewsItem) -> str:
+        excerpt = self._content_excerpt(news_item)
+        excerpt_line = f"\n        原文正文节选：{excerpt}\n" if excerpt else ""
+        return f"""
         请对以下AI新闻进行专业总结，要求：
         1. 总结要点不超过200字
         2. 突出技术要点和创新点
@@ -20,7 +374,7 @@ class LLMProcessor:
 
         标题：{news_item.title}
         来源：{news_item.source}
-        原文摘要：{news_item.summary}
+        原文摘要：{news_item.summary}{excerpt_line}
         发布时间：{news_item.published_date.strftime('%Y-%m-%d %H:%M')}
         
         请用以下格式回复：
@@ -40,58 +394,160 @@ class LLMProcessor:
         
         ---
         """
-        
-        try:
-            response = self.client.chat(
-                model=self.model_name,
-                messages=[{
-                    'role': 'user',
-                    'content': prompt
-                }],
-                options={
-                    'temperature': 0.7,
-                    'top_p': 0.9,
-                    'max_tokens': 500
-                }
-            )
-            return response['message']['content']
-        except Exception as e:
-            print(f"Error summarizing news: {e}")
-            return f"总结生成失败: {str(e)}"
     
     def generate_daily_digest(self, news_items: List[NewsItem], date: str) -> str:
-        """生成每日AI新闻摘要"""
+        """生成每日AI新闻摘要
+        
+        总结内容放得进digest_token_budget时一次生成; 否则按来源分组打包,
+        并行归约成分节小结, 再把各节合并成日报 (map-reduce).
+        """
         summaries = []
         for item in news_items:
             if item.ai_summary:
                 summaries.append(item.ai_summary)
         
-        digest_prompt = f"""
+        digest_prompt = self._build_digest_prompt(date, len(summaries), "".join(summaries))
+        try:
+            if estimate_tokens(digest_prompt) > LLM_CONFIG['digest_token_budget']:
+                sections = self._reduce_digest_sections(
+                    [(item.source, item.ai_summary) for item in news_items if item.ai_summary]
+                )
+                digest_prompt = self._build_digest_prompt(date, len(summaries), "\n\n".join(sections),
+                                                          from_sections=True)
+            return self._chat_digest(digest_prompt, 'final')
+        except Exception as e:
+            print(f"Error generating daily digest: {e}")
+            return f"日报生成失败: {str(e)}"
+    
+    def _build_digest_prompt(self, date: str, count: int, content: str, from_sections: bool = False) -> str:
+        source_note = "（以下内容是按来源分组整理的分节小结）" if from_sections else ""
+        return f"""
         基于以下AI新闻总结，生成一份{date}的AI新闻日报，要求：
-        1. 开头有日期和新闻条数统计
+        1. 开头有日期和新闻条数统计（共{count}条）
         2. 按重要性排序
         3. 最后有今日AI行业趋势总结
         4. 使用专业的Markdown格式
         
-        新闻总结内容：
-        {"".join(summaries)}
+        新闻总结内容{source_note}：
+        {content}
         
         请生成完整的日报：
         """
+    
+    def _reduce_digest_sections(self, labelled: List[tuple]) -> List[str]:
+        """把 (分组名, 文本) 列表归约为若干分节小结, 直到合并后的prompt放得进预算"""
+        budget = LLM_CONFIG['digest_token_budget']
+        texts = labelled
+        for level in range(1, 4):
+            chunks = self._pack_digest_chunks(texts, budget)
+            print(f"[digest] level {level}: {len(texts)} inputs -> {len(chunks)} chunks")
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_in_flight, len(chunks)))) as executor:
+                reduced = list(executor.map(lambda chunk: self._reduce_chunk(chunk, level), chunks))
+            texts = [(label, section) for label, section in reduced if section]
+            if sum(estimate_tokens(section) for _, section in texts) <= budget * 0.8 or len(texts) <= 1:
+                break
+        return [f"### {label}\n{section}" for label, section in texts]
+    
+    def _pack_digest_chunks(self, labelled: List[tuple], budget: int) -> List[tuple]:
+        """同一来源的内容放在一起, 按token预算贪心打包, 返回 [(分组名, [文本, ...]), ...]"""
+        by_label = {}
+        for label, text in labelled:
+            by_label.setdefault(label or 'Unknown', []).append(text)
         
+        chunk_budget = budget - estimate_tokens(self._build_section_prompt('', []))
+        chunks, labels, texts, used = [], [], [], 0
+        for label, group in by_label.items():
+            for text in group:
+                cost = estimate_tokens(text)
+                if cost > chunk_budget:
+                    # 单条超出预算时按比例截断
+                    text = text[:int(len(text) * chunk_budget / cost)]
+                    cost = estimate_tokens(text)
+                if texts and used + cost > chunk_budget:
+                    chunks.append((' / '.join(labels), texts))
+                    labels, texts, used = [], [], 0
+                if label not in labels:
+                    labels.append(label)
+                texts.append(text)
+                used += cost
+        if texts:
+            chunks.append((' / '.join(labels), texts))
+        return chunks
+    
+    def _reduce_chunk(self, chunk: tuple, level: int) -> tuple:
+        label, texts = chunk
         try:
-            response = self.client.chat(
-                model=self.model_name,
-                messages=[{
-                    'role': 'user',
-                    'content': digest_prompt
-                }],
-                options={
-                    'temperature': 0.8,
-                    'max_tokens': 15000
-                }
-            )
-            return response['message']['content']
+            return label, self._chat_digest(self._build_section_prompt(label, texts), f'level {level} [{label}]')
         except Exception as e:
-            print(f"Error generating daily digest: {e}")
-            return f"日报生成失败: {str(e)}"
\ No newline at end of file
+            print(f"Error reducing digest section {label}: {e}")
+            return label, ""
+    
+    @staticmethod
+    def _build_section_prompt(label: str, texts: List[str]) -> str:
+        content = "\n".join(texts)
+        return f"""
+        以下是来自 {label} 的AI新闻总结，请整理成日报中的一个小节，要求：
+        1. 按重要性列出主要新闻，每条一到两句话，保留关键技术要点
+        2. 总长度不超过400字
+        3. 使用Markdown列表格式，不要输出标题
+        
+        新闻总结内容：
+        {content}
+        """
+    
+    def _chat_digest(self, prompt: str, stage: str) -> str:
+        """发送日报相关请求并记录prompt大小, 超出上下文窗口时给出警告"""
+        tokens = estimate_tokens(prompt)
+        context = LLM_CONFIG['context_window']
+        print(f"[digest] {stage}: prompt ~{tokens} tokens (budget {LLM_CONFIG['digest_token_budget']}, "
+              f"context {context})")
+        if tokens > context:
+            print(f"[digest] ⚠️ {stage}: prompt exceeds the model context window and will be truncated")
+        return self.chat_stream(prompt, {
+            'temperature': 0.8,
+            'num_predict': 15000
+        }).read()
+
+def parse_batch_response(text: str) -> dict:
+    """解析批量总结返回的JSON, 返回 {编号: 条目}; 容忍代码块包裹和前后多余文字, 丢弃格式错误的条目"""
+    text = re.sub(r'^\s*```(?:json)?|```\s*$', '', text.strip())
+    data = None
+    # 先尝试最外层的括号 (对象或数组, 以先出现的为准)
+    brackets = sorted((('{', '}'), ('[', ']')), key=lambda pair: text.find(pair[0]) % (len(text) + 1))
+    for opener, closer in brackets:
+        start, end = text.find(opener), text.rfind(closer)
+        if start == -1 or end <= start:
+            continue
+        try:
+            data = json.loads(text[start:end + 1])
+            break
+        except ValueError:
+            continue
+    
+    if isinstance(data, dict):
+        data = [data] if 'id' in data else data.get('items', data.get('summaries'))
+    if not isinstance(data, list):
+        return {}
+    
+    entries = {}
+    for raw in data:
+        if not isinstance(raw, dict):
+            continue
+        try:
+            number = int(raw.get('id'))
+        except (TypeError, ValueError):
+            continue
+        points = raw.get('points')
+        if isinstance(points, str):
+            points = [points]
+        if not isinstance(points, list):
+            continue
+        points = [str(point).strip() for point in points if str(point).strip()]
+        impact = raw.get('impact')
+        tags = raw.get('tags') or []
+        if isinstance(tags, str):
+            tags = re.split(r'[,，\s]+', tags)
+        if not points or not isinstance(impact, str) or not impact.strip() or not isinstance(tags, list):
+            continue
+        entries[number] = {'points': points, 'impact': impact.strip(), 'tags': [str(tag) for tag in tags]}
+    return entries
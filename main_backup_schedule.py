@@ -1,11 +1,13 @@
+import argparse
 import schedule
 import time
 from datetime import datetime
 from news_collector import NewsCollector
 from llm_processor import LLMProcessor
-from output_dispatcher import OutputDispatcher
-import sqlite3
+from output_dispatcher import EnhancedOutputDispatcher
+from pipeline import NewsPipeline
 from config import NEWS_SOURCES
+from jobs import JobAlreadyRunning, JobRunner, JobStore
 from dotenv import load_dotenv
 
 # 加载环境变量
@@ -16,58 +18,19 @@ class AINewsWorkflow:
     def __init__(self):
         self.news_collector = NewsCollector()
         self.llm_processor = LLMProcessor()
-        self.output_dispatcher = OutputDispatcher()
+        self.output_dispatcher = EnhancedOutputDispatcher(self.news_collector.db_path)
+        self.job_runner = JobRunner(JobStore(self.news_collector.db_path))
     
-    def run_daily_workflow(self):
-        """执行每日工作流"""
+    def run_daily_workflow(self, force: bool = False):
+        """执行每日工作流 (默认增量处理, force=True时重新处理所有新闻)"""
         try:
             print(f"开始执行AI新闻工作流 - {datetime.now().strftime('%Y-%m-%d %H:%M:%S')}")
-            
-            # 1. 采集新闻
-            print("步骤1: 采集AI新闻...")
-            all_sources = []
-            for source_list in NEWS_SOURCES.values():
-                all_sources.extend(source_list)
-            
-            news_items = self.news_collector.collect_rss_news(all_sources)
-            print(f"采集到 {len(news_items)} 条新闻")
-            
-            # 2. 处理每条新闻
-            print("步骤2: 处理新闻内容...")
-            processed_items = []
-            for item in news_items:
-                # 提取完整内容
-                item.content = self.news_collector.extract_full_content(item.url)
-                
-                # AI总结
-                item.ai_summary = self.llm_processor.summarize_news_item(item)
-                
-                # 保存到数据库
-                self.save_news_item(item)
-                processed_items.append(item)
-                
-                print(f"已处理: {item.title[:50]}...")
-            
-            # 3. 生成日报
-            print("步骤3: 生成AI新闻日报...")
-            today = datetime.now().strftime('%Y-%m-%d')
-            daily_digest = self.llm_processor.generate_daily_digest(processed_items, today)
-            
-            # 4. 分发输出
-            print("步骤4: 分发新闻日报...")
-            
-            # 发送邮件
-            self.output_dispatcher.send_email(
-                subject=f"AI新闻日报 - {today}",
-                content=daily_digest
-            )
-            
-            # 保存到Obsidian
-            self.output_dispatcher.save_to_obsidian(daily_digest, today)
-            
-            
+            # 通过jobs表登记, 与Streamlit界面发起的采集互斥
+            self.job_runner.run('collect', lambda ctx: self._daily_workflow(ctx, force), params={'force': force})
             print("✅ 工作流执行完成!")
             
+        except JobAlreadyRunning as e:
+            print(f"⏭️ 跳过本次执行: 采集任务 #{e.job_id} 正在运行")
         except Exception as e:
             print(f"❌ 工作流执行失败: {e}")
             # 发送错误通知邮件
@@ -76,39 +39,85 @@ class AINewsWorkflow:
                 content=f"错误信息: {str(e)}\n时间: {datetime.now()}"
             )
     
-    def save_news_item(self, item):
-        """保存新闻项到数据库"""
-        conn = sqlite3.connect(self.news_collector.db_path)
-        cursor = conn.cursor()
+    def run_retention(self):
+        """把超过保留期的新闻移入月度归档库并释放主库空间"""
         try:
-            cursor.execute('''
-                INSERT OR REPLACE INTO news_items 
-                (title, url, summary, published_date, source, content, ai_summary)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                item.title,
-                item.url,
-                item.summary,
-                item.published_date.isoformat(),
-                item.source,
-                item.content,
-                item.ai_summary
-            ))
-            conn.commit()
+            report = self.job_runner.run('retention', lambda ctx: self.news_collector.repository.apply_retention())
+            print(f"归档完成: {report['result']['archived']} 条新闻")
+        except JobAlreadyRunning as e:
+            print(f"⏭️ 跳过归档: 任务 #{e.job_id} 正在运行")
         except Exception as e:
-            print(f"保存新闻失败: {e}")
+            print(f"❌ 归档失败: {e}")
+    
+    def _daily_workflow(self, ctx, force: bool = False) -> dict:
+        # 1-2. 采集并处理新闻: 抓取、抽取、总结、入库以流水线方式并发执行,
+        #      已总结且摘要未变化的新闻会被跳过
+        print("步骤1-2: 采集并处理AI新闻...")
+        all_sources = []
+        for source_list in NEWS_SOURCES.values():
+            all_sources.extend(source_list)
+        
+        pipeline = NewsPipeline(self.news_collector, self.llm_processor, force=force)
+        fetch_stats = pipeline.pipeline.stats[0]
+        processed_items = []
+        
+        def poll():
+            # 抓取阶段结束前没有结果产出, 由流水线定时检查取消并汇报抓取进度
+            ctx.check_cancelled()
+            ctx.progress(done=fetch_stats.processed, total=len(all_sources), items=len(processed_items))
+        
+        results = pipeline.run(all_sources, poll=poll)
+        try:
+            for item in results:
+                ctx.check_cancelled()
+                processed_items.append(item)
+                ctx.progress(done=fetch_stats.processed, total=len(all_sources), items=len(processed_items),
+                             message=f"已处理: {item.title[:50]}")
+                print(f"已处理: {item.title[:50]}...")
         finally:
-            conn.close()
-
+            results.close()
+        print(f"共 {len(processed_items)} 条新闻 ({len(pipeline.skipped)} 条已处理过)")
+        print(pipeline.report())
+        
+        # 3. 生成日报
+        print("步骤3: 生成AI新闻日报...")
+        ctx.progress(message="生成AI新闻日报")
+        today = datetime.now().strftime('%Y-%m-%d')
+        daily_digest = self.llm_processor.generate_daily_digest(processed_items, today)
+        
+        # 4. 分发输出
+        print("步骤4: 分发新闻日报...")
+        ctx.progress(message="分发新闻日报")
+        
+        # 发送邮件
+        self.output_dispatcher.send_email(
+            subject=f"AI新闻日报 - {today}",
+            content=daily_digest
+        )
+        
+        # 并行分发到Obsidian、飞书等其他输出 (邮件已在上面发送LLM日报)
+        outputs = self.output_dispatcher.dispatch(processed_items, today, skip=('email',))
+        
+        return {'processed': len(processed_items) - len(pipeline.skipped), 'skipped': len(pipeline.skipped),
+                'report': pipeline.report(), 'outputs': outputs}
+    
 def main():
+    parser = argparse.ArgumentParser(description="AI新闻定时工作流")
+    parser.add_argument('--force', action='store_true', help="重新抽取和总结所有新闻, 忽略已处理记录")
+    args = parser.parse_args()
+    
     workflow = AINewsWorkflow()
+    # 邮件由后台线程从outbox发送, 启动时先补发上次未发出的邮件
+    workflow.output_dispatcher.outbox.start()
     
     # 设置定时任务 - 每天早上9点执行
-    schedule.every().day.at("09:00").do(workflow.run_daily_workflow)
+    schedule.every().day.at("09:00").do(workflow.run_daily_workflow, force=args.force)
+    # 每天凌晨归档超过保留期的新闻
+    schedule.every().day.at("03:00").do(workflow.run_retention)
     
     # 也可以立即执行一次测试
     print("执行测试运行...")
-    workflow.run_daily_workflow()
+    workflow.run_daily_workflow(force=args.force)
     
     # 保持程序运行
     print("定时任务已启动，等待执行...")
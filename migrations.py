@@ -0,0 +1,329 @@
+# migrations.py - 数据库结构的版本化迁移
+#
+# 当前版本号记录在 PRAGMA user_version 中. NewsRepository.migrate() 按顺序执行
+# 版本号大于当前版本的迁移, 每个迁移在独立事务中完成, 失败时整体回滚.
+# 新增迁移只能追加到列表末尾, 已发布的迁移不要再修改.
+import sqlite3
+from typing import Callable, List, Tuple
+
+
+def _initial_schema(conn: sqlite3.Connection):
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS news_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            title TEXT NOT NULL,
+            url TEXT UNIQUE NOT NULL,
+            summary TEXT,
+            published_date TEXT,
+            source TEXT,
+            content TEXT,
+            ai_summary TEXT,
+            created_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS feed_cache (
+            url TEXT PRIMARY KEY,
+            etag TEXT,
+            last_modified TEXT,
+            body_hash TEXT,
+            body_size INTEGER DEFAULT 0,
+            updated_at TEXT DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+
+def _epoch_timestamps(conn: sqlite3.Connection):
+    """文本时间旁边增加epoch整数列, 按时间和来源建索引
+
+    published_date是不带时区的ISO文本, 与SQLite的date('now')一样按UTC解释.
+    """
+    columns = {row[1] for row in conn.execute('PRAGMA table_info(news_items)')}
+    if 'published_ts' not in columns:
+        conn.execute('ALTER TABLE news_items ADD COLUMN published_ts INTEGER')
+    if 'created_ts' not in columns:
+        conn.execute('ALTER TABLE news_items ADD COLUMN created_ts INTEGER')
+    conn.execute('''
+        UPDATE news_items SET
+            published_ts = CAST(strftime('%s', published_date) AS INTEGER),
+            created_ts = CAST(strftime('%s', created_at) AS INTEGER)
+        WHERE published_ts IS NULL OR created_ts IS NULL
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_news_items_published_ts ON news_items(published_ts)')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_news_items_source_published_ts '
+                 'ON news_items(source, published_ts)')
+
+
+def _fts_triggers(conn: sqlite3.Connection):
+    """让news_items_fts与news_items保持同步的触发器"""
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS news_items_fts_insert AFTER INSERT ON news_items BEGIN
+            INSERT INTO news_items_fts (rowid, title, summary, content, ai_summary)
+            VALUES (new.id, new.title, new.summary, new.content, new.ai_summary);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS news_items_fts_delete AFTER DELETE ON news_items BEGIN
+            INSERT INTO news_items_fts (news_items_fts, rowid, title, summary, content, ai_summary)
+            VALUES ('delete', old.id, old.title, old.summary, old.content, old.ai_summary);
+        END
+    ''')
+    conn.execute('''
+        CREATE TRIGGER IF NOT EXISTS news_items_fts_update
+        AFTER UPDATE OF title, summary, content, ai_summary ON news_items BEGIN
+            INSERT INTO news_items_fts (news_items_fts, rowid, title, summary, content, ai_summary)
+            VALUES ('delete', old.id, old.title, old.summary, old.content, old.ai_summary);
+            INSERT INTO news_items_fts (rowid, title, summary, content, ai_summary)
+            VALUES (new.id, new.title, new.summary, new.content, new.ai_summary);
+        END
+    ''')
+
+
+def _full_text_search(conn: sqlite3.Connection):
+    """news_items的FTS5外部内容索引, 由触发器保持同步
+
+    unicode61分词器按空格和标点切词, 不区分大小写并忽略变音符号.
+    """
+    conn.execute('''
+        CREATE VIRTUAL TABLE IF NOT EXISTS news_items_fts USING fts5(
+            title, summary, content, ai_summary,
+            content='news_items', content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    ''')
+    _fts_triggers(conn)
+    conn.execute("INSERT INTO news_items_fts (news_items_fts) VALUES ('rebuild')")
+
+
+def _data_version(conn: sqlite3.Connection):
+    """news_items每次写入都让计数器加一, 读方据此判断缓存的查询结果是否过期
+
+    与 PRAGMA data_version 不同, 本连接自己的写入也会计数.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+    ''')
+    conn.execute('INSERT OR IGNORE INTO data_version (id, version) VALUES (1, 0)')
+    for event in ('INSERT', 'UPDATE', 'DELETE'):
+        conn.execute(f'''
+            CREATE TRIGGER IF NOT EXISTS news_items_version_{event.lower()} AFTER {event} ON news_items BEGIN
+                UPDATE data_version SET version = version + 1 WHERE id = 1;
+            END
+        ''')
+
+
+def rebuild_daily_source_counts(conn: sqlite3.Connection):
+    """由news_items重新计算每日/来源汇总表 (回填或修复用)"""
+    conn.execute('DELETE FROM daily_source_counts')
+    conn.execute('''
+        INSERT INTO daily_source_counts (day, source, count)
+        SELECT date(published_ts, 'unixepoch'), coalesce(source, ''), COUNT(*)
+        FROM news_items WHERE published_ts IS NOT NULL
+        GROUP BY 1, 2
+    ''')
+    # 已移入归档库的新闻仍然计入仪表盘
+    if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'archived_counts'").fetchone():
+        conn.execute('''
+            INSERT INTO daily_source_counts (day, source, count)
+            SELECT day, source, count FROM archived_counts WHERE true
+            ON CONFLICT (day, source) DO UPDATE SET count = count + excluded.count
+        ''')
+
+
+def _daily_source_counts(conn: sqlite3.Connection):
+    """仪表盘用的每日/来源计数, 由触发器在写入news_items的同一事务中增量维护
+
+    day为published_ts对应的UTC日期.
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS daily_source_counts (
+            day TEXT NOT NULL,
+            source TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, source)
+        ) WITHOUT ROWID
+    ''')
+    increment = '''
+            INSERT INTO daily_source_counts (day, source, count)
+            VALUES (date(new.published_ts, 'unixepoch'), coalesce(new.source, ''), 1)
+            ON CONFLICT (day, source) DO UPDATE SET count = count + 1;
+    '''
+    decrement = '''
+            UPDATE daily_source_counts SET count = count - 1
+            WHERE day = date(old.published_ts, 'unixepoch') AND source = coalesce(old.source, '');
+            DELETE FROM daily_source_counts
+            WHERE day = date(old.published_ts, 'unixepoch') AND source = coalesce(old.source, '') AND count <= 0;
+    '''
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS daily_source_counts_insert AFTER INSERT ON news_items
+        WHEN new.published_ts IS NOT NULL BEGIN {increment} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS daily_source_counts_delete AFTER DELETE ON news_items
+        WHEN old.published_ts IS NOT NULL BEGIN {decrement} END
+    ''')
+    # 只有日期或来源真的变化时才移动计数; 新旧值可能有一个为NULL, 分成两个触发器
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS daily_source_counts_update_old AFTER UPDATE OF published_ts, source ON news_items
+        WHEN old.published_ts IS NOT NULL
+             AND (old.published_ts IS NOT new.published_ts OR old.source IS NOT new.source) BEGIN {decrement} END
+    ''')
+    conn.execute(f'''
+        CREATE TRIGGER IF NOT EXISTS daily_source_counts_update_new AFTER UPDATE OF published_ts, source ON news_items
+        WHEN new.published_ts IS NOT NULL
+             AND (old.published_ts IS NOT new.published_ts OR old.source IS NOT new.source) BEGIN {increment} END
+    ''')
+    rebuild_daily_source_counts(conn)
+
+
+def _jobs(conn: sqlite3.Connection):
+    """后台任务表; 部分唯一索引保证同一种任务同时只有一个在排队或运行"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS jobs (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            kind TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'queued',
+            params TEXT,
+            progress_done INTEGER NOT NULL DEFAULT 0,
+            progress_total INTEGER NOT NULL DEFAULT 0,
+            items_done INTEGER NOT NULL DEFAULT 0,
+            message TEXT,
+            result TEXT,
+            cancel_requested INTEGER NOT NULL DEFAULT 0,
+            owner TEXT,
+            created_ts INTEGER,
+            started_ts INTEGER,
+            heartbeat_ts INTEGER,
+            finished_ts INTEGER
+        )
+    ''')
+    conn.execute('''
+        CREATE UNIQUE INDEX IF NOT EXISTS idx_jobs_active_kind ON jobs(kind)
+        WHERE status IN ('queued', 'running')
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_jobs_created_ts ON jobs(created_ts)')
+
+
+def _archives(conn: sqlite3.Connection):
+    """冷数据归档的登记表
+
+    archives: 每个月度归档库的行数、大小和时间范围
+    archive_index: 已归档新闻的id -> 所在月份, 用于按id读取详情
+    archived_counts: 已归档新闻的每日/来源计数, 重建汇总表时加回
+    """
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archives (
+            month TEXT PRIMARY KEY,
+            rows INTEGER NOT NULL DEFAULT 0,
+            bytes INTEGER NOT NULL DEFAULT 0,
+            min_ts INTEGER,
+            max_ts INTEGER,
+            updated_ts INTEGER
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archive_index (
+            id INTEGER PRIMARY KEY,
+            url TEXT NOT NULL,
+            month TEXT NOT NULL
+        )
+    ''')
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS archived_counts (
+            day TEXT NOT NULL,
+            source TEXT NOT NULL,
+            count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, source)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _outbox(conn: sqlite3.Connection):
+    """待发送邮件队列; message为完整的MIME文本, 发送失败按next_attempt_ts退避重试"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS outbox (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            subject TEXT,
+            recipients TEXT NOT NULL,
+            message TEXT NOT NULL,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            last_error TEXT,
+            created_ts INTEGER,
+            next_attempt_ts INTEGER,
+            claimed_ts INTEGER,
+            sent_ts INTEGER
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_outbox_status_next ON outbox(status, next_attempt_ts)')
+
+
+def _trigram_search(conn: sqlite3.Connection):
+    """全文索引改用trigram分词器
+
+    unicode61把连续的中文 (连同其中夹杂的英文) 当作一个词, 搜索其中的一部分
+    (如标题"谷歌发布新的大模型Gemini"中的"大模型"或"Gemini") 找不到结果.
+    trigram按3个字符的滑动窗口建索引, 支持任意子串匹配 (不区分大小写);
+    少于3个字符的词无法走索引, 由NewsRepository改用LIKE匹配.
+    """
+    for event in ('insert', 'delete', 'update'):
+        conn.execute(f'DROP TRIGGER IF EXISTS news_items_fts_{event}')
+    conn.execute('DROP TABLE IF EXISTS news_items_fts')
+    conn.execute('''
+        CREATE VIRTUAL TABLE news_items_fts USING fts5(
+            title, summary, content, ai_summary,
+            content='news_items', content_rowid='id',
+            tokenize='trigram'
+        )
+    ''')
+    _fts_triggers(conn)
+    conn.execute("INSERT INTO news_items_fts (news_items_fts) VALUES ('rebuild')")
+
+
+def _summary_cache(conn: sqlite3.Connection):
+    """LLM总结缓存 (原来由SummaryCache.init_table自行创建, 已有的表保持不变)"""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS summary_cache (
+            key TEXT PRIMARY KEY,
+            model TEXT,
+            summary TEXT NOT NULL,
+            llm_seconds REAL DEFAULT 0,
+            created_at REAL,
+            last_used_at REAL
+        )
+    ''')
+    conn.execute('CREATE INDEX IF NOT EXISTS idx_summary_cache_last_used ON summary_cache(last_used_at)')
+
+
+def _feed_item_urls(conn: sqlite3.Connection):
+    """feed_cache记录该feed上次解析出的新闻url, 缓存命中时从news_items读回这些新闻
+
+    已有的校验信息没有对应的url列表, 清空后下次运行重新下载一遍.
+    """
+    conn.execute("ALTER TABLE feed_cache ADD COLUMN item_urls TEXT NOT NULL DEFAULT '[]'")
+    conn.execute('DELETE FROM feed_cache')
+
+
+def _alternate_sources(conn: sqlite3.Connection):
+    """去重合并进来的其他转载来源 [[source, url], ...], 已处理的条目从数据库读回时保留"""
+    conn.execute("ALTER TABLE news_items ADD COLUMN alternate_sources TEXT NOT NULL DEFAULT '[]'")
+
+
+# (版本号, 说明, 迁移函数)
+MIGRATIONS: List[Tuple[int, str, Callable[[sqlite3.Connection], None]]] = [
+    (1, 'initial schema', _initial_schema),
+    (2, 'epoch timestamps, published_ts/source indexes', _epoch_timestamps),
+    (3, 'FTS5 full-text index', _full_text_search),
+    (4, 'data_version write counter', _data_version),
+    (5, 'daily_source_counts rollup', _daily_source_counts),
+    (6, 'background jobs', _jobs),
+    (7, 'archive registry', _archives),
+    (8, 'email outbox', _outbox),
+    (9, 'summary cache', _summary_cache),
+    (10, 'trigram full-text index for CJK substring search', _trigram_search),
+    (11, 'feed_cache item urls', _feed_item_urls),
+    (12, 'news_items alternate sources', _alternate_sources),
+]
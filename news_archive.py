@@ -0,0 +1,165 @@
+# news_archive.py - 按月归档的冷数据
+#
+# 超过保留期的新闻从主库移到 archive_dir 下的月度归档库 (news_YYYY-MM.db).
+# 归档库结构与news_items相同, 但content和ai_summary压缩存储 (有zstandard时用zstd, 否则zlib),
+# 每行记录所用的压缩方式. 归档库按url写入 (同一url再次归档时覆盖旧行), 主库中的archives表登记
+# 每个月的行数和时间范围, 查询跨越保留期时NewsRepository据此决定需要打开哪些归档库.
+import json
+import os
+import sqlite3
+import zlib
+from typing import List, Optional
+
+try:
+    import zstandard
+    HAS_ZSTD = True
+except ImportError:
+    HAS_ZSTD = False
+
+ARCHIVE_COLUMNS = ('id', 'title', 'url', 'summary', 'published_date', 'published_ts', 'source',
+                   'content', 'ai_summary', 'created_at', 'created_ts')
+
+
+def compress(text: Optional[str], codec: str) -> Optional[bytes]:
+    if text is None:
+        return None
+    data = text.encode('utf-8')
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=9).compress(data)
+    return zlib.compress(data, 9)
+
+
+def decompress(data: Optional[bytes], codec: str) -> Optional[str]:
+    if data is None:
+        return None
+    if codec == 'zstd':
+        data = zstandard.ZstdDecompressor().decompress(data)
+    else:
+        data = zlib.decompress(data)
+    return data.decode('utf-8')
+
+
+class NewsArchive:
+    def __init__(self, archive_dir: str, codec: str = None):
+        self.archive_dir = archive_dir
+        self.codec = codec or ('zstd' if HAS_ZSTD else 'zlib')
+
+    def path_for(self, month: str) -> str:
+        return os.path.join(self.archive_dir, f"news_{month}.db")
+
+    def _connect(self, month: str, readonly: bool = True) -> sqlite3.Connection:
+        path = self.path_for(month)
+        if readonly:
+            conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        else:
+            os.makedirs(self.archive_dir, exist_ok=True)
+            conn = sqlite3.connect(path)
+            self._init_schema(conn)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    @staticmethod
+    def _init_schema(conn: sqlite3.Connection):
+        conn.execute('''
+            CREATE TABLE IF NOT EXISTS news_items (
+                id INTEGER PRIMARY KEY,
+                title TEXT NOT NULL,
+                url TEXT UNIQUE NOT NULL,
+                summary TEXT,
+                published_date TEXT,
+                published_ts INTEGER,
+                source TEXT,
+                content BLOB,
+                ai_summary BLOB,
+                codec TEXT NOT NULL,
+                created_at TEXT,
+                created_ts INTEGER
+            )
+        ''')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_news_items_published_ts ON news_items(published_ts)')
+        conn.execute('CREATE INDEX IF NOT EXISTS idx_news_items_source_published_ts '
+                     'ON news_items(source, published_ts)')
+
+    def write(self, month: str, rows: List[sqlite3.Row]) -> tuple:
+        """把一个月的行压缩写入归档库, 返回归档库当前的 (行数, 文件字节数)"""
+        conn = self._connect(month, readonly=False)
+        try:
+            with conn:
+                # 按url覆盖: 归档后又被重新采集的新闻换成新的id (INSERT OR REPLACE会按url删掉旧行)
+                conn.executemany(f'''
+                    INSERT INTO news_items ({', '.join(ARCHIVE_COLUMNS)}, codec)
+                    VALUES ({', '.join('?' * len(ARCHIVE_COLUMNS))}, ?)
+                    ON CONFLICT(url) DO UPDATE SET
+                        {', '.join(f'{column} = excluded.{column}' for column in (*ARCHIVE_COLUMNS, 'codec'))}
+                ''', [(*(compress(row[column], self.codec) if column in ('content', 'ai_summary') else row[column]
+                         for column in ARCHIVE_COLUMNS), self.codec) for row in rows])
+            count = conn.execute('SELECT COUNT(*) FROM news_items').fetchone()[0]
+        finally:
+            conn.close()
+        return count, os.path.getsize(self.path_for(month))
+
+    def find_urls(self, month: str, urls: List[str]) -> List[dict]:
+        """按url查找已归档的行, 返回id、url以及计数用的published_ts和source"""
+        if not os.path.exists(self.path_for(month)):
+            return []
+        conn = self._connect(month)
+        try:
+            return [dict(row) for row in conn.execute('''
+                SELECT id, url, published_ts, source FROM news_items
+                WHERE url IN (SELECT value FROM json_each(?))
+            ''', (json.dumps(urls),))]
+        finally:
+            conn.close()
+
+    def delete_urls(self, month: str, urls: List[str]) -> tuple:
+        """删除归档库中的这些url, 返回归档库当前的 (行数, 文件字节数)"""
+        conn = self._connect(month, readonly=False)
+        try:
+            with conn:
+                conn.execute('DELETE FROM news_items WHERE url IN (SELECT value FROM json_each(?))',
+                             (json.dumps(urls),))
+            count = conn.execute('SELECT COUNT(*) FROM news_items').fetchone()[0]
+        finally:
+            conn.close()
+        return count, os.path.getsize(self.path_for(month))
+
+    def list_sources(self, month: str, clauses: List[str], params: list) -> List[str]:
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        conn = self._connect(month)
+        try:
+            return [row[0] for row in conn.execute(f'SELECT DISTINCT source FROM news_items {where}', params)]
+        finally:
+            conn.close()
+
+    def list_news(self, month: str, columns: str, clauses: List[str], params: list, limit: int) -> List[dict]:
+        """在一个归档库中执行与主库相同的列表查询 (只能选未压缩的列)"""
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        conn = self._connect(month)
+        try:
+            return [dict(row) for row in conn.execute(f'''
+                SELECT {columns} FROM news_items {where}
+                ORDER BY published_ts DESC, id DESC LIMIT ?
+            ''', (*params, limit))]
+        finally:
+            conn.close()
+
+    def count_news(self, month: str, clauses: List[str], params: list) -> int:
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        conn = self._connect(month)
+        try:
+            return conn.execute(f'SELECT COUNT(*) FROM news_items {where}', params).fetchone()[0]
+        finally:
+            conn.close()
+
+    def get_news_details(self, month: str, item_id: int) -> Optional[dict]:
+        conn = self._connect(month)
+        try:
+            row = conn.execute('SELECT summary, content, ai_summary, codec FROM news_items WHERE id = ?',
+                               (item_id,)).fetchone()
+        finally:
+            conn.close()
+        if row is None:
+            return None
+        return {'summary': row['summary'],
+                'content': decompress(row['content'], row['codec']),
+                'ai_summary': decompress(row['ai_summary'], row['codec'])}
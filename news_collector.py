@@ -1,10 +1,20 @@
+import codecs
 import feedparser
 import requests
-from bs4 import BeautifulSoup
 from datetime import datetime, timedelta
-import sqlite3
-from dataclasses import dataclass
-from typing import List
+import hashlib
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from dataclasses import dataclass, field
+from typing import Callable, Iterable, List, Optional, Tuple
+from urllib.parse import urlparse
+from requests.adapters import HTTPAdapter
+from config import COLLECTOR_CONFIG, PIPELINE_CONFIG
+from content_extractor import TextCollector, extract_main_content, extract_text
+from migrations import MIGRATIONS
+from news_repository import NewsRepository, load_alternates
 
 @dataclass
 class NewsItem:
@@ -15,76 +25,384 @@ class NewsItem:
     source: str
     content: str = ""
     ai_summary: str = ""
+    alternate_sources: List[Tuple[str, str]] = field(default_factory=list)  # 其他转载来源 (source, url)
+    content_loader: Optional[Callable[[str], str]] = field(default=None, repr=False, compare=False)
+    
+    def get_content(self) -> str:
+        """按需获取正文: 正文尚未抽取时, 第一次访问才调用content_loader下载"""
+        if not self.content and self.content_loader:
+            loader, self.content_loader = self.content_loader, None
+            self.content = loader(self.url) or ""
+        return self.content
 
 class NewsCollector:
-    def __init__(self, db_path: str = "ai_news.db"):
+    HEADERS = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
+
+    def __init__(self, db_path: str = "ai_news.db", max_workers: int = None,
+                 per_host_limit: int = None, feed_timeout: float = None,
+                 use_feed_cache: bool = None):
         self.db_path = db_path
+        self.repository = NewsRepository.for_path(db_path)
+        self.max_workers = max_workers or COLLECTOR_CONFIG['max_workers']
+        self.per_host_limit = per_host_limit or COLLECTOR_CONFIG['per_host_limit']
+        self.feed_timeout = feed_timeout or COLLECTOR_CONFIG['feed_timeout']
+        self.use_feed_cache = COLLECTOR_CONFIG['use_feed_cache'] if use_feed_cache is None else use_feed_cache
+        self._host_semaphores = {}
+        self._host_lock = threading.Lock()
+        self.session = self._create_session()
+        self._parse_pool = None
+        self._parse_pool_lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._feed_cache_lock = threading.Lock()
+        self._pending_feed_cache = {}  # feed url -> (校验信息, 尚未入库的新闻url)
+        self.cache_stats = self._empty_cache_stats()
+        self.content_stats = {'fetched': 0, 'deferred': 0}
         self.init_database()
     
     def init_database(self):
-        """初始化数据库"""
-        conn = sqlite3.connect(self.db_path)
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS news_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                title TEXT NOT NULL,
-                url TEXT UNIQUE NOT NULL,
-                summary TEXT,
-                published_date TEXT,
-                source TEXT,
-                content TEXT,
-                ai_summary TEXT,
-                created_at TEXT DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        conn.commit()
-        conn.close()
+        """初始化数据库 (按版本执行尚未应用的迁移)"""
+        self.repository.migrate(MIGRATIONS)
     
     def collect_rss_news(self, rss_urls: List[str]) -> List[NewsItem]:
-        """采集RSS新闻"""
-        news_items = []
+        """采集RSS新闻 (并发抓取, 结果按rss_urls顺序返回)
+        
+        feed的缓存校验信息要等新闻入库后才写入, 调用方保存新闻后应调用commit_feed_cache.
+        """
         yesterday = datetime.now() - timedelta(days=1)
+        self.reset_cache_stats()
+        rss_urls = list(dict.fromkeys(rss_urls))  # 同一feed可能出现在多个分类中
         
-        for url in rss_urls:
-            try:
-                feed = feedparser.parse(url)
-                source_name = feed.feed.get('title', 'Unknown')
-                
-                for entry in feed.entries:
-                    pub_date = datetime(*entry.published_parsed[:6])
-                    if pub_date >= yesterday:
-                        news_item = NewsItem(
-                            title=entry.title,
-                            url=entry.link,
-                            summary=entry.get('summary', ''),
-                            published_date=pub_date,
-                            source=source_name
-                        )
-                        news_items.append(news_item)
-            except Exception as e:
-                print(f"Error collecting from {url}: {e}")
+        if self.max_workers <= 1 or len(rss_urls) <= 1:
+            results = [self.collect_feed(url, yesterday) for url in rss_urls]
+        else:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(rss_urls))) as executor:
+                # map() 按提交顺序返回结果, 保证下游拿到的顺序与顺序抓取一致
+                results = list(executor.map(lambda url: self.collect_feed(url, yesterday), rss_urls))
         
+        news_items = []
+        for items in results:
+            news_items.extend(items)
+        
+        if self.use_feed_cache:
+            print(self.cache_report())
         return news_items
     
-    def extract_full_content(self, url: str) -> str:
-        """提取文章完整内容"""
+    def collect_feed(self, url: str, since: datetime = None, force: bool = False) -> List[NewsItem]:
+        """抓取并解析单个feed (默认只保留最近24小时), 失败时返回空列表
+        
+        feed未变化 (缓存命中) 时从数据库读回该feed上次解析出的新闻.
+        force=True时不发送条件请求, 总是重新下载并解析.
+        """
+        since = since or datetime.now() - timedelta(days=1)
+        news_items = []
         try:
-            headers = {'User-Agent': 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'}
-            response = requests.get(url, headers=headers, timeout=10)
-            soup = BeautifulSoup(response.content, 'html.parser')
+            feed, cache_entry, cached = self._fetch_feed(url, force)
+            if feed is None:
+                return self._stored_items(cached['item_urls'], since)
+            source_name = feed.feed.get('title', 'Unknown')
             
-            # 移除脚本和样式元素
-            for script in soup(["script", "style"]):
-                script.decompose()
+            for entry in feed.entries:
+                pub_date = datetime(*entry.published_parsed[:6])
+                if pub_date >= since:
+                    news_item = NewsItem(
+                        title=entry.title,
+                        url=entry.link,
+                        summary=entry.get('summary', ''),
+                        published_date=pub_date,
+                        source=source_name
+                    )
+                    news_items.append(news_item)
             
-            # 提取主要内容
-            content = soup.get_text()
-            lines = (line.strip() for line in content.splitlines())
-            chunks = (phrase.strip() for line in lines for phrase in line.split("  "))
-            content = ' '.join(chunk for chunk in chunks if chunk)
+            if cache_entry:
+                cache_entry['item_urls'] = [item.url for item in news_items]
+                self._defer_feed_cache(cache_entry)
+        except Exception as e:
+            print(f"Error collecting from {url}: {e}")
+        
+        return news_items
+    
+    def _fetch_feed(self, url: str, force: bool = False):
+        """在主机并发限制内下载feed, 返回 (feed, 待写入的缓存记录, 已有的缓存记录); feed为None表示缓存命中"""
+        headers = dict(self.HEADERS)
+        cached = self._load_feed_cache(url) if self.use_feed_cache else None
+        if cached and not force:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+        
+        with self._host_semaphore(url):
+            response = self.session.get(url, headers=headers, timeout=self.feed_timeout)
+            if response.status_code == 304 and cached and not force:
+                self._count_cache('not_modified', cached['body_size'])
+                return None, None, cached
+            response.raise_for_status()
+        
+        if not self.use_feed_cache:
+            return feedparser.parse(response.content), None, None
+        
+        body_hash = hashlib.sha256(response.content).hexdigest()
+        if cached and not force and cached['body_hash'] == body_hash:
+            # 服务器不支持条件请求, 但内容没变, 同样跳过解析
+            self._count_cache('unchanged', 0)
+            return None, None, cached
+        
+        self._count_cache('misses', 0)
+        cache_entry = {
+            'url': url,
+            'etag': response.headers.get('ETag'),
+            'last_modified': response.headers.get('Last-Modified'),
+            'body_hash': body_hash,
+            'body_size': len(response.content)
+        }
+        return feedparser.parse(response.content), cache_entry, cached
+    
+    def _stored_items(self, urls: List[str], since: datetime) -> List[NewsItem]:
+        """缓存命中时按feed上次的url列表从数据库读回新闻, 保持feed中的顺序"""
+        rows = self.repository.get_items_by_url(
+            urls, columns='title, url, summary, published_date, source, alternate_sources')
+        by_url = {row['url']: row for row in rows}
+        news_items = []
+        for url in urls:
+            row = by_url.get(url)
+            if row is None:
+                continue
+            pub_date = datetime.fromisoformat(row['published_date'])
+            if pub_date >= since:
+                news_items.append(NewsItem(title=row['title'], url=url, summary=row['summary'] or '',
+                                           published_date=pub_date, source=row['source'],
+                                           alternate_sources=load_alternates(row['alternate_sources'])))
+        return news_items
+    
+    def _load_feed_cache(self, url: str):
+        """读取feed的缓存校验信息"""
+        return self.repository.get_feed_cache(url)
+    
+    def _defer_feed_cache(self, entry: dict):
+        """新的校验信息先挂起, 该feed的新闻全部入库后才写入 (见commit_feed_cache)
+        
+        先写入的话, 本次运行中途取消或崩溃后下次会命中缓存, 未入库的新闻就丢了.
+        """
+        with self._feed_cache_lock:
+            self._pending_feed_cache[entry['url']] = (entry, set(entry['item_urls']))
+        if not entry['item_urls']:
+            self.commit_feed_cache([])
+    
+    def commit_feed_cache(self, urls: Iterable[str]):
+        """urls中的新闻已入库 (或无需入库); 新闻全部完成的feed写入挂起的校验信息"""
+        urls = set(urls)
+        ready = []
+        with self._feed_cache_lock:
+            for feed_url, (entry, remaining) in list(self._pending_feed_cache.items()):
+                remaining -= urls
+                if not remaining:
+                    ready.append(entry)
+                    del self._pending_feed_cache[feed_url]
+        for entry in ready:
+            self.repository.save_feed_cache(entry)
+    
+    def reset_cache_stats(self):
+        """每次采集开始时清零缓存计数和正文抓取计数, 丢弃上次运行未完成的校验信息"""
+        with self._feed_cache_lock:
+            self._pending_feed_cache = {}
+        self.cache_stats = self._empty_cache_stats()
+        self.content_stats = {'fetched': 0, 'deferred': 0}
+    
+    def cache_report(self) -> str:
+        stats = self.cache_stats
+        return (f"Feed cache: {stats['hits']} hits ({stats['not_modified']} x 304, "
+                f"{stats['unchanged']} unchanged), {stats['misses']} misses, "
+                f"{stats['bytes_saved'] / 1024:.0f} KB not downloaded")
+    
+    @staticmethod
+    def _empty_cache_stats() -> dict:
+        return {'hits': 0, 'not_modified': 0, 'unchanged': 0, 'misses': 0, 'bytes_saved': 0}
+    
+    def _count_cache(self, outcome: str, bytes_saved: int):
+        with self._stats_lock:
+            self.cache_stats[outcome] += 1
+            if outcome != 'misses':
+                self.cache_stats['hits'] += 1
+            self.cache_stats['bytes_saved'] += bytes_saved
+    
+    def _host_semaphore(self, url: str) -> threading.Semaphore:
+        """获取该URL所属主机的信号量"""
+        host = urlparse(url).netloc
+        with self._host_lock:
+            if host not in self._host_semaphores:
+                self._host_semaphores[host] = threading.Semaphore(self.per_host_limit)
+            return self._host_semaphores[host]
+    
+    def needs_full_content(self, item: NewsItem) -> bool:
+        """RSS摘要太短、只是标题或被截断时, 才需要抓取正文"""
+        min_chars = COLLECTOR_CONFIG['min_summary_chars']
+        text = extract_text(item.summary or '', max_chars=min_chars * 2)
+        if len(text) < min_chars:
+            return True
+        if text.lower().strip(' .…') == item.title.lower().strip(' .…'):
+            return True
+        truncated = text.endswith(('…', '...', '[…]', '[...]')) or 'read more' in text[-40:].lower()
+        return truncated and len(text) < min_chars * 2
+    
+    def apply_content_policy(self, item: NewsItem) -> NewsItem:
+        """分级抽取: 摘要信息不足时立即抓取正文, 否则只挂上content_loader, 等真正用到时再抓取"""
+        if item.content:
+            return item
+        if self.needs_full_content(item):
+            item.content = self.extract_full_content(item.url)
+            outcome = 'fetched'
+        else:
+            item.content_loader = self.extract_full_content
+            outcome = 'deferred'
+        with self._stats_lock:
+            self.content_stats[outcome] += 1
+        return item
+    
+    def content_report(self) -> str:
+        stats = self.content_stats
+        return f"Content: {stats['fetched']} pages fetched, {stats['deferred']} fetches avoided (RSS summary sufficient)"
+    
+    def _create_session(self) -> requests.Session:
+        """共享的HTTP会话, 同一主机的连接保持keep-alive复用"""
+        session = requests.Session()
+        pool_size = max(self.max_workers, PIPELINE_CONFIG['extract_workers'])
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        session.headers.update(self.HEADERS)
+        return session
+    
+    def extract_many(self, urls: List[str], max_workers: int = None) -> List[str]:
+        """并发提取多篇文章的正文, 结果与urls顺序一致 (同一主机受per_host_limit限制)"""
+        max_workers = max_workers or PIPELINE_CONFIG['extract_workers']
+        if max_workers <= 1 or len(urls) <= 1:
+            return [self.extract_full_content(url) for url in urls]
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as executor:
+            return list(executor.map(self.extract_full_content, urls))
+    
+    def extract_full_content(self, url: str) -> str:
+        """提取文章完整内容
+        
+        content_extractor为'main'时下载页面(最多content_max_bytes)后在进程池中抽取正文;
+        为'text'时流式提取整页文字, 提取到足够的文字后即停止下载.
+        """
+        max_chars = COLLECTOR_CONFIG['content_max_chars']
+        try:
+            if COLLECTOR_CONFIG['content_extractor'] == 'text':
+                return self._stream_page_text(url, max_chars)
             
-            return content[:5000]  # 限制内容长度
+            html, encoding = self._download_page(url)
+            return self._parse_main_content(html, encoding, max_chars)
         except Exception as e:
             print(f"Error extracting content from {url}: {e}")
-            return ""
\ No newline at end of file
+            return ""
+    
+    def _open_page(self, url: str):
+        response = self.session.get(url, timeout=COLLECTOR_CONFIG['content_timeout'], stream=True)
+        content_type = response.headers.get('Content-Type', '')
+        # 没有声明charset时交给解析器根据<meta>判断
+        encoding = response.encoding if 'charset' in content_type.lower() else None
+        return response, encoding
+    
+    def _download_page(self, url: str):
+        """下载页面原始字节, 超过content_max_bytes的部分不再下载"""
+        max_bytes = COLLECTOR_CONFIG['content_max_bytes']
+        chunks, received = [], 0
+        with self._host_semaphore(url):
+            response, encoding = self._open_page(url)
+            with response:
+                for chunk in response.iter_content(chunk_size=64 * 1024):
+                    chunks.append(chunk)
+                    received += len(chunk)
+                    if received >= max_bytes:
+                        break
+        return b''.join(chunks)[:max_bytes], encoding
+    
+    def _stream_page_text(self, url: str, max_chars: int) -> str:
+        """边下载边提取整页文字, 够了就关闭连接"""
+        max_bytes = COLLECTOR_CONFIG['content_max_bytes']
+        parser = TextCollector(max_chars)
+        with self._host_semaphore(url):
+            response, encoding = self._open_page(url)
+            with response:
+                decoder = codecs.getincrementaldecoder(encoding or 'utf-8')(errors='replace')
+                received = 0
+                for chunk in response.iter_content(chunk_size=16 * 1024):
+                    received += len(chunk)
+                    parser.feed(decoder.decode(chunk))
+                    if parser.enough() or received >= max_bytes:
+                        break  # 关闭响应, 不再下载剩余部分
+        return parser.text()[:max_chars]  # 限制内容长度
+    
+    def _parse_main_content(self, html: bytes, encoding: str, max_chars: int) -> str:
+        """在进程池中抽取正文, 解析是CPU密集型任务, 放在线程里会被GIL串行化"""
+        pool = self._get_parse_pool()
+        if pool is None:
+            return extract_main_content(html, max_chars, encoding)
+        try:
+            return pool.submit(extract_main_content, html, max_chars, encoding).result()
+        except BrokenProcessPool as e:
+            # 只有进程池本身损坏 (例如子进程崩溃) 才重建并退回当前线程解析; 页面本身的解析错误照常抛出
+            print(f"Parse pool failed, parsing inline: {e}")
+            with self._parse_pool_lock:
+                if self._parse_pool is pool:
+                    self._parse_pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+            return extract_main_content(html, max_chars, encoding)
+    
+    def _get_parse_pool(self):
+        processes = COLLECTOR_CONFIG['parse_processes']
+        if processes <= 0:
+            return None
+        with self._parse_pool_lock:
+            if self._parse_pool is None:
+                # 进程池在抓取线程中按需创建, 此时进程里已有多个线程; fork会把其他线程持有的锁
+                # (日志、SQLite、HTTP连接池等) 原样复制到子进程中导致死锁, 改用forkserver/spawn启动子进程
+                methods = multiprocessing.get_all_start_methods()
+                context = multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
+                self._parse_pool = ProcessPoolExecutor(max_workers=processes, mp_context=context)
+            return self._parse_pool
+    
+    def close(self):
+        """释放HTTP连接池和解析进程池"""
+        with self._parse_pool_lock:
+            if self._parse_pool is not None:
+                self._parse_pool.shutdown(wait=False, cancel_futures=True)
+                self._parse_pool = None
+        self.session.close()
+    
+    def partition_processed(self, news_items: List[NewsItem], force: bool = False) -> Tuple[List[NewsItem], List[NewsItem]]:
+        """按URL和原文摘要哈希, 将新闻分为(待处理, 已处理)两组
+        
+        已处理的条目会从数据库补全content、ai_summary和alternate_sources, 下游生成日报时无需重新调用LLM.
+        force=True时所有条目都视为待处理.
+        """
+        if force or not news_items:
+            return list(news_items), []
+        
+        stored = {}
+        rows = self.repository.get_items_by_url(list({item.url for item in news_items}),
+                                                columns='url, summary, content, ai_summary, alternate_sources')
+        for url, summary, content, ai_summary, alternates in rows:
+            stored[url] = (self.summary_hash(summary), content, ai_summary, alternates)
+        
+        pending, done = [], []
+        for item in news_items:
+            row = stored.get(item.url)
+            # 摘要变化、没有AI总结或上次总结失败的条目需要重新处理
+            if (row is None or row[0] != self.summary_hash(item.summary)
+                    or not row[2] or row[2].startswith('总结生成失败')):
+                pending.append(item)
+            else:
+                item.content = row[1] or ""
+                item.ai_summary = row[2]
+                for alternate in load_alternates(row[3]):
+                    if alternate not in item.alternate_sources:
+                        item.alternate_sources.append(alternate)
+                done.append(item)
+        return pending, done
+    
+    @staticmethod
+    def summary_hash(summary: str) -> str:
+        return hashlib.sha1((summary or '').encode('utf-8')).hexdigest()
+
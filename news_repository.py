@@ -0,0 +1,561 @@
+# news_repository.py - 共享的SQLite持久层
+#
+# 每个数据库文件在进程内只有一个NewsRepository, 每个线程持有一个长连接.
+# 数据库使用WAL模式: 写入不阻塞读取, Streamlit页面读数据时采集流程仍可写入.
+# 批量写入在一个事务里用executemany完成.
+import calendar
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional
+
+from config import DATABASE_CONFIG
+from migrations import MIGRATIONS, rebuild_daily_source_counts
+from news_archive import NewsArchive
+
+PRAGMAS = (
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",   # WAL下NORMAL已足够安全, 提交时不再每次fsync
+    "PRAGMA busy_timeout = 5000",    # 与其他写入者冲突时等待, 而不是立即报 database is locked
+    "PRAGMA temp_store = MEMORY",
+    "PRAGMA cache_size = -16000",    # 约16MB页缓存
+    "PRAGMA mmap_size = 134217728",  # 128MB内存映射读取
+    "PRAGMA foreign_keys = ON",
+)
+
+# 新闻列表只取展示用的列, 正文和总结在展开时单独查询
+LIST_COLUMNS = 'id, title, url, source, published_date, published_ts'
+# bm25列权重: title, summary, content, ai_summary
+SEARCH_WEIGHTS = (10.0, 4.0, 1.0, 3.0)
+
+# 合并alternate_sources两个JSON数组: 已保存的在前, 新的去重后按顺序追加 ({new}为新数组的SQL表达式)
+MERGE_ALTERNATES = '''(
+                        SELECT json_group_array(json(value)) FROM (
+                            SELECT value FROM json_each(news_items.alternate_sources)
+                            UNION ALL
+                            SELECT value FROM json_each({new})
+                            WHERE value NOT IN (SELECT value FROM json_each(news_items.alternate_sources))
+                        )
+                    )'''
+
+# trigram分词器只能为至少3个字符的词使用索引, 更短的词 (如"模型"、"AI") 用LIKE匹配
+MIN_FTS_TERM = 3
+SEARCH_COLUMNS = ('title', 'summary', 'content', 'ai_summary')
+
+
+def fts_query(text: str) -> str:
+    """把用户输入转成安全的FTS5查询: 每个词加引号做子串匹配, 词之间为AND (只含至少3个字符的词)"""
+    terms = re.findall(r'\w+', text)
+    return ' '.join(f'"{term}"' for term in terms if len(term) >= MIN_FTS_TERM)
+
+
+def short_terms(text: str) -> List[str]:
+    """不足3个字符、无法用trigram索引匹配的词"""
+    return [term for term in re.findall(r'\w+', text) if len(term) < MIN_FTS_TERM]
+
+
+def to_epoch(value: datetime) -> int:
+    """datetime转epoch秒; 不带时区的时间按UTC解释, 与SQLite的strftime('%s', ...)一致"""
+    if value.tzinfo is not None:
+        return int(value.timestamp())
+    return calendar.timegm(value.timetuple())
+
+
+def load_alternates(value: str) -> list:
+    """alternate_sources列的JSON -> [(source, url), ...]"""
+    return [tuple(alternate) for alternate in json.loads(value or '[]')]
+
+
+class NewsRepository:
+    _instances: Dict[str, 'NewsRepository'] = {}
+    _instances_lock = threading.Lock()
+
+    def __init__(self, db_path: str):
+        self.db_path = db_path
+        self._local = threading.local()
+        self._write_lock = threading.RLock()
+        self.archive = NewsArchive(os.path.join(os.path.dirname(os.path.abspath(db_path)),
+                                                DATABASE_CONFIG['archive_dir']))
+
+    @classmethod
+    def for_path(cls, db_path: str) -> 'NewsRepository':
+        """同一数据库文件在进程内共用一个实例"""
+        key = os.path.abspath(db_path)
+        with cls._instances_lock:
+            if key not in cls._instances:
+                cls._instances[key] = cls(db_path)
+            return cls._instances[key]
+
+    def connection(self) -> sqlite3.Connection:
+        """当前线程的长连接 (autocommit模式, 事务由transaction()显式管理)"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, isolation_level=None, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            for pragma in PRAGMAS:
+                conn.execute(pragma)
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def transaction(self):
+        """写事务: BEGIN IMMEDIATE 提前拿到写锁, 异常时回滚; 支持嵌套 (内层并入外层事务)"""
+        conn = self.connection()
+        with self._write_lock:
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+
+    def execute(self, sql: str, params=()) -> sqlite3.Cursor:
+        return self.connection().execute(sql, params)
+
+    def data_version(self) -> int:
+        """news_items的写入计数, 数据没有变化时保持不变 (可用作查询缓存的键)"""
+        return self.execute('SELECT version FROM data_version WHERE id = 1').fetchone()[0]
+
+    def schema_version(self) -> int:
+        return self.execute('PRAGMA user_version').fetchone()[0]
+
+    def migrate(self, migrations) -> List[int]:
+        """执行尚未应用的迁移, 返回本次应用的版本号"""
+        applied = []
+        with self._write_lock:
+            for version, description, apply in migrations:
+                if version <= self.schema_version():
+                    continue
+                with self.transaction() as conn:
+                    # 另一个进程可能在我们拿到写锁前已完成这次迁移, 持锁后重新读取版本号
+                    if version <= conn.execute('PRAGMA user_version').fetchone()[0]:
+                        continue
+                    apply(conn)
+                    conn.execute(f'PRAGMA user_version = {int(version)}')
+                print(f"Database migrated to v{version}: {description}")
+                applied.append(version)
+        return applied
+
+    def close(self):
+        """关闭当前线程的连接"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self._local.conn = None
+
+    # ---- news_items ----
+
+    def upsert_news_items(self, items: Iterable) -> int:
+        """批量写入新闻, 按url更新已有记录 (保留原来的id和created_at)
+
+        alternate_sources与已保存的合并: 原有的在前, 新出现的按顺序追加.
+        """
+        now = int(time.time())
+        rows = [(
+            item.title,
+            item.url,
+            item.summary,
+            item.published_date.isoformat(),
+            to_epoch(item.published_date),
+            item.source,
+            item.content,
+            item.ai_summary,
+            json.dumps(getattr(item, 'alternate_sources', None) or [], ensure_ascii=False),
+            now
+        ) for item in items]
+        if not rows:
+            return 0
+        with self.transaction() as conn:
+            conn.executemany('''
+                INSERT INTO news_items
+                (title, url, summary, published_date, published_ts, source, content, ai_summary,
+                 alternate_sources, created_ts)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT(url) DO UPDATE SET
+                    title = excluded.title,
+                    summary = excluded.summary,
+                    published_date = excluded.published_date,
+                    published_ts = excluded.published_ts,
+                    source = excluded.source,
+                    content = excluded.content,
+                    ai_summary = excluded.ai_summary,
+                    alternate_sources = {merge}
+            '''.format(merge=MERGE_ALTERNATES.format(new='excluded.alternate_sources')), rows)
+        return len(rows)
+
+    def merge_alternate_sources(self, items: Iterable) -> int:
+        """把条目在本次运行中新合并进来的转载来源并入已保存的记录 (已处理、不再重新写入的条目)"""
+        rows = [(json.dumps(item.alternate_sources, ensure_ascii=False), item.url)
+                for item in items if getattr(item, 'alternate_sources', None)]
+        if not rows:
+            return 0
+        with self.transaction() as conn:
+            conn.executemany(
+                'UPDATE news_items SET alternate_sources = {merge} WHERE url = ?'.format(
+                    merge=MERGE_ALTERNATES.format(new='?')),
+                rows)
+        return len(rows)
+
+    def save_news_item(self, item):
+        self.upsert_news_items([item])
+
+    def update_ai_summary(self, item_id: int, summary: str, content: str = None):
+        """保存AI总结; 传入content时一并保存按需抓取的正文"""
+        with self.transaction() as conn:
+            if content is None:
+                conn.execute('UPDATE news_items SET ai_summary = ? WHERE id = ?', (summary, item_id))
+            else:
+                conn.execute('UPDATE news_items SET ai_summary = ?, content = ? WHERE id = ?',
+                             (summary, content, item_id))
+
+    def list_news(self, days: int = None, source: str = None, limit: int = 20, after: tuple = None,
+                  columns: str = LIST_COLUMNS) -> List[sqlite3.Row]:
+        """按发布时间倒序分页列出新闻 (键集分页)
+
+        after为上一页最后一条的 (published_ts, id), 翻页耗时与页码无关.
+        时间范围跨过保留期时, 会继续读取相关的月度归档库并合并结果 (归档的行为dict).
+        """
+        clauses, params = self._news_filters(days, source)
+        if after is not None:
+            clauses.append('(published_ts, id) < (?, ?)')
+            params.extend(after)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        rows = self.execute(f'''
+            SELECT {columns} FROM news_items {where}
+            ORDER BY published_ts DESC, id DESC
+            LIMIT ?
+        ''', (*params, limit)).fetchall()
+
+        for month, max_ts in self._archive_months(days, after[0] if after else None):
+            if len(rows) >= limit and max_ts < rows[-1]['published_ts']:
+                break  # 更早的归档不可能进入这一页
+            rows.extend(self.archive.list_news(month, columns, clauses, params, limit))
+            rows.sort(key=lambda row: (row['published_ts'], row['id']), reverse=True)
+            rows = rows[:limit]
+        return rows
+
+    def count_news(self, days: int = None, source: str = None) -> int:
+        clauses, params = self._news_filters(days, source)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        count = self.execute(f'SELECT COUNT(*) FROM news_items {where}', params).fetchone()[0]
+        for month, _ in self._archive_months(days):
+            count += self.archive.count_news(month, clauses, params)
+        return count
+
+    def list_sources(self, days: int = None) -> List[str]:
+        clauses, params = self._news_filters(days)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        sources = {row[0] for row in self.execute(f'SELECT DISTINCT source FROM news_items {where}', params)}
+        for month, _ in self._archive_months(days):
+            sources.update(self.archive.list_sources(month, clauses, params))
+        return sorted(sources, key=lambda source: source or '')
+
+    def archived_months(self, days: int = None) -> List[str]:
+        """与时间范围有交集的归档月份; 全文检索只覆盖主库, 这些月份的新闻搜索不到"""
+        return [month for month, _ in self._archive_months(days)]
+
+    def get_news_details(self, item_id: int) -> Optional[sqlite3.Row]:
+        """列表中不加载的大字段, 在展开某条新闻时再查询 (已归档的从归档库解压)"""
+        row = self.execute('SELECT summary, content, ai_summary FROM news_items WHERE id = ?', (item_id,)).fetchone()
+        if row is None:
+            archived = self.execute('SELECT month FROM archive_index WHERE id = ?', (item_id,)).fetchone()
+            if archived:
+                return self.archive.get_news_details(archived['month'], item_id)
+        return row
+
+    @staticmethod
+    def _news_filters(days: int = None, source: str = None, alias: str = ''):
+        clauses, params = [], []
+        if days:
+            clauses.append(f"{alias}published_ts >= CAST(strftime('%s', 'now', ?, 'start of day') AS INTEGER)")
+            params.append(f'-{int(days)} days')
+        if source:
+            clauses.append(f'{alias}source = ?')
+            params.append(source)
+        return clauses, params
+
+    # ---- 保留期和归档 ----
+
+    def _archive_months(self, days: int = None, before_ts: int = None) -> List[tuple]:
+        """与查询时间范围有交集的归档月份, 按时间从新到旧"""
+        clauses, params = [], []
+        if days:
+            clauses.append("max_ts >= CAST(strftime('%s', 'now', ?, 'start of day') AS INTEGER)")
+            params.append(f'-{int(days)} days')
+        if before_ts is not None:
+            clauses.append('min_ts <= ?')
+            params.append(before_ts)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ''
+        return [(row['month'], row['max_ts']) for row in
+                self.execute(f'SELECT month, max_ts FROM archives {where} ORDER BY max_ts DESC', params)]
+
+    def archive_older_than(self, days: int, batch_size: int = None) -> dict:
+        """把发布时间早于days天的新闻移入月度归档库, 返回归档的行数和涉及的月份
+
+        先写归档库再在主库的一个事务里删除并登记, 中途失败时下次重跑即可 (归档写入按url幂等).
+        已归档的新闻仍计入仪表盘汇总表.
+        """
+        batch_size = batch_size or DATABASE_CONFIG['archive_batch_size']
+        cutoff = f'-{int(days)} days'
+        archived, months = 0, set()
+        while True:
+            rows = self.execute(f'''
+                SELECT *, strftime('%Y-%m', published_ts, 'unixepoch') AS month FROM news_items
+                WHERE published_ts < CAST(strftime('%s', 'now', ?, 'start of day') AS INTEGER)
+                ORDER BY id LIMIT ?
+            ''', (cutoff, batch_size)).fetchall()
+            if not rows:
+                break
+            by_month = {}
+            for row in rows:
+                by_month.setdefault(row['month'], []).append(row)
+            # 归档后又被重新采集的url: 旧归档行在同一个月时被覆盖, 在其他月份时删除
+            replaced = self._previously_archived(rows)
+            new_months = {row['url']: row['month'] for row in rows}
+            moved = {}
+            for old in replaced:
+                if old['month'] != new_months[old['url']]:
+                    moved.setdefault(old['month'], []).append(old['url'])
+            written = {month: self.archive.delete_urls(month, urls) for month, urls in moved.items()}
+            written.update({month: self.archive.write(month, month_rows) for month, month_rows in by_month.items()})
+
+            with self.transaction() as conn:
+                ids = [(row['id'],) for row in rows]
+                conn.executemany('DELETE FROM news_items WHERE id = ?', ids)
+                # 同一url只保留新id的索引, 旧id已不在任何归档库中
+                conn.executemany('DELETE FROM archive_index WHERE url = ? AND id != ?',
+                                 [(row['url'], row['id']) for row in rows])
+                conn.executemany('INSERT OR REPLACE INTO archive_index (id, url, month) VALUES (?, ?, ?)',
+                                 [(row['id'], row['url'], row['month']) for row in rows])
+                # 删除触发器已从汇总表减掉这些行, 这里加回去并记到archived_counts; 被替换的旧归档行不再计数
+                counts = {}
+                for row, delta in [(row, 1) for row in rows] + [(old, -1) for old in replaced]:
+                    key = (time.strftime('%Y-%m-%d', time.gmtime(row['published_ts'])), row['source'] or '')
+                    counts[key] = counts.get(key, 0) + delta
+                for table in ('daily_source_counts', 'archived_counts'):
+                    conn.executemany(f'''
+                        INSERT INTO {table} (day, source, count) VALUES (?, ?, ?)
+                        ON CONFLICT (day, source) DO UPDATE SET count = count + excluded.count
+                    ''', [(day, source, count) for (day, source), count in counts.items() if count])
+                for month in set(written) - set(by_month):
+                    total_rows, total_bytes = written[month]
+                    conn.execute('UPDATE archives SET rows = ?, bytes = ?, updated_ts = ? WHERE month = ?',
+                                 (total_rows, total_bytes, int(time.time()), month))
+                for month, month_rows in by_month.items():
+                    total_rows, total_bytes = written[month]
+                    timestamps = [row['published_ts'] for row in month_rows]
+                    conn.execute('''
+                        INSERT INTO archives (month, rows, bytes, min_ts, max_ts, updated_ts)
+                        VALUES (?, ?, ?, ?, ?, ?)
+                        ON CONFLICT (month) DO UPDATE SET
+                            rows = excluded.rows,
+                            bytes = excluded.bytes,
+                            min_ts = min(min_ts, excluded.min_ts),
+                            max_ts = max(max_ts, excluded.max_ts),
+                            updated_ts = excluded.updated_ts
+                    ''', (month, total_rows, total_bytes, min(timestamps), max(timestamps), int(time.time())))
+            archived += len(rows)
+            months.update(by_month)
+        return {'archived': archived, 'months': sorted(months)}
+
+    def _previously_archived(self, rows: List[sqlite3.Row]) -> List[dict]:
+        """这批新闻中以前归档过的url的旧归档行 (id不同), 附带所在月份"""
+        new_ids = {row['url']: row['id'] for row in rows}
+        months = {}
+        for entry in self.execute('''
+            SELECT url, month FROM archive_index WHERE url IN (SELECT value FROM json_each(?))
+        ''', (json.dumps(list(new_ids)),)):
+            months.setdefault(entry['month'], []).append(entry['url'])
+        replaced = []
+        for month, urls in months.items():
+            for old in self.archive.find_urls(month, urls):
+                # 上次归档中途失败重跑时, 同月的旧行可能已被新行覆盖
+                if old['id'] != new_ids[old['url']]:
+                    replaced.append({**old, 'month': month})
+        return replaced
+
+    def vacuum(self, pages: int = None):
+        """释放已删除行占用的空间
+
+        第一次调用时把数据库切换为增量VACUUM模式 (需要一次完整VACUUM), 之后每次最多释放pages页.
+        """
+        pages = DATABASE_CONFIG['vacuum_pages'] if pages is None else pages
+        conn = self.connection()
+        with self._write_lock:
+            if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:  # 2 = INCREMENTAL
+                conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+                conn.execute('VACUUM')
+            else:
+                conn.execute(f'PRAGMA incremental_vacuum({int(pages)})' if pages else 'PRAGMA incremental_vacuum')
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')  # 把释放后的页写回主库文件, 清空WAL
+
+    def file_size(self) -> int:
+        """主库文件加WAL文件的字节数"""
+        wal = f"{self.db_path}-wal"
+        return os.path.getsize(self.db_path) + (os.path.getsize(wal) if os.path.exists(wal) else 0)
+
+    def apply_retention(self, days: int = None) -> dict:
+        """归档超过保留期的新闻, 整理全文索引并释放空间"""
+        days = days or DATABASE_CONFIG['backup_days']
+        size_before = self.file_size()
+        report = self.archive_older_than(days)
+        if report['archived']:
+            with self.transaction() as conn:
+                conn.execute("INSERT INTO news_items_fts (news_items_fts) VALUES ('optimize')")
+        freelist_before = self.execute('PRAGMA freelist_count').fetchone()[0]
+        self.vacuum()
+        report.update(
+            freed_pages=freelist_before - self.execute('PRAGMA freelist_count').fetchone()[0],
+            size_before=size_before,
+            size_after=self.file_size()
+        )
+        return report
+
+    # ---- daily_source_counts (由触发器维护的汇总表) ----
+
+    def dashboard_stats(self, days: int) -> dict:
+        """最近days天的文章总数、今天的文章数和来源数, 只读汇总表"""
+        row = self.execute('''
+            SELECT coalesce(SUM(count), 0) AS total,
+                   coalesce(SUM(CASE WHEN day = date('now') THEN count END), 0) AS today,
+                   COUNT(DISTINCT source) AS sources
+            FROM daily_source_counts WHERE day >= date('now', ?)
+        ''', (f'-{int(days)} days',)).fetchone()
+        return dict(row)
+
+    def daily_counts(self, days: int) -> List[sqlite3.Row]:
+        return self.execute('''
+            SELECT day, SUM(count) AS count FROM daily_source_counts
+            WHERE day >= date('now', ?) GROUP BY day ORDER BY day
+        ''', (f'-{int(days)} days',)).fetchall()
+
+    def top_sources(self, days: int, limit: int = 10) -> List[sqlite3.Row]:
+        return self.execute('''
+            SELECT source, SUM(count) AS count FROM daily_source_counts
+            WHERE day >= date('now', ?) GROUP BY source ORDER BY count DESC LIMIT ?
+        ''', (f'-{int(days)} days', limit)).fetchall()
+
+    def rebuild_rollups(self):
+        """从news_items重新计算汇总表"""
+        with self.transaction() as conn:
+            rebuild_daily_source_counts(conn)
+
+    def search_news(self, text: str, days: int = None, source: str = None, limit: int = 20,
+                    offset: int = 0, mark: tuple = ('**', '**')) -> List[sqlite3.Row]:
+        """全文检索标题/摘要/正文/AI总结, 按bm25相关度排序并分页
+
+        返回列表列以及title_highlight和snippet, 命中的词用mark包围.
+        所有词都不足3个字符时无法使用全文索引, 改用LIKE匹配并按发布时间排序.
+        只检索主库: 归档库没有全文索引且正文是压缩的, 超过保留期的新闻搜索不到 (见archived_months).
+        """
+        where, params, use_fts = self._search_filters(text, days, source)
+        if where is None:
+            return []
+        columns = ', '.join(f'n.{column.strip()}' for column in LIST_COLUMNS.split(','))
+        if use_fts:
+            return self.execute(f'''
+                SELECT {columns},
+                       highlight(news_items_fts, 0, ?, ?) AS title_highlight,
+                       snippet(news_items_fts, -1, ?, ?, '…', 24) AS snippet,
+                       bm25(news_items_fts, {', '.join(map(str, SEARCH_WEIGHTS))}) AS rank
+                FROM news_items_fts JOIN news_items n ON n.id = news_items_fts.rowid
+                WHERE {where}
+                ORDER BY rank
+                LIMIT ? OFFSET ?
+            ''', (*mark, *mark, *params, limit, offset)).fetchall()
+        # 没有可用索引的词: 标题里的命中用replace标出, 摘要取AI总结的开头
+        title_highlight, highlight_params = 'n.title', []
+        for term in short_terms(text):
+            title_highlight = f'replace({title_highlight}, ?, ? || ? || ?)'
+            highlight_params += [term, mark[0], term, mark[1]]
+        return self.execute(f'''
+            SELECT {columns},
+                   {title_highlight} AS title_highlight,
+                   substr(coalesce(nullif(n.ai_summary, ''), n.summary, ''), 1, 160) AS snippet,
+                   0 AS rank
+            FROM news_items n
+            WHERE {where}
+            ORDER BY n.published_ts DESC, n.id DESC
+            LIMIT ? OFFSET ?
+        ''', (*highlight_params, *params, limit, offset)).fetchall()
+
+    def count_search(self, text: str, days: int = None, source: str = None) -> int:
+        where, params, use_fts = self._search_filters(text, days, source)
+        if where is None:
+            return 0
+        source_sql = ('news_items_fts JOIN news_items n ON n.id = news_items_fts.rowid' if use_fts
+                      else 'news_items n')
+        return self.execute(f'SELECT COUNT(*) FROM {source_sql} WHERE {where}', params).fetchone()[0]
+
+    @classmethod
+    def _search_filters(cls, text: str, days: int = None, source: str = None):
+        """返回 (WHERE条件, 参数, 是否使用全文索引); 没有可搜索的词时条件为None"""
+        query = fts_query(text)
+        terms = short_terms(text)
+        if not query and not terms:
+            return None, (), False
+        clauses, params = ([], []) if not query else (['news_items_fts MATCH ?'], [query])
+        for term in terms:
+            pattern = '%' + term.replace('_', '\\_') + '%'  # \w+ 的词中只可能出现 _ 这个通配符
+            clauses.append('(' + ' OR '.join(f"n.{column} LIKE ? ESCAPE '\\'" for column in SEARCH_COLUMNS) + ')')
+            params += [pattern] * len(SEARCH_COLUMNS)
+        filters, filter_params = cls._news_filters(days, source, alias='n.')
+        return ' AND '.join(clauses + filters), (*params, *filter_params), bool(query)
+
+    def get_items_by_url(self, urls: List[str], columns: str = 'url, summary, content, ai_summary') -> List[sqlite3.Row]:
+        """按url批量查询, 分批避免超过SQLite的参数个数上限"""
+        rows = []
+        conn = self.connection()
+        for i in range(0, len(urls), 500):
+            batch = urls[i:i + 500]
+            placeholders = ','.join('?' * len(batch))
+            rows.extend(conn.execute(f'SELECT {columns} FROM news_items WHERE url IN ({placeholders})', batch))
+        return rows
+
+    # ---- feed_cache ----
+
+    def get_feed_cache(self, url: str) -> Optional[dict]:
+        row = self.execute(
+            'SELECT etag, last_modified, body_hash, body_size, item_urls FROM feed_cache WHERE url = ?', (url,)
+        ).fetchone()
+        return dict(row, item_urls=json.loads(row['item_urls'])) if row else None
+
+    def save_feed_cache(self, entry: dict):
+        with self.transaction() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO feed_cache
+                (url, etag, last_modified, body_hash, body_size, item_urls, updated_at)
+                VALUES (:url, :etag, :last_modified, :body_hash, :body_size, :item_urls, CURRENT_TIMESTAMP)
+            ''', {**entry, 'item_urls': json.dumps(entry['item_urls'])})
+
+def main():
+    import argparse
+    parser = argparse.ArgumentParser(description="数据库维护命令")
+    parser.add_argument('command', choices=['migrate', 'rebuild-rollups', 'retention'])
+    parser.add_argument('--db', default="ai_news.db", help="数据库文件路径")
+    parser.add_argument('--days', type=int, default=None, help="retention: 主库保留的天数 (默认DATABASE_CONFIG['backup_days'])")
+    args = parser.parse_args()
+
+    repository = NewsRepository.for_path(args.db)
+    repository.migrate(MIGRATIONS)
+    if args.command == 'rebuild-rollups':
+        start = time.perf_counter()
+        repository.rebuild_rollups()
+        print(f"Rebuilt daily_source_counts in {time.perf_counter() - start:.1f}s")
+    elif args.command == 'retention':
+        report = repository.apply_retention(args.days)
+        print(f"Archived {report['archived']} items into {', '.join(report['months']) or 'no archives'}; "
+              f"database {report['size_before'] / 1024 / 1024:.1f} MB -> {report['size_after'] / 1024 / 1024:.1f} MB")
+
+
+if __name__ == "__main__":
+    main()
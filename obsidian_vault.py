@@ -0,0 +1,138 @@
+# obsidian_vault.py - 增量、幂等的Obsidian笔记写入
+#
+# 清单文件(manifest)记录每篇笔记: key(新闻url等) -> 相对路径 + 内容指纹.
+#   - 指纹没变且文件还在的笔记直接跳过, 不渲染也不写盘, Obsidian不会重新索引
+#   - 写入先写同目录下的临时文件再rename, 中途失败不会留下半截笔记
+#   - 文件名冲突时按key的哈希追加后缀; 已分配的路径记在清单里, 之后每次运行都不变
+#   - 多个笔记用线程池并行写入 (网络盘/同步盘上写文件的延迟主要是IO等待)
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Callable, Dict, List
+
+MANIFEST_VERSION = 1
+
+
+def fingerprint(*parts) -> str:
+    """由笔记的输入字段计算指纹, 输入不变则笔记内容不变"""
+    payload = json.dumps(parts, ensure_ascii=False, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+
+def atomic_write(path: str, content: str):
+    """先写临时文件再替换, 读者只会看到旧文件或完整的新文件"""
+    directory = os.path.dirname(path)
+    fd, tmp_path = tempfile.mkstemp(prefix='.tmp-', suffix='.md', dir=directory)
+    try:
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+@dataclass
+class Note:
+    key: str                    # 稳定的唯一标识, 如新闻url
+    folder: str                 # 相对vault根目录的文件夹
+    stem: str                   # 期望的文件名(不含扩展名)
+    fingerprint: str
+    render: Callable[[], str]   # 只有需要写入时才调用
+    adopt: bool = False         # 期望路径上已有的文件视为旧版本写的这篇笔记, 直接接管
+
+
+class VaultWriter:
+    def __init__(self, vault_path: str, manifest_name: str = '.ai_news_manifest.json', max_workers: int = 8):
+        self.vault_path = vault_path
+        self.manifest_path = os.path.join(vault_path, manifest_name)
+        self.max_workers = max_workers
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self.manifest = self._load_manifest()
+
+    def _load_manifest(self) -> Dict[str, dict]:
+        try:
+            with open(self.manifest_path, encoding='utf-8') as f:
+                data = json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable vault manifest {self.manifest_path}: {e}")
+            return {}
+        return data.get('notes', {}) if data.get('version') == MANIFEST_VERSION else {}
+
+    def _save_manifest(self):
+        os.makedirs(self.vault_path, exist_ok=True)
+        # 多个批次可能并发写入 (笔记和日报), 快照与落盘一起串行, 后取的快照一定后写
+        with self._save_lock:
+            with self._lock:
+                payload = json.dumps({'version': MANIFEST_VERSION, 'notes': self.manifest},
+                                     ensure_ascii=False, indent=1)
+            atomic_write(self.manifest_path, payload)
+
+    def write_notes(self, notes: List[Note]) -> dict:
+        """写入一批笔记, 返回 written/skipped/failed 计数和耗时"""
+        start = time.perf_counter()
+        report = {'written': 0, 'skipped': 0, 'failed': 0}
+        pending = []
+        # 路径分配按key排序依次进行, 冲突的处理结果与输入顺序无关
+        with self._lock:
+            for note in sorted(notes, key=lambda note: note.key):
+                entry = self.manifest.get(note.key)
+                if entry and entry['hash'] == note.fingerprint and os.path.exists(self._abs(entry['path'])):
+                    report['skipped'] += 1
+                    continue
+                path = entry['path'] if entry else self._assign_path(note)
+                self.manifest[note.key] = {'path': path, 'hash': None}  # 写成功后再记录指纹
+                pending.append((note, path))
+
+        if pending:
+            with ThreadPoolExecutor(max_workers=min(self.max_workers, len(pending))) as executor:
+                for ok in executor.map(self._write_one, pending):
+                    report['written' if ok else 'failed'] += 1
+            self._save_manifest()
+        report['seconds'] = time.perf_counter() - start
+        return report
+
+    def _write_one(self, task) -> bool:
+        note, path = task
+        try:
+            abs_path = self._abs(path)
+            os.makedirs(os.path.dirname(abs_path), exist_ok=True)
+            atomic_write(abs_path, note.render())
+        except Exception as e:
+            print(f"❌ Failed to write note {path}: {e}")
+            return False
+        with self._lock:
+            self.manifest[note.key]['hash'] = note.fingerprint
+        return True
+
+    def _assign_path(self, note: Note) -> str:
+        """新笔记的相对路径; 与其他笔记冲突时追加key哈希后缀"""
+        taken = {entry['path'] for key, entry in self.manifest.items() if key != note.key}
+        path = os.path.join(note.folder, f"{note.stem}.md")
+        if path in taken or (not note.adopt and self._foreign_file(path, note.key)):
+            suffix = hashlib.sha1(note.key.encode('utf-8')).hexdigest()[:8]
+            path = os.path.join(note.folder, f"{note.stem}_{suffix}.md")
+        return path
+
+    def _foreign_file(self, path: str, key: str) -> bool:
+        """磁盘上已有但不在清单中的文件: 旧版本写的同一篇笔记(内容中含key)可以接管, 否则视为他人的文件"""
+        abs_path = self._abs(path)
+        if not os.path.exists(abs_path):
+            return False
+        try:
+            with open(abs_path, encoding='utf-8', errors='replace') as f:
+                return key not in f.read(4096)
+        except OSError:
+            return True
+
+    def _abs(self, path: str) -> str:
+        return os.path.join(self.vault_path, path)
@@ -1,23 +1,23 @@
 # enhanced_output_dispatcher.py
-import smtplib
 import os
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeout
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
-from pathlib import Path
 import markdown
-from typing import List
+from typing import Iterable, List
+from config import EMAIL_CONFIG, OBSIDIAN_CONFIG, OUTPUT_CONFIG
+from digest_renderer import DigestRenderer, RenderedDigest, digest_fingerprint
+from email_outbox import EmailOutbox
 from news_collector import NewsItem
+from obsidian_vault import Note, VaultWriter, fingerprint
+from output_sinks import Delivery, EmailSink, FeishuSink, ObsidianDigestSink, ObsidianNotesSink, OutputSink
 
 class EnhancedOutputDispatcher:
-    def __init__(self):
-        self.email_config = {
-            'smtp_server': os.getenv('EMAIL_SMTP_SERVER'),
-            'smtp_port': int(os.getenv('EMAIL_SMTP_PORT', 587)),
-            'email': os.getenv('EMAIL_ADDRESS'),
-            'password': os.getenv('EMAIL_PASSWORD'),
-            'to_email': os.getenv('EMAIL_TO')
-        }
+    def __init__(self, db_path: str = "ai_news.db"):
+        self.email_config = dict(EMAIL_CONFIG)
+        self.outbox = EmailOutbox(db_path, self.email_config)
         
         self.obsidian_config = {
             'vault_path': os.getenv('OBSIDIAN_VAULT_PATH'),
@@ -25,17 +25,72 @@ class EnhancedOutputDispatcher:
             'individual_notes_folder': os.getenv('OBSIDIAN_INDIVIDUAL_FOLDER', 'AI_News/Individual'),
             'daily_digest_folder': os.getenv('OBSIDIAN_DIGEST_FOLDER', 'AI_News/Daily_Digests')
         }
+        self._vault_writer = None
+        self.renderer = DigestRenderer()
+        
+        available = [ObsidianNotesSink(self), ObsidianDigestSink(self), EmailSink(self), FeishuSink()]
+        self.sinks: List[OutputSink] = [sink for sink in available if sink.name in OUTPUT_CONFIG['sinks']]
+
+    def register_sink(self, sink: OutputSink):
+        """Add (or replace, by name) an output that dispatch() fans the digest out to"""
+        self.sinks = [existing for existing in self.sinks if existing.name != sink.name] + [sink]
+
+    def dispatch(self, news_items: List[NewsItem], date: str, skip: Iterable[str] = ()) -> dict:
+        """Render the digest once and deliver it to every configured sink concurrently
 
-    def send_email(self, subject: str, content: str, is_html: bool = False):
-        """Send email with enhanced formatting"""
+        Each sink has its own timeout; a failing or slow sink does not affect the others.
+        Returns {sink name: {'status', 'seconds', 'result' or 'error'}}.
+        """
+        digest = self.render_digest(news_items, date)
+        sinks = [sink for sink in self.sinks if sink.name not in skip and sink.enabled()]
+        if not sinks:
+            return {}
+        
+        start = time.monotonic()
+        executor = ThreadPoolExecutor(max_workers=len(sinks), thread_name_prefix='sink')
+        futures = [(sink, executor.submit(self._deliver, sink,
+                                          Delivery(date, news_items, digest, start + sink.timeout)))
+                   for sink in sinks]
+        report = {}
+        for sink, future in futures:
+            try:
+                report[sink.name] = future.result(timeout=max(0.0, start + sink.timeout - time.monotonic()))
+            except FutureTimeout:
+                report[sink.name] = {'status': 'timeout', 'seconds': sink.timeout,
+                                     'error': f"No result within {sink.timeout}s"}
+        # Don't wait for sinks that timed out; their threads finish in the background
+        executor.shutdown(wait=False)
+        
+        for name, outcome in report.items():
+            print(f"{'✅' if outcome['status'] == 'ok' else '❌'} {name}: {outcome['status']} "
+                  f"in {outcome['seconds']:.2f}s {outcome.get('error', '')}".rstrip())
+        return report
+
+    @staticmethod
+    def _deliver(sink: OutputSink, delivery: Delivery) -> dict:
+        start = time.perf_counter()
+        try:
+            result = sink.deliver(delivery)
+        except Exception as e:
+            return {'status': 'error', 'seconds': time.perf_counter() - start, 'error': f"{type(e).__name__}: {e}"}
+        return {'status': 'ok', 'seconds': time.perf_counter() - start, 'result': result}
+
+    def send_email(self, subject: str, content: str, is_html: bool = False, html: str = None):
+        """Queue an email with enhanced formatting; pass a pre-rendered html part to skip markdown conversion
+
+        The message is stored in the SQLite outbox and sent by a background worker, so this never blocks on SMTP.
+        """
         try:
             msg = MIMEMultipart('alternative')
             msg['From'] = self.email_config['email']
             msg['To'] = self.email_config['to_email']
             msg['Subject'] = subject
             
+            if html is not None:
+                msg.attach(MIMEText(content, 'plain', 'utf-8'))
+                msg.attach(MIMEText(html, 'html', 'utf-8'))
             # Convert markdown to HTML if needed
-            if not is_html and '##' in content:
+            elif not is_html and '##' in content:
                 html_content = markdown.markdown(content)
                 msg.attach(MIMEText(content, 'plain', 'utf-8'))
                 msg.attach(MIMEText(html_content, 'html', 'utf-8'))
@@ -43,61 +98,79 @@ class EnhancedOutputDispatcher:
                 content_type = 'html' if is_html else 'plain'
                 msg.attach(MIMEText(content, content_type, 'utf-8'))
             
-            server = smtplib.SMTP(self.email_config['smtp_server'], self.email_config['smtp_port'])
-            server.starttls()
-            server.login(self.email_config['email'], self.email_config['password'])
-            server.send_message(msg)
-            server.quit()
+            outbox_id = self.outbox.enqueue(msg)
+            self.outbox.start()
             
-            print(f"✅ Email sent successfully: {subject}")
+            print(f"✅ Email queued (#{outbox_id}): {subject}")
             return True
         except Exception as e:
             print(f"❌ Email failed: {e}")
             return False
 
-    def save_individual_news_to_obsidian(self, news_items: List[NewsItem], date: str):
-        """Save individual news items to separate Obsidian notes"""
+    def vault_writer(self) -> VaultWriter:
+        """VaultWriter for the configured vault; keeps its manifest across calls"""
+        vault_path = self.obsidian_config['vault_path']
+        if self._vault_writer is None or self._vault_writer.vault_path != vault_path:
+            self._vault_writer = VaultWriter(vault_path, OBSIDIAN_CONFIG['manifest_name'],
+                                             OBSIDIAN_CONFIG['write_workers'])
+        return self._vault_writer
+
+    def individual_note(self, item: NewsItem, date: str) -> Note:
+        """Individual note keyed on the article URL; unchanged articles are never re-rendered"""
+        # The title prefix keeps filenames readable; collisions are resolved by VaultWriter
+        safe_title = "".join(c for c in item.title[:50] if c.isalnum() or c in (' ', '-', '_')).rstrip()
+        return Note(
+            key=item.url,
+            folder=self.obsidian_config['individual_notes_folder'],
+            stem=f"{date}_{safe_title}",
+            fingerprint=fingerprint(item.title, item.source, item.url, item.published_date, item.summary,
+                                    item.ai_summary, getattr(item, 'alternate_sources', None)),
+            render=lambda: self.create_individual_note_content(item, date),
+        )
+
+    def save_individual_news_to_obsidian(self, news_items: List[NewsItem], date: str) -> dict:
+        """Save individual news items to separate Obsidian notes, skipping unchanged ones"""
         try:
-            vault_path = Path(self.obsidian_config['vault_path'])
-            individual_folder = vault_path / self.obsidian_config['individual_notes_folder']
-            individual_folder.mkdir(parents=True, exist_ok=True)
-            
-            saved_count = 0
-            for item in news_items:
-                if item.ai_summary:  # Only save items with AI summaries
-                    # Create safe filename
-                    safe_title = "".join(c for c in item.title[:50] if c.isalnum() or c in (' ', '-', '_')).rstrip()
-                    filename = f"{date}_{safe_title}.md"
-                    file_path = individual_folder / filename
-                    
-                    # Create individual note content
-                    note_content = self.create_individual_note_content(item, date)
-                    
-                    with open(file_path, 'w', encoding='utf-8') as f:
-                        f.write(note_content)
-                    
-                    saved_count += 1
-            
-            print(f"✅ Saved {saved_count} individual notes to Obsidian")
-            return saved_count
+            # Only save items with AI summaries
+            notes = [self.individual_note(item, date) for item in news_items if item.ai_summary]
+            report = self.vault_writer().write_notes(notes)
+            print(f"✅ Obsidian notes: {report['written']} written, {report['skipped']} unchanged, "
+                  f"{report['failed']} failed ({report['seconds']:.2f}s)")
+            return report
         except Exception as e:
             print(f"❌ Failed to save individual notes: {e}")
-            return 0
+            return {'written': 0, 'skipped': 0, 'failed': len(news_items), 'seconds': 0.0}
+
+    def digest_note(self, news_items: List[NewsItem], date: str) -> Note:
+        """Daily digest note; re-rendered only when the day's processed items change
+
+        There is one digest per date at a fixed path, so a digest written before the
+        vault manifest existed is taken over rather than duplicated.
+        """
+        return Note(
+            key=f"digest:{date}",
+            folder=self.obsidian_config['daily_digest_folder'],
+            stem=f"AI_News_Digest_{date}",
+            fingerprint=digest_fingerprint(news_items, date),
+            render=lambda: self.create_comprehensive_digest(news_items, date),
+            adopt=True,
+        )
 
     def save_daily_digest_to_obsidian(self, digest_content: str, date: str):
         """Save daily digest to Obsidian"""
+        note = Note(key=f"digest:{date}", folder=self.obsidian_config['daily_digest_folder'],
+                    stem=f"AI_News_Digest_{date}", fingerprint=fingerprint(digest_content),
+                    render=lambda: digest_content, adopt=True)
+        return self.save_digest_note(note)
+
+    def save_digest_note(self, note: Note) -> bool:
+        """Write a digest note through the vault writer (skipped if unchanged)"""
         try:
-            vault_path = Path(self.obsidian_config['vault_path'])
-            digest_folder = vault_path / self.obsidian_config['daily_digest_folder']
-            digest_folder.mkdir(parents=True, exist_ok=True)
-            
-            filename = f"AI_News_Digest_{date}.md"
-            file_path = digest_folder / filename
-            
-            with open(file_path, 'w', encoding='utf-8') as f:
-                f.write(digest_content)
-            
-            print(f"✅ : {file_path}")
+            report = self.vault_writer().write_notes([note])
+            if report['failed']:
+                return False
+            print(f"✅ Digest {'saved' if report['written'] else 'unchanged'}: "
+                  f"{self.vault_writer().manifest[note.key]['path']}")
             return True
         except Exception as e:
             print(f"❌ Failed to save digest: {e}")
@@ -134,90 +207,29 @@ tags: [{', '.join(tags)}]
 
 - Original Article: [{item.title}]({item.url})
 - Source: {item.source}
-
+{self.format_alternate_sources(item)}
 ---
 *Note created on {datetime.now().strftime('%Y-%m-%d %H:%M')} by AI News Aggregator*
 """
         return content
 
-    def create_comprehensive_digest(self, news_items: List[NewsItem], date: str) -> str:
-        """Create a comprehensive daily digest"""
-        processed_items = [item for item in news_items if item.ai_summary]
-        
-        if not processed_items:
-            return f"# AI News Digest - {date}\n\nNo news items processed today."
-        
-        # Group by source
-        by_source = {}
-        for item in processed_items:
-            if item.source not in by_source:
-                by_source[item.source] = []
-            by_source[item.source].append(item)
-        
-        # Create digest content
-        digest = f"""---
-title: "AI News Digest - {date}"
-date: {date}
-type: daily_digest
-item_count: {len(processed_items)}
-sources: {len(by_source)}
----
-
-# 🤖 AI News Digest - {date}
-
-**Summary**: {len(processed_items)} articles from {len(by_source)} sources
-
-## 📊 Overview
-
-- **Total Articles**: {len(processed_items)}
-- **Unique Sources**: {len(by_source)}
-- **Generated**: {datetime.now().strftime('%Y-%m-%d %H:%M')}
-
-## 📰 Top Stories
-
-"""
-        
-        # Add top stories (first 3 items)
-        for i, item in enumerate(processed_items[:3]):
-            digest += f"""
-### {i+1}. {item.title}
-
-**Source**: {item.source} | **Time**: {item.published_date.strftime('%H:%M')}
-
-{item.ai_summary}
-
-[Read Original]({item.url})
-
----
-"""
-        
-        # Add articles by source
-        digest += "\n## 📑 Articles by Source\n\n"
-        
-        for source, items in by_source.items():
-            digest += f"\n### {source} ({len(items)} articles)\n\n"
-            
-            for item in items:
-                digest += f"""
-#### [{item.title}]({item.url})
-*{item.published_date.strftime('%Y-%m-%d %H:%M')}*
-
-{item.ai_summary}...
+    def format_alternate_sources(self, item: NewsItem) -> str:
+        """List the other outlets that carried the same story"""
+        alternates = getattr(item, 'alternate_sources', None) or []
+        return "".join(f"- Also reported by: [{source}]({url})\n" for source, url in alternates)
 
----
-"""
-        
-        # Add footer
-        digest += f"""
-## 🔗 Quick Links
+    def render_digest(self, news_items: List[NewsItem], date: str) -> RenderedDigest:
+        """Markdown and HTML digest rendered in one pass, cached per date for all sinks"""
+        return self.renderer.render(news_items, date)
 
-All individual articles have been saved as separate notes in the AI_News/Individual folder.
+    def create_comprehensive_digest(self, news_items: List[NewsItem], date: str) -> str:
+        """Create a comprehensive daily digest"""
+        return self.render_digest(news_items, date).markdown
 
----
-*Digest generated by AI News Aggregator on {datetime.now().strftime('%Y-%m-%d %H:%M')}*
-"""
-        
-        return digest
+    def send_digest_email(self, news_items: List[NewsItem], date: str):
+        """Email the rendered digest; reuses the HTML produced alongside the Obsidian Markdown"""
+        digest = self.render_digest(news_items, date)
+        return self.send_email(f"AI News Digest - {date}", digest.markdown, html=digest.html)
 
     def extract_tags_from_summary(self, summary: str) -> List[str]:
         """Extract tags from AI summary"""
@@ -254,14 +266,16 @@ All individual articles have been saved as separate notes in the AI_News/Individ
 
     def save_to_obsidian_comprehensive(self, news_items: List[NewsItem], date: str):
         """Save both individual notes and daily digest"""
-        individual_count = self.save_individual_news_to_obsidian(news_items, date)
+        report = self.save_individual_news_to_obsidian(news_items, date)
         
-        # Create and save comprehensive digest
-        digest_content = self.create_comprehensive_digest(news_items, date)
-        digest_saved = self.save_daily_digest_to_obsidian(digest_content, date)
+        # Create and save comprehensive digest (rendered only if the day's items changed)
+        digest_saved = self.save_digest_note(self.digest_note(news_items, date))
         
         return {
-            'individual_notes': individual_count,
+            'individual_notes': report['written'] + report['skipped'],
+            'written': report['written'],
+            'skipped': report['skipped'],
+            'failed': report['failed'],
             'digest_saved': digest_saved,
             'total_items': len(news_items)
         }
\ No newline at end of file
@@ -0,0 +1,216 @@
+# output_sinks.py - 日报的各个输出
+#
+# 每个输出 (sink) 实现 deliver(delivery), 由EnhancedOutputDispatcher.dispatch并行调用.
+# 日报只渲染一次 (Delivery.digest), 各输出共用; 单个输出出错或超时只影响它自己.
+# 线程无法被强制终止, 耗时长的输出 (如飞书分批推送) 应在循环中检查 delivery.deadline 自行停止.
+import base64
+import hashlib
+import hmac
+import json
+import threading
+import time
+from collections import deque
+from dataclasses import dataclass
+from typing import List
+
+import requests
+
+from config import FEISHU_CONFIG, OUTPUT_CONFIG
+from digest_renderer import RenderedDigest
+
+
+@dataclass
+class Delivery:
+    date: str
+    news_items: list
+    digest: RenderedDigest
+    deadline: float             # time.monotonic() 时间点, 超过后结果不再被等待
+
+
+class OutputSink:
+    name = 'sink'
+
+    def __init__(self, timeout: float = None):
+        self.timeout = timeout or OUTPUT_CONFIG['sink_timeout']
+
+    def enabled(self) -> bool:
+        """未配置的输出 (如没有webhook地址) 返回False, 分发时跳过"""
+        return True
+
+    def deliver(self, delivery: Delivery) -> dict:
+        raise NotImplementedError
+
+
+class ObsidianNotesSink(OutputSink):
+    name = 'obsidian_notes'
+
+    def __init__(self, dispatcher, timeout: float = None):
+        super().__init__(timeout)
+        self.dispatcher = dispatcher
+
+    def enabled(self) -> bool:
+        return bool(self.dispatcher.obsidian_config['vault_path'])
+
+    def deliver(self, delivery: Delivery) -> dict:
+        report = self.dispatcher.save_individual_news_to_obsidian(delivery.news_items, delivery.date)
+        if report['failed']:
+            raise RuntimeError(f"{report['failed']} notes failed to save")
+        return report
+
+
+class ObsidianDigestSink(OutputSink):
+    name = 'obsidian_digest'
+
+    def __init__(self, dispatcher, timeout: float = None):
+        super().__init__(timeout)
+        self.dispatcher = dispatcher
+
+    def enabled(self) -> bool:
+        return bool(self.dispatcher.obsidian_config['vault_path'])
+
+    def deliver(self, delivery: Delivery) -> dict:
+        if not self.dispatcher.save_digest_note(self.dispatcher.digest_note(delivery.news_items, delivery.date)):
+            raise RuntimeError("Failed to save digest")
+        return {'items': delivery.digest.item_count}
+
+
+class EmailSink(OutputSink):
+    name = 'email'
+
+    def __init__(self, dispatcher, timeout: float = None):
+        super().__init__(timeout)
+        self.dispatcher = dispatcher
+
+    def enabled(self) -> bool:
+        config = self.dispatcher.email_config
+        return bool(config['smtp_server'] and config['to_email'])
+
+    def deliver(self, delivery: Delivery) -> dict:
+        # 只写入outbox, 实际发送由后台线程完成
+        if not self.dispatcher.send_digest_email(delivery.news_items, delivery.date):
+            raise RuntimeError("Failed to queue email")
+        return {'items': delivery.digest.item_count}
+
+
+class RateLimiter:
+    """同时满足每秒和每分钟的请求次数限制"""
+
+    def __init__(self, per_second: int, per_minute: int):
+        self.per_second = per_second
+        self.per_minute = per_minute
+        self._sent = deque()
+        self._lock = threading.Lock()
+
+    def wait(self):
+        with self._lock:
+            while True:
+                now = time.monotonic()
+                while self._sent and now - self._sent[0] >= 60:
+                    self._sent.popleft()
+                if len(self._sent) >= self.per_minute:
+                    delay = 60 - (now - self._sent[0])
+                elif len(self._sent) >= self.per_second and now - self._sent[-self.per_second] < 1:
+                    delay = 1 - (now - self._sent[-self.per_second])
+                else:
+                    self._sent.append(now)
+                    return
+                time.sleep(max(0.01, delay))
+
+
+class FeishuSink(OutputSink):
+    """飞书自定义机器人: 日报按条目打包成若干富文本(post)消息, 按限流节奏依次发送"""
+    name = 'feishu'
+
+    # 飞书返回的限流错误码
+    RATE_LIMITED = {9499, 11232}
+    # 单条摘要的字数上限, 保证一个条目总能放进一条消息
+    MAX_SUMMARY_CHARS = 3000
+
+    def __init__(self, webhook_url: str = None, secret: str = None, timeout: float = None, config: dict = None):
+        super().__init__(timeout)
+        self.config = {**FEISHU_CONFIG, **(config or {})}
+        self.webhook_url = webhook_url or self.config['webhook_url']
+        self.secret = secret or self.config['secret']
+        self.session = requests.Session()
+        # 同一个机器人的所有消息共用限流器
+        self.limiter = RateLimiter(self.config['rate_per_second'], self.config['rate_per_minute'])
+
+    def enabled(self) -> bool:
+        return bool(self.webhook_url)
+
+    def deliver(self, delivery: Delivery) -> dict:
+        items = [item for item in delivery.news_items if item.ai_summary][:self.config['max_items']]
+        messages = self.build_messages(items, delivery.date, delivery.digest.item_count)
+        sent = 0
+        for message in messages:
+            if time.monotonic() >= delivery.deadline:
+                raise TimeoutError(f"Deadline reached after {sent}/{len(messages)} messages")
+            self.send(message)
+            sent += 1
+        return {'messages': sent, 'items': len(items)}
+
+    def build_messages(self, items, date: str, total: int) -> List[dict]:
+        """把条目打包成请求体不超过max_message_bytes的post消息"""
+        limit = self.config['max_message_bytes'] - 512  # 留出标题和签名的空间
+        batches = []
+        current = [[{'tag': 'text', 'text': f"{total} articles, showing {len(items)}"}]]
+        size = self._size(current)
+        for item in items:
+            block = self._paragraphs(item)
+            block_size = self._size(block)
+            if len(current) > 1 and size + block_size > limit:
+                batches.append(current)
+                current, size = [], 0
+            current += block
+            size += block_size
+        batches.append(current)
+        return [self._post(f"AI News Digest - {date}" + (f" ({i}/{len(batches)})" if len(batches) > 1 else ''),
+                           content) for i, content in enumerate(batches, 1)]
+
+    def send(self, message: dict):
+        """发送一条消息; 被限流或网络错误时退避重试"""
+        for attempt in range(self.config['max_retries'] + 1):
+            self.limiter.wait()
+            try:
+                response = self.session.post(self.webhook_url, json=self._signed(message),
+                                             timeout=self.config['timeout'])
+                body = response.json() if response.content else {}
+            except (requests.RequestException, ValueError) as e:
+                error = e
+            else:
+                code = body.get('code', body.get('StatusCode', 0))
+                if response.status_code == 200 and code == 0:
+                    return
+                error = RuntimeError(f"Feishu error {response.status_code}/{code}: {body.get('msg')}")
+                if response.status_code != 429 and code not in self.RATE_LIMITED and response.status_code < 500:
+                    raise error  # 参数或签名错误, 重试无用
+            if attempt < self.config['max_retries']:
+                time.sleep(2 ** attempt)
+        raise error
+
+    @staticmethod
+    def _paragraphs(item) -> list:
+        published = item.published_date.strftime('%m-%d %H:%M') if hasattr(item.published_date, 'strftime') else ''
+        return [
+            [{'tag': 'a', 'text': item.title, 'href': item.url},
+             {'tag': 'text', 'text': f"  ({item.source} {published})"}],
+            [{'tag': 'text', 'text': item.ai_summary[:FeishuSink.MAX_SUMMARY_CHARS]}],
+            [{'tag': 'text', 'text': ''}],
+        ]
+
+    @staticmethod
+    def _post(title: str, content: list) -> dict:
+        return {'msg_type': 'post', 'content': {'post': {'zh_cn': {'title': title, 'content': content}}}}
+
+    @staticmethod
+    def _size(content: list) -> int:
+        return len(json.dumps(content, ensure_ascii=False).encode('utf-8'))
+
+    def _signed(self, message: dict) -> dict:
+        """开启签名校验时附加timestamp和sign"""
+        if not self.secret:
+            return message
+        timestamp = str(int(time.time()))
+        string_to_sign = f"{timestamp}\n{self.secret}".encode('utf-8')
+        sign = base64.b64encode(hmac.new(string_to_sign, digestmod=hashlib.sha256).digest()).decode('utf-8')
+        return {'timestamp': timestamp, 'sign': sign, **message}
@@ -0,0 +1,316 @@
+# pipeline.py - 流式多阶段处理引擎
+#
+# 抓取、抽取、总结、入库作为并发阶段运行, 阶段之间用有界队列连接:
+# 下游处理不过来时上游会阻塞 (背压), 新闻逐条流过, 不会整批堆在内存里.
+import queue
+import threading
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timedelta
+from typing import Callable, Iterable, Iterator, List
+
+from config import DEDUP_CONFIG, PIPELINE_CONFIG
+from dedup import Deduplicator
+from news_collector import NewsCollector, NewsItem
+
+_DONE = object()  # 阶段结束标记
+
+
+@dataclass
+class Stage:
+    name: str
+    func: Callable
+    workers: int = 1
+    queue_size: int = 16
+    fan_out: bool = False  # func返回可迭代对象, 逐个发往下一阶段
+    batch_size: int = 1    # >1时func接收一批条目并返回结果列表; 只取队列中已就绪的条目, 不等待凑满
+
+
+@dataclass
+class StageStats:
+    name: str
+    workers: int
+    processed: int = 0
+    failed: int = 0
+    emitted: int = 0
+    busy_seconds: float = 0.0
+    max_queue_depth: int = 0
+    started_at: float = 0.0
+    finished_at: float = 0.0
+    lock: threading.Lock = field(default_factory=threading.Lock, repr=False)
+
+    @property
+    def elapsed(self) -> float:
+        end = self.finished_at or time.perf_counter()
+        return end - self.started_at if self.started_at else 0.0
+
+    @property
+    def throughput(self) -> float:
+        """每秒处理条数 (按阶段墙钟时间计算)"""
+        return self.processed / self.elapsed if self.elapsed > 0 else 0.0
+
+
+class Pipeline:
+    def __init__(self, stages: List[Stage]):
+        self.stages = stages
+        self.stats = [StageStats(stage.name, stage.workers) for stage in stages]
+        self._queues = []
+        self._stop = threading.Event()
+
+    def run(self, source: Iterable, poll: Callable[[], None] = None, poll_interval: float = 1.0) -> Iterator:
+        """将source逐个送入第一阶段, 并按完成顺序产出最后一阶段的结果
+
+        poll每隔poll_interval秒调用一次 (没有结果产出时也会调用), 用于汇报进度和检查取消;
+        poll抛出的异常会停止所有阶段并传给调用方.
+        """
+        self._stop.clear()
+        # _queues[i] 是第i阶段的输入队列, 最后一个是输出队列
+        self._queues = [queue.Queue(maxsize=stage.queue_size) for stage in self.stages]
+        self._queues.append(queue.Queue(maxsize=self.stages[-1].queue_size))
+
+        threads = [threading.Thread(target=self._feed, args=(source,), daemon=True)]
+        for index, stage in enumerate(self.stages):
+            remaining = [stage.workers]
+            for _ in range(stage.workers):
+                threads.append(threading.Thread(target=self._work, args=(index, remaining), daemon=True))
+        for thread in threads:
+            thread.start()
+
+        output = self._queues[-1]
+        last_poll = time.monotonic()
+        try:
+            while True:
+                if poll and time.monotonic() - last_poll >= poll_interval:
+                    poll()
+                    last_poll = time.monotonic()
+                try:
+                    item = output.get(timeout=poll_interval if poll else None)
+                except queue.Empty:
+                    continue
+                if item is _DONE:
+                    break
+                yield item
+        finally:
+            # 消费者提前退出时通知所有阶段停止, 避免线程阻塞在满队列上
+            self._stop.set()
+            # 阻塞在网络请求上的线程 (daemon) 不必等完, 所有线程共用一秒的等待时间
+            deadline = time.monotonic() + 1
+            for thread in threads:
+                thread.join(timeout=max(deadline - time.monotonic(), 0))
+
+    def queue_depths(self) -> dict:
+        """各阶段输入队列当前的积压数量"""
+        return {stage.name: q.qsize() for stage, q in zip(self.stages, self._queues)}
+
+    def report(self) -> str:
+        lines = [f"{'stage':<12}{'workers':>8}{'items':>8}{'failed':>8}{'items/s':>9}{'busy%':>7}{'max q':>7}"]
+        for stats in self.stats:
+            capacity = stats.elapsed * stats.workers
+            busy = 100 * stats.busy_seconds / capacity if capacity > 0 else 0.0
+            lines.append(f"{stats.name:<12}{stats.workers:>8}{stats.processed:>8}{stats.failed:>8}"
+                         f"{stats.throughput:>9.2f}{busy:>6.0f}%{stats.max_queue_depth:>7}")
+        return "\n".join(lines)
+
+    def _put(self, index: int, item) -> bool:
+        """放入第index个队列, 队列满时阻塞; 流水线停止时返回False"""
+        q = self._queues[index]
+        while not self._stop.is_set():
+            try:
+                q.put(item, timeout=0.1)
+            except queue.Full:
+                continue
+            if index < len(self.stats) and item is not _DONE:
+                stats = self.stats[index]
+                depth = q.qsize()
+                if depth > stats.max_queue_depth:
+                    with stats.lock:
+                        stats.max_queue_depth = max(stats.max_queue_depth, depth)
+            return True
+        return False
+
+    def _feed(self, source: Iterable):
+        try:
+            for item in source:
+                if not self._put(0, item):
+                    return
+        finally:
+            for _ in range(self.stages[0].workers):
+                self._put(0, _DONE)
+
+    def _work(self, index: int, remaining: list):
+        stage, stats = self.stages[index], self.stats[index]
+        with stats.lock:
+            if not stats.started_at:
+                stats.started_at = time.perf_counter()
+        inbox = self._queues[index]
+        finished = False
+        while not finished and not self._stop.is_set():
+            try:
+                item = inbox.get(timeout=0.1)
+            except queue.Empty:
+                continue
+            if item is _DONE:
+                break
+
+            batch = [item]
+            while len(batch) < stage.batch_size:
+                try:
+                    item = inbox.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _DONE:
+                    finished = True
+                    break
+                batch.append(item)
+
+            start = time.perf_counter()
+            try:
+                if stage.batch_size > 1:
+                    outputs = [output for output in stage.func(batch) if output is not None]
+                else:
+                    result = stage.func(batch[0])
+                    outputs = list(result or []) if stage.fan_out else ([] if result is None else [result])
+                failed = False
+            except Exception as e:
+                print(f"Pipeline stage '{stage.name}' failed: {e}")
+                outputs, failed = [], True
+            with stats.lock:
+                stats.busy_seconds += time.perf_counter() - start
+                stats.processed += len(batch)
+                stats.failed += len(batch) if failed else 0
+                stats.emitted += len(outputs)
+
+            for output in outputs:
+                if not self._put(index + 1, output):
+                    return
+
+        with stats.lock:
+            remaining[0] -= 1
+            last_worker = remaining[0] == 0
+            if last_worker:
+                stats.finished_at = time.perf_counter()
+        if last_worker:
+            # 本阶段全部结束, 通知下一阶段的每个worker (输出队列只需一个标记)
+            downstream = self.stages[index + 1].workers if index + 1 < len(self.stages) else 1
+            for _ in range(downstream):
+                self._put(index + 1, _DONE)
+
+
+class NewsPipeline:
+    """抓取 -> 抽取 -> 总结 -> 入库 的新闻流水线, 供定时工作流和Streamlit界面共用"""
+
+    def __init__(self, collector: NewsCollector, llm_processor, force: bool = False, config: dict = None):
+        self.collector = collector
+        self.llm_processor = llm_processor
+        self.force = force
+        self.config = {**PIPELINE_CONFIG, **(config or {})}
+        self.skipped: List[NewsItem] = []  # 已处理过的新闻, 不进入后续阶段
+        self._since = None
+        self._skipped_lock = threading.Lock()
+        self.deduplicator = None
+        queue_size = self.config['queue_size']
+        self.pipeline = Pipeline([
+            Stage('fetch', self._fetch, collector.max_workers, queue_size, fan_out=True),
+            Stage('dedup', self._dedup, 1, queue_size),
+            Stage('extract', self._extract, self.config['extract_workers'], queue_size),
+            Stage('summarize', self._summarize_batch if llm_processor.batch_size > 1 else self._summarize,
+                  llm_processor.max_in_flight, queue_size, batch_size=llm_processor.batch_size),
+            # SQLite只用一个写线程, 已在队列中的条目合并成一个事务写入
+            Stage('persist', self._persist, 1, queue_size, batch_size=self.config['persist_batch_size']),
+        ])
+
+    def run(self, rss_urls: List[str], poll: Callable[[], None] = None) -> Iterator[NewsItem]:
+        """流式产出处理完成的新闻, 最后产出本次跳过的已处理新闻
+
+        抓取阶段结束前结果会被暂存, 这期间也按时调用poll (见Pipeline.run).
+        """
+        self._since = datetime.now() - timedelta(days=1)
+        self.skipped = []
+        self.deduplicator = Deduplicator() if DEDUP_CONFIG['enabled'] else None
+        rss_urls = list(dict.fromkeys(rss_urls))  # 同一feed可能出现在多个分类中
+        self.collector.reset_cache_stats()
+        self.llm_processor.reset_cache_stats()
+        held, emitted = [], []
+        for item in self.pipeline.run(rss_urls, poll):
+            held.append(item)
+            # 抓取阶段结束前, 已处理的条目仍可能替换掉已完成的重复条目, 先暂存结果
+            if self.pipeline.stats[0].finished_at:
+                live, held = self._live(held), []
+                emitted += live
+                yield from live
+        live = self._live(held)
+        emitted += live
+        yield from live
+        # 已处理的条目不再入库, 入库后才合并进来的转载也没有写入, 统一补存转载来源
+        self.collector.repository.merge_alternate_sources(emitted + self.skipped)
+        yield from self.skipped
+
+    def report(self) -> str:
+        lines = [self.pipeline.report(), f"skipped (already processed): {len(self.skipped)}",
+                 self.collector.content_report()]
+        if self.deduplicator:
+            lines.append(self.deduplicator.report())
+        if self.collector.use_feed_cache:
+            lines.append(self.collector.cache_report())
+        if self.llm_processor.summary_cache:
+            lines.append(self.llm_processor.cache_report())
+        lines.append(self.llm_processor.metrics_report())
+        return "\n".join(lines)
+
+    def _fetch(self, url: str) -> List[NewsItem]:
+        items = self.collector.collect_feed(url, self._since, force=self.force)
+        pending, done = self.collector.partition_processed(items, force=self.force)
+        for item in done:
+            item.content = ""  # 下游只需要ai_summary, 不保留正文
+            # 已处理的条目也登记到去重索引, 其他站点的转载会合并到它上面;
+            # 先到达去重阶段的未处理转载会被它替换, 不再重新总结
+            if self.deduplicator is None or self.deduplicator.add(item, processed=True) is not None:
+                with self._skipped_lock:
+                    self.skipped.append(item)
+        # 已入库的条目不用等, feed的其余新闻入库后即可写入缓存校验信息
+        self.collector.commit_feed_cache(item.url for item in done)
+        return pending
+    
+    def _dedup(self, item: NewsItem) -> NewsItem:
+        """重复的新闻合并到规范条目上, 不再进入抽取和总结阶段"""
+        if self.deduplicator is None:
+            return item
+        canonical = self.deduplicator.add(item)
+        if canonical is None:
+            self.collector.commit_feed_cache([item.url])  # 由规范条目代表, 自身不会入库
+        return canonical
+
+    def _live(self, items: List[NewsItem]) -> List[NewsItem]:
+        """去掉已被已处理条目替换的条目 (由替换它的条目代表, 自身不必再入库)"""
+        if self.deduplicator is None:
+            return items
+        superseded = [item for item in items if self.deduplicator.is_superseded(item)]
+        if not superseded:
+            return items
+        self.collector.commit_feed_cache(item.url for item in superseded)
+        return [item for item in items if all(item is not other for other in superseded)]
+
+    def _extract(self, item: NewsItem) -> NewsItem:
+        if not self._live([item]):
+            return None
+        return self.collector.apply_content_policy(item)
+
+    def _summarize(self, item: NewsItem) -> NewsItem:
+        if not self._live([item]):
+            return None
+        item.ai_summary = self.llm_processor.summarize_news_item(item, refresh=self.force)
+        return item
+
+    def _summarize_batch(self, items: List[NewsItem]) -> List[NewsItem]:
+        items = self._live(items)
+        for item, summary in zip(items, self.llm_processor.summarize_batch(items, refresh=self.force)):
+            item.ai_summary = summary
+        return items
+    
+    def _persist(self, items: List[NewsItem]) -> List[NewsItem]:
+        items = self._live(items)
+        self.collector.repository.upsert_news_items(items)
+        self.collector.commit_feed_cache(item.url for item in items)
+        for item in items:
+            item.content = ""  # 已入库, 释放正文
+        return items
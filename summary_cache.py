@@ -0,0 +1,52 @@
+# summary_cache.py - 按内容寻址的LLM总结缓存
+#
+# 缓存键是模型名、prompt模板版本、生成参数和文章内容的哈希, 任何一项变化都会
+# 重新调用LLM. 条目数超过上限时按最近使用时间(LRU)淘汰.
+import hashlib
+import json
+import time
+from typing import Optional
+
+from migrations import MIGRATIONS
+from news_repository import NewsRepository
+
+
+class SummaryCache:
+    def __init__(self, db_path: str = "ai_news.db", max_entries: int = 5000):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self.repository = NewsRepository.for_path(db_path)
+        self.repository.migrate(MIGRATIONS)
+
+    @staticmethod
+    def make_key(model: str, prompt_version, options: dict, **fields) -> str:
+        """由模型、prompt版本、生成参数和文章字段计算缓存键"""
+        payload = json.dumps(
+            {'model': model, 'prompt_version': prompt_version, 'options': options, 'fields': fields},
+            sort_keys=True, ensure_ascii=False, default=str
+        )
+        return hashlib.sha256(payload.encode('utf-8')).hexdigest()
+
+    def get(self, key: str) -> Optional[tuple]:
+        """命中时返回 (summary, 当初生成耗费的LLM秒数), 并刷新最近使用时间"""
+        row = self.repository.execute('SELECT summary, llm_seconds FROM summary_cache WHERE key = ?', (key,)).fetchone()
+        if row:
+            with self.repository.transaction() as conn:
+                conn.execute('UPDATE summary_cache SET last_used_at = ? WHERE key = ?', (time.time(), key))
+            return tuple(row)
+        return None
+
+    def put(self, key: str, model: str, summary: str, llm_seconds: float):
+        now = time.time()
+        with self.repository.transaction() as conn:
+            conn.execute('''
+                INSERT OR REPLACE INTO summary_cache (key, model, summary, llm_seconds, created_at, last_used_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+            ''', (key, model, summary, llm_seconds, now, now))
+            count = conn.execute('SELECT COUNT(*) FROM summary_cache').fetchone()[0]
+            if count > self.max_entries:
+                conn.execute('''
+                    DELETE FROM summary_cache WHERE key IN (
+                        SELECT key FROM summary_cache ORDER BY last_used_at ASC LIMIT ?
+                    )
+                ''', (count - self.max_entries,))